@@ -1,17 +1,19 @@
 import json
+import logging
 import traceback
 
-from django.conf import settings
-from django.core.mail import send_mail
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, render
 from django.views.decorators.csrf import csrf_exempt
 from django_daraja.mpesa.core import MpesaClient
 
 from orders.models import Order, Transaction
+from orders.services import webhooks
 
 from .models import Payment
 
+logger = logging.getLogger(__name__)
+
 # Initialize MpesaClient once
 cl = MpesaClient()
 
@@ -105,74 +107,19 @@ def daraja_stk_push(request):
 # [Inactive] Preserved for future testing
 @csrf_exempt
 def stk_callback(request):
+    """Store the STK callback and ack; ``orders.services.webhooks`` applies it."""
     try:
         resp = json.loads(request.body)
-        data = resp.get("Body", {}).get("stkCallback", {})
-        result_code = data.get("ResultCode", -1)
-
-        if result_code == 0:  # pyPayment successful
-            merchant_request_id = data.get("MerchantRequestID")
-            checkout_request_id = data.get("CheckoutRequestID")
-
-            # Extract MpesaReceiptNumber safely
-            mpesa_receipt = next(
-                (
-                    item["Value"]
-                    for item in data.get("CallbackMetadata", {}).get("Item", [])
-                    if item.get("Name") == "MpesaReceiptNumber"
-                ),
-                "",
-            )
-
-            try:
-                #  Find the matching payment
-                payment = Payment.objects.get(
-                    merchant_request_id=merchant_request_id,
-                    checkout_request_id=checkout_request_id,
-                )
-                payment.code = mpesa_receipt
-                payment.status = "COMPLETED"
-                payment.save()
-                Transaction.objects.filter(reference=checkout_request_id).update(
-                    status="success"
-                )
-
-                #  Mark order as paid
-                order = payment.order
-                order.paid = True
-                order.save()
-
-                user = order.user
-
-                #  Compose and send confirmation email
-                subject = "Your Order Payment Was Successful"
-                message = (
-                    f"Hi {user.username},\n\n"
-                    f"We've received your payment for Order #{order.id}.\n"
-                    f"Amount paid: KES {payment.amount}\n"
-                    f"Transaction code: {mpesa_receipt}\n\n"
-                    f"Your order is being processed and we'll update you on its status.\n\n"
-                    f"Thank you for shopping with us!\n\n"
-                    f"- The Rahim Online Clothing Store Team"
-                )
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [user.email],
-                    fail_silently=False,
-                )
-
-            except Payment.DoesNotExist:
-                print(
-                    f"[ERROR] Payment not found for MerchantRequestID={merchant_request_id}, CheckoutRequestID={checkout_request_id}"
-                )
-        else:
-            print(f"[INFO] STK Push failed with ResultCode={result_code}")
-
     except json.JSONDecodeError as e:
-        print(f"[ERROR] JSON decode error in stk_callback: {e}")
-
+        logger.error("JSON decode error in stk_callback: %s", e)
+        return HttpResponse("OK")
+
+    data = resp.get("Body", {}).get("stkCallback", {})
+    reference = data.get("CheckoutRequestID") or data.get("MerchantRequestID")
+    if not reference:
+        logger.error("stk_callback without CheckoutRequestID")
+        return HttpResponse("OK")
+    webhooks.ingest("mpesa", reference, request.body, resp)
     return HttpResponse("OK")
 
 
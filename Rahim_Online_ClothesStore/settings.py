@@ -153,6 +153,7 @@ MIDDLEWARE = [
     # Custom
     "core.middleware.PermissionsPolicyMiddleware",
     "core.middleware.RequestIDMiddleware",
+    "core.middleware.CommitBatchMiddleware",
     "cart.middleware.ClearGuestCookieOnLoginMiddleware",
 ]
 
@@ -294,8 +295,24 @@ try:
     from celery.schedules import crontab
 
     _kpi_schedule = crontab(minute=30, hour=0)
+    _track_compact_schedule = crontab(minute="*/15")
+    _track_retention_schedule = crontab(minute=15, hour=3)
+    _dispatch_schedule = crontab(minute="*")
+    _silent_delivery_schedule = crontab(minute="*")
+    _reconcile_schedule = crontab(minute="*/10")
+    _webhook_retry_schedule = crontab(minute="*")
+    _retention_schedule = crontab(minute=45, hour=3)
+    _outbox_schedule = crontab(minute="*")
 except Exception:  # pragma: no cover
     _kpi_schedule = 24 * 60 * 60  # fallback: every 24h
+    _track_compact_schedule = 15 * 60
+    _track_retention_schedule = 24 * 60 * 60
+    _dispatch_schedule = 60
+    _silent_delivery_schedule = 60
+    _reconcile_schedule = 10 * 60
+    _webhook_retry_schedule = 60
+    _retention_schedule = 24 * 60 * 60
+    _outbox_schedule = 60
 
 CELERY_TIMEZONE = "Africa/Nairobi"
 CELERY_BEAT_SCHEDULE = {
@@ -303,7 +320,47 @@ CELERY_BEAT_SCHEDULE = {
         "task": "vendor_app.tasks.aggregate_kpis_daily_all",
         "schedule": _kpi_schedule,
         "options": {"queue": "default"},
-    }
+    },
+    "orders-compact-delivery-tracks": {
+        "task": "orders.tasks.compact_delivery_tracks",
+        "schedule": _track_compact_schedule,
+        "options": {"queue": "default"},
+    },
+    "orders-downsample-delivery-tracks": {
+        "task": "orders.tasks.downsample_delivery_tracks",
+        "schedule": _track_retention_schedule,
+        "options": {"queue": "default"},
+    },
+    "orders-auto-dispatch": {
+        "task": "orders.tasks.auto_dispatch_deliveries",
+        "schedule": _dispatch_schedule,
+        "options": {"queue": "default"},
+    },
+    "orders-alert-silent-deliveries": {
+        "task": "orders.tasks.alert_silent_deliveries",
+        "schedule": _silent_delivery_schedule,
+        "options": {"queue": "default"},
+    },
+    "payments-reconcile-stale": {
+        "task": "payments.tasks.reconcile_stale_transactions",
+        "schedule": _reconcile_schedule,
+        "options": {"queue": "default"},
+    },
+    "orders-retry-payment-events": {
+        "task": "orders.tasks.retry_payment_events",
+        "schedule": _webhook_retry_schedule,
+        "options": {"queue": "default"},
+    },
+    "payments-purge-expired-records": {
+        "task": "payments.tasks.purge_expired_records",
+        "schedule": _retention_schedule,
+        "options": {"queue": "default"},
+    },
+    "notifications-send-outbound-email": {
+        "task": "notifications.tasks.send_outbound_email",
+        "schedule": _outbox_schedule,
+        "options": {"queue": "default"},
+    },
 }
 # ------------------------- Auth / API -------------------------
 
@@ -414,6 +471,59 @@ GEOAPIFY_API_KEY = env("GEOAPIFY_API_KEY", default=None)
 GEOCODING_TIMEOUT = 6
 GEOCODING_USER_AGENT = "RahimOnline/1.0 (contact: admin@example.com)"
 
+# Driving routes (orders.services.routes): shared cache + per-worker LRU front
+ROUTE_CACHE_TTL = env.int("ROUTE_CACHE_TTL", default=300)
+ROUTE_CACHE_LOCAL_TTL = env.int("ROUTE_CACHE_LOCAL_TTL", default=60)
+ROUTE_CACHE_LOCAL_MAXSIZE = env.int("ROUTE_CACHE_LOCAL_MAXSIZE", default=512)
+ROUTE_FETCH_TIMEOUT = env.int("ROUTE_FETCH_TIMEOUT", default=10)
+ROUTE_PRECOMPUTE_ENABLED = env.bool("ROUTE_PRECOMPUTE_ENABLED", default=True)
+ROUTE_PRECOMPUTE_WORKERS = env.int("ROUTE_PRECOMPUTE_WORKERS", default=2)
+
+# Address autocomplete proxy (orders.services.autocomplete)
+GEO_AUTOCOMPLETE_CACHE_TTL = env.int("GEO_AUTOCOMPLETE_CACHE_TTL", default=86400)
+GEO_AUTOCOMPLETE_RATE_LIMIT = env.int("GEO_AUTOCOMPLETE_RATE_LIMIT", default=5)
+GEO_AUTOCOMPLETE_RATE_WINDOW = env.int("GEO_AUTOCOMPLETE_RATE_WINDOW", default=1)
+
+# Driver position write-behind buffer (orders.services.ping_buffer)
+PING_BUFFER_FLUSH_INTERVAL = env.float("PING_BUFFER_FLUSH_INTERVAL", default=2.0)
+PING_BUFFER_MAX_ROWS = env.int("PING_BUFFER_MAX_ROWS", default=200)
+DRIVER_LOCATION_BATCH_MAX = env.int("DRIVER_LOCATION_BATCH_MAX", default=1000)
+# Threads (and DB connections) for ORM writes from WebSocket consumers (core.db_writes)
+WS_DB_WRITE_POOL_SIZE = env.int("WS_DB_WRITE_POOL_SIZE", default=4)
+# core.realtime: channel-layer messages are sent after commit, batched per
+# request/task; non-blocking hands each batch to a background thread.
+REALTIME_NONBLOCKING = env.bool("REALTIME_NONBLOCKING", default=False)
+REALTIME_MAX_BATCH = env.int("REALTIME_MAX_BATCH", default=200)
+# core.audit: AuditLog rows are written after commit, one bulk insert per
+# request/task; "queue" writes them from a Celery task, "sync" inline.
+AUDIT_MODE = env("AUDIT_MODE", default="commit")
+AUDIT_MAX_BATCH = env.int("AUDIT_MAX_BATCH", default=500)
+
+# Delivery ETA model (orders.eta); trained with `manage.py train_eta_model`
+ETA_MODEL_PATH = env("ETA_MODEL_PATH", default=str(BASE_DIR / "eta_model.npz"))
+# Live position fan-out: one broadcast per delivery group per interval (s),
+# and a per-socket cap for frames arriving from other senders.
+WS_POSITION_FANOUT_INTERVAL = env.float("WS_POSITION_FANOUT_INTERVAL", default=1.0)
+WS_POSITION_CLIENT_INTERVAL = env.float("WS_POSITION_CLIENT_INTERVAL", default=0.5)
+TRACK_COMPACT_BATCH_SIZE = env.int("TRACK_COMPACT_BATCH_SIZE", default=200)
+TRACK_COMPACT_GRACE_MINUTES = env.int("TRACK_COMPACT_GRACE_MINUTES", default=10)
+TRACK_RETENTION_DAYS = env.int("TRACK_RETENTION_DAYS", default=30)
+TRACK_RETENTION_TOLERANCE_M = env.float("TRACK_RETENTION_TOLERANCE_M", default=10.0)
+TRACK_RETENTION_BUCKET_SECONDS = env.int("TRACK_RETENTION_BUCKET_SECONDS", default=0)
+
+# Automatic driver dispatch (orders.dispatch); the beat task is a no-op unless enabled
+DISPATCH_ENABLED = env.bool("DISPATCH_ENABLED", default=False)
+DISPATCH_MAX_BATCH = env.int("DISPATCH_MAX_BATCH", default=1000)
+DISPATCH_DRIVER_FRESH_MINUTES = env.int("DISPATCH_DRIVER_FRESH_MINUTES", default=10)
+DISPATCH_MAX_PICKUP_KM = env.float("DISPATCH_MAX_PICKUP_KM", default=15.0)
+DISPATCH_HUNGARIAN_MAX = env.int("DISPATCH_HUNGARIAN_MAX", default=200)
+DISPATCH_IMPROVE_SECONDS = env.float("DISPATCH_IMPROVE_SECONDS", default=0.25)
+# Silent-driver alerts: active deliveries without a fix for this long
+DELIVERY_STALE_AFTER_MINUTES = env.int("DELIVERY_STALE_AFTER_MINUTES", default=5)
+DELIVERY_STALE_LOOKBACK_MINUTES = env.int(
+    "DELIVERY_STALE_LOOKBACK_MINUTES", default=360
+)
+
 # Stripe
 STRIPE_SECRET_KEY = env("STRIPE_SECRET_KEY", default=None)
 STRIPE_PUBLISHABLE_KEY = env("STRIPE_PUBLISHABLE_KEY", default=None)
@@ -430,6 +540,52 @@ PAYPAL_CURRENCY = env("PAYPAL_CURRENCY", default="USD")
 PAYSTACK_PUBLIC_KEY = env("PAYSTACK_PUBLIC_KEY", default=None)
 PAYSTACK_SECRET_KEY = env("PAYSTACK_SECRET_KEY", default=None)
 PAYSTACK_CURRENCY = env("PAYSTACK_CURRENCY", default="KES")
+# Bulk reconcile (payments.services.reconcile.verify_paystack_many)
+PAYSTACK_RECONCILE_CONCURRENCY = env.int("PAYSTACK_RECONCILE_CONCURRENCY", default=8)
+PAYSTACK_RECONCILE_RPS = env.float("PAYSTACK_RECONCILE_RPS", default=20.0)
+PAYSTACK_VERIFY_TIMEOUT = env.float("PAYSTACK_VERIFY_TIMEOUT", default=15.0)
+# Stale-transaction reconciler (payments.tasks): rows claimed per chunk and
+# how long a claim keeps other workers away
+RECONCILE_CHUNK_SIZE = env.int("RECONCILE_CHUNK_SIZE", default=100)
+RECONCILE_CLAIM_LEASE_MINUTES = env.int("RECONCILE_CLAIM_LEASE_MINUTES", default=15)
+# Webhook pipeline (orders.services.webhooks): events are acked once stored
+# and processed by orders.tasks.process_payment_events; INLINE processes
+# right after commit in the request (no worker needed). Without REDIS_URL
+# there is no Celery broker, so payments are finalised inline by default.
+WEBHOOK_PROCESS_INLINE = env.bool("WEBHOOK_PROCESS_INLINE", default=not USE_REDIS)
+WEBHOOK_MAX_ATTEMPTS = env.int("WEBHOOK_MAX_ATTEMPTS", default=8)
+WEBHOOK_RETRY_BACKOFF_SECONDS = env.float("WEBHOOK_RETRY_BACKOFF_SECONDS", default=30)
+# Idempotency keys (payments.idempotency): Redis SET NX answers replays,
+# the IdempotencyKey table stays the durable record for first-seen keys
+IDEMPOTENCY_STORE = env(
+    "IDEMPOTENCY_STORE",
+    default=(
+        "payments.idempotency.RedisStore"
+        if USE_REDIS
+        else "payments.idempotency.DatabaseStore"
+    ),
+)
+IDEMPOTENCY_REDIS_TTL = env.int("IDEMPOTENCY_REDIS_TTL", default=24 * 60 * 60)
+# Retention (payments.services.retention): per-policy ages can be overridden
+# via RETENTION_DAYS = {"app_label.Model": days}; archives are written only
+# when RETENTION_ARCHIVE_DIR is set
+RETENTION_CHUNK_SIZE = env.int("RETENTION_CHUNK_SIZE", default=1000)
+RETENTION_SLEEP_SECONDS = env.float("RETENTION_SLEEP_SECONDS", default=0.1)
+RETENTION_ARCHIVE_DIR = env("RETENTION_ARCHIVE_DIR", default="")
+RETENTION_DAYS: dict[str, int] = {}
+# Mail outbox (notifications.outbox): callers enqueue, a worker sends the
+# batch over one SMTP connection; INLINE sends right after commit in-process
+# (the default without REDIS_URL, i.e. without a Celery broker)
+EMAIL_OUTBOX_SEND_INLINE = env.bool("EMAIL_OUTBOX_SEND_INLINE", default=not USE_REDIS)
+EMAIL_OUTBOX_BATCH_SIZE = env.int("EMAIL_OUTBOX_BATCH_SIZE", default=100)
+EMAIL_OUTBOX_MAX_ATTEMPTS = env.int("EMAIL_OUTBOX_MAX_ATTEMPTS", default=6)
+EMAIL_OUTBOX_RETRY_BACKOFF_SECONDS = env.float(
+    "EMAIL_OUTBOX_RETRY_BACKOFF_SECONDS", default=60
+)
+EMAIL_OUTBOX_MAX_PER_SECOND = env.float("EMAIL_OUTBOX_MAX_PER_SECOND", default=0)
+EMAIL_OUTBOX_PER_RECIPIENT_PER_HOUR = env.int(
+    "EMAIL_OUTBOX_PER_RECIPIENT_PER_HOUR", default=20
+)
 
 if IS_PROD:
     missing = [
@@ -156,12 +156,18 @@ class ProductOutSerializer(serializers.ModelSerializer):
 # Delivery
 # -----------------------
 class DeliverySerializer(serializers.ModelSerializer):
+    # Filled by views that pass context["etas"] (orders.eta.delivery_etas).
+    eta_minutes = serializers.SerializerMethodField()
+
     class Meta:
         model = Delivery
         fields = "__all__"
         # Avoid component name collision with orders.serializers.DeliverySerializer
         ref_name = "APIsDelivery"
 
+    def get_eta_minutes(self, obj) -> float | None:
+        return (self.context.get("etas") or {}).get(obj.pk)
+
 
 class DeliveryAssignSerializer(serializers.Serializer):
     driver_id = serializers.IntegerField()
@@ -199,6 +205,40 @@ class DeliveryStatusSerializer(serializers.Serializer):
             self.fields["status"] = serializers.ChoiceField(choices=choices)
 
 
+class _BulkTransitionItem(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(
+        choices=["assigned", "picked_up", "en_route", "delivered"]
+    )
+
+
+class DeliveryBulkTransitionSerializer(serializers.Serializer):
+    owner_id = serializers.IntegerField(required=False)
+    driver_id = serializers.IntegerField(required=False)
+    all_or_nothing = serializers.BooleanField(default=False)
+    transitions = _BulkTransitionItem(many=True, allow_empty=False)
+
+    def validate_transitions(self, value):
+        limit = 500
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} deliveries per call.")
+        return value
+
+    def validate(self, attrs):
+        assigning = any(t["status"] == "assigned" for t in attrs["transitions"])
+        if assigning and attrs.get("driver_id") is None:
+            raise serializers.ValidationError(
+                {"driver_id": "Required when assigning deliveries."}
+            )
+        return attrs
+
+
+class DeliveryBulkTransitionResultSerializer(serializers.Serializer):
+    updated = serializers.ListField(child=serializers.IntegerField())
+    unchanged = serializers.ListField(child=serializers.IntegerField())
+    rejected = serializers.DictField(child=serializers.CharField())
+
+
 # -----------------------
 # Vendor product creation
 #   Supports:
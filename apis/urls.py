@@ -10,10 +10,12 @@ from core.auth_views import (
 from apis.views import (  # Driver + deliveries; Vendor application; Vendor utilities; Vendor staff; General
     DeliveryAcceptAPI,
     DeliveryAssignAPI,
+    DeliveryBulkTransitionAPI,
     DeliveryStatusAPI,
     DeliveryUnassignAPI,
     DriverDeliveriesAPI,
     DriverLocationAPI,
+    DriverLocationBatchAPI,
     ShopableProductsAPI,
     VendorApplyAPI,
     VendorDeliveriesAPI,
@@ -71,7 +73,17 @@ urlpatterns = [
     # Driver
     path("driver/deliveries/", DriverDeliveriesAPI.as_view(), name="driver-deliveries"),
     path("driver/location/", DriverLocationAPI.as_view(), name="driver-location"),
+    path(
+        "driver/location/batch/",
+        DriverLocationBatchAPI.as_view(),
+        name="driver-location-batch",
+    ),
     # Deliveries management
+    path(
+        "deliveries/bulk-transition/",
+        DeliveryBulkTransitionAPI.as_view(),
+        name="delivery-bulk-transition",
+    ),
     path(
         "deliveries/<int:pk>/assign/",
         DeliveryAssignAPI.as_view(),
@@ -7,9 +7,6 @@ from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
 from io import StringIO
 from typing import ClassVar, Sequence, Type
 
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-from django.apps import apps
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.mail import EmailMultiAlternatives
@@ -34,6 +31,7 @@ from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnl
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from core import realtime
 from core.models import log_action
 from core.permissions import InGroups
 from core.siteutils import current_domain
@@ -46,7 +44,12 @@ from payments.services.reconcile import (
     reconcile_paystack,
     reconcile_stripe,
 )
+from orders import eta
 from orders.models import Delivery, DeliveryEvent, OrderItem
+from orders.services import location_ingest, vendor_live
+from orders.services.tracks import to_ms
+from orders.services.transitions import bulk_transition
+from orders.services.vendor_live import vendor_deliveries
 from product_app.models import Product
 from product_app.queries import shopable_products_q
 from product_app.utils import get_vendor_field
@@ -63,6 +66,8 @@ from users.utils import resolve_vendor_owner_for, vendor_owner_ids_for
 
 from .serializers import (
     DeliveryAssignSerializer,
+    DeliveryBulkTransitionResultSerializer,
+    DeliveryBulkTransitionSerializer,
     DeliverySerializer,
     DeliveryStatusSerializer,
     DeliveryUnassignSerializer,
@@ -129,24 +134,18 @@ def _publish_delivery(
     delivery: Delivery, kind: str, payload: dict | None = None
 ) -> None:
     """Publish a generic delivery event to the delivery's WS group."""
-    layer = get_channel_layer()
-    if not layer:
-        return
     data = {"type": "delivery.event", "kind": kind, "delivery_id": delivery.pk}
     if payload:
         data.update(payload)
-    async_to_sync(layer.group_send)(delivery.ws_group, data)
+    realtime.publish(delivery.ws_group, data)
 
 
 def _publish_vendor(owner_id: int, kind: str, payload: dict | None = None) -> None:
     """Send an event to a vendor owner group."""
-    layer = get_channel_layer()
-    if not layer:
-        return
     data = {"type": "vendor.event", "t": kind}
     if payload:
         data.update(payload)
-    async_to_sync(layer.group_send)(f"vendor.{owner_id}", data)
+    realtime.publish(f"vendor.{owner_id}", data)
 
 
 def orderitem_reverse_name() -> str:
@@ -257,7 +256,12 @@ class DriverDeliveriesAPI(SessionJWTAPIView):
             .select_related("order")
             .order_by("-id")
         )
-        serializer = DeliverySerializer(qs, many=True, context={"request": request})
+        deliveries = list(qs)
+        serializer = DeliverySerializer(
+            deliveries,
+            many=True,
+            context={"request": request, "etas": eta.delivery_etas(deliveries)},
+        )
         return Response(serializer.data)
 
 
@@ -286,32 +290,8 @@ class VendorDeliveriesAPI(SessionJWTAPIView):
         except ValueError as e:
             return Response({"owner_id": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        ProductModel = apps.get_model("product_app", "Product")
-        field = get_vendor_field(ProductModel)  # e.g., "owner" or "vendor"
-        vendor_field = f"order__items__product__{field}_id"
-
-        qs = (
-            Delivery.objects.filter(**{vendor_field: owner_id})
-            .select_related("order", "driver")
-            .distinct()
-            .order_by("-updated_at")
-        )
-
-        data = [
-            {
-                "id": d.id,
-                "order_id": d.order_id,
-                "driver_id": d.driver_id,
-                "status": d.status,
-                "assigned_at": d.assigned_at and d.assigned_at.isoformat(),
-                "picked_up_at": d.picked_up_at and d.picked_up_at.isoformat(),
-                "delivered_at": d.delivered_at and d.delivered_at.isoformat(),
-                "last_lat": float(d.last_lat) if d.last_lat is not None else None,
-                "last_lng": float(d.last_lng) if d.last_lng is not None else None,
-                "last_ping_at": d.last_ping_at and d.last_ping_at.isoformat(),
-            }
-            for d in qs[:300]
-        ]
+        # Same rows the vendor live board receives as its WS snapshot.
+        data = vendor_deliveries(owner_id)
         return Response(data)
 
 
@@ -415,6 +395,61 @@ class DeliveryAcceptAPI(SessionJWTAPIView):
         return Response(DeliverySerializer(delivery, context={"request": request}).data)
 
 
+class DeliveryBulkTransitionAPI(SessionJWTAPIView):
+    """Move a batch of the vendor's deliveries through the state machine."""
+
+    permission_classes = [IsAuthenticated, IsVendorOrVendorStaff, HasVendorScope]
+    required_vendor_scope = "delivery"
+    serializer_class = DeliveryBulkTransitionSerializer
+
+    @extend_schema(
+        request=DeliveryBulkTransitionSerializer,
+        responses=DeliveryBulkTransitionResultSerializer,
+    )
+    def post(self, request):
+        ser = DeliveryBulkTransitionSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        data = ser.validated_data
+        try:
+            owner_id = resolve_vendor_owner_for(request.user, data.get("owner_id"))
+        except ValueError as e:
+            return Response({"owner_id": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        driver_id = data.get("driver_id")
+        if driver_id is not None:
+            get_object_or_404(User, pk=driver_id, is_active=True)
+        scope = Delivery.objects.filter(
+            **{f"order__items__product__{get_vendor_field(Product)}_id": owner_id}
+        )
+        result = bulk_transition(
+            [(t["id"], t["status"]) for t in data["transitions"]],
+            actor=request.user,
+            driver_id=driver_id,
+            queryset=scope,
+            all_or_nothing=data["all_or_nothing"],
+        )
+
+        if result.updated:
+            try:
+                log_action(
+                    request.user,
+                    owner_id,
+                    "delivery.bulk_transition",
+                    "delivery",
+                    "bulk",
+                    {"updated": result.updated},
+                )
+            except Exception as e:
+                logger.exception(
+                    "Non-critical side-effect failed in %s: %s", __name__, e
+                )
+
+        code = status.HTTP_200_OK
+        if data["all_or_nothing"] and result.rejected:
+            code = status.HTTP_409_CONFLICT
+        return Response(result.as_dict(), status=code)
+
+
 class DeliveryStatusAPI(SessionJWTAPIView):
     permission_classes = [IsAuthenticated, InGroups]
     required_groups = [DRIVER]
@@ -519,6 +554,77 @@ class DriverLocationAPI(SessionJWTAPIView):
         return Response({"ok": True, "status": "updated", "ts": now.isoformat()})
 
 
+class DriverLocationBatchAPI(SessionJWTAPIView):
+    """Upload many buffered fixes (one or more deliveries) in one request."""
+
+    permission_classes = [IsAuthenticated, InGroups]
+    required_groups = [DRIVER]
+
+    class DriverLocationBatchInSerializer(serializers.Serializer):
+        # Each fix: {"delivery_id", "lat", "lng", "ts"} (ts: epoch ms or ISO-8601)
+        fixes = serializers.ListField(child=serializers.DictField())
+
+    class DriverLocationBatchOutSerializer(serializers.Serializer):
+        ok = serializers.BooleanField()
+        accepted = serializers.IntegerField()
+        duplicates = serializers.IntegerField()
+        dropped = serializers.IntegerField()
+        rejected = serializers.ListField(child=serializers.DictField())
+
+    serializer_class = DriverLocationBatchInSerializer
+
+    @extend_schema(
+        request=DriverLocationBatchInSerializer,
+        responses=DriverLocationBatchOutSerializer,
+    )
+    def post(self, request):
+        raw = request.data.get("fixes")
+        if not isinstance(raw, list) or not raw:
+            return Response(
+                {"detail": "fixes must be a non-empty list"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = location_ingest.max_batch_size()
+        if len(raw) > limit:
+            return Response(
+                {"detail": f"at most {limit} fixes per request"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        result = location_ingest.ingest(request.user.pk, raw)
+
+        # One live update per delivery: only the newest fix is broadcast.
+        for delivery_id, fix in result.latest.items():
+            _publish_delivery(
+                Delivery(pk=delivery_id),
+                "position_update",
+                {
+                    "lat": float(fix.lat),
+                    "lng": float(fix.lng),
+                    "ts": fix.at.isoformat(),
+                },
+            )
+        for delivery_id in result.moved:
+            _publish_delivery(
+                Delivery(pk=delivery_id), "status", {"status": "en_route"}
+            )
+        vendor_live.publish_positions(
+            {
+                delivery_id: (float(fix.lat), float(fix.lng), to_ms(fix.at))
+                for delivery_id, fix in result.latest.items()
+            }
+        )
+        return Response(
+            {
+                "ok": True,
+                "accepted": result.accepted,
+                "duplicates": result.duplicates,
+                "dropped": result.dropped,
+                "rejected": result.rejected,
+            }
+        )
+
+
 # ----------------------- Products (create/import/export) -----------------------
 class VendorProductCreateAPI(SessionJWTCreateAPIView):
     permission_classes = [IsAuthenticated, IsVendorOrVendorStaff]
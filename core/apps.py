@@ -16,3 +16,8 @@ class CoreConfig(AppConfig):
 
     def ready(self):
         connection_created.connect(_force_mysql_utc)
+
+        # importing audit/realtime registers their batchers
+        from core import audit, commit_batch, realtime  # noqa: F401
+
+        commit_batch.connect_task_signals()
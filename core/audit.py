@@ -0,0 +1,94 @@
+"""Buffered audit sink for ``core.AuditLog`` and ``payments.AuditLog``.
+
+Audit rows used to be INSERTed one by one inside the business transaction
+(a paid order logs every stock decrement, ORDER_PAID, PAYMENT_SUCCESS, ...),
+which kept ``Transaction``/``ProductStock`` locks held for the extra round
+trips. :func:`record` instead:
+
+* defers each entry with ``transaction.on_commit``, so rolled-back work
+  (savepoints included) leaves no audit trail, as before;
+* inside a ``core.commit_batch.batch`` scope (each request and each Celery
+  task) collects committed entries and writes them with one ``bulk_create``
+  per model when the scope ends; outside a scope each commit writes its
+  entries right away;
+* with ``AUDIT_MODE = "queue"`` ships the rows to ``core.tasks.write_audit_entries``
+  instead (written in-process if the broker is unreachable);
+  ``AUDIT_MODE = "sync"`` restores the plain INSERT.
+
+Rows get their ``created_at`` when written, not when recorded.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+
+from core import commit_batch, metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _mode() -> str:
+    return getattr(settings, "AUDIT_MODE", "commit")
+
+
+def _max_batch() -> int:
+    return int(getattr(settings, "AUDIT_MAX_BATCH", 500))
+
+
+def serialize(obj) -> dict:
+    """``{"model": label, "fields": {attname: value}}`` for the queue."""
+    fields = {
+        f.attname: getattr(obj, f.attname)
+        for f in obj._meta.concrete_fields
+        if not f.primary_key and f.attname != "created_at"
+    }
+    return {"model": obj._meta.label, "fields": fields}
+
+
+def write(objs) -> int:
+    """Bulk-insert unsaved audit instances, one statement per model."""
+    by_model = defaultdict(list)
+    for obj in objs:
+        by_model[type(obj)].append(obj)
+    for model, rows in by_model.items():
+        model.objects.bulk_create(rows, batch_size=_max_batch())
+        metrics.inc("audit_rows_written", len(rows), model=model._meta.label)
+    return sum(len(rows) for rows in by_model.values())
+
+
+def write_serialized(rows: list[dict]) -> int:
+    return write(apps.get_model(r["model"])(**r["fields"]) for r in rows)
+
+
+def _dispatch(objs: list) -> None:
+    if _mode() == "queue":
+        from core.tasks import write_audit_entries
+
+        rows = [serialize(o) for o in objs]
+        try:
+            write_audit_entries.delay(rows)
+            return
+        except Exception as exc:  # broker unreachable
+            logger.warning("Audit enqueue failed, writing inline: %s", exc)
+    try:
+        write(objs)
+    except Exception as exc:
+        # the audited work is already committed; never fail the caller
+        metrics.inc("audit_write_failed", len(objs))
+        logger.exception("Audit write failed for %d rows: %s", len(objs), exc)
+
+
+_batcher = commit_batch.Batcher(_dispatch, _max_batch)
+
+
+def record(obj, *, using: str | None = None):
+    """Write the unsaved audit instance ``obj`` once the transaction commits."""
+    if _mode() == "sync":
+        obj.save(using=using)
+        return obj
+    _batcher.defer([obj], using=using)
+    return obj
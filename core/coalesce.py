@@ -0,0 +1,81 @@
+"""Latest-value coalescing for high-rate async fan-out.
+
+A :class:`LatestCoalescer` forwards at most one item per key per ``interval``
+seconds. The first item after a quiet period goes out immediately; items that
+arrive inside the window replace each other and only the newest is sent when
+the window closes, so subscribers always converge on the latest value.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+Sender = Callable[[str, Any], Awaitable[None]]
+
+
+class LatestCoalescer:
+    def __init__(self, interval: float, send: Sender, *, name: str = "coalesce"):
+        self.interval = float(interval)
+        self._send = send
+        self._name = name
+        self._last_sent: dict[str, float] = {}
+        self._pending: dict[str, Any] = {}
+        self._timers: dict[str, asyncio.Task] = {}
+
+    async def submit(self, key: str, item: Any) -> bool:
+        """Send or park ``item``; return True when it was sent right away."""
+        if self.interval <= 0:
+            await self._send(key, item)
+            return True
+        timer = self._timers.get(key)
+        if timer is not None and not timer.done():
+            if timer.get_loop() is asyncio.get_running_loop():
+                self._pending[key] = item
+                metrics.inc(f"{self._name}_dropped")
+                return False
+            timer.cancel()  # stale loop (tests, worker restart)
+        now = time.monotonic()
+        wait = self._last_sent.get(key, float("-inf")) + self.interval - now
+        if wait <= 0:
+            self._mark(key, now)
+            await self._send(key, item)
+            return True
+        self._pending[key] = item
+        self._timers[key] = asyncio.ensure_future(self._send_later(key, wait))
+        return False
+
+    async def _send_later(self, key: str, delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self._timers.pop(key, None)
+        item = self._pending.pop(key, None)
+        if item is None:
+            return
+        self._mark(key, time.monotonic())
+        try:
+            await self._send(key, item)
+        except Exception as e:
+            logger.debug("%s send failed: %s", self._name, e, exc_info=True)
+
+    def _mark(self, key: str, now: float) -> None:
+        self._last_sent[key] = now
+        if len(self._last_sent) > 4096:
+            horizon = now - self.interval
+            for k in [k for k, t in self._last_sent.items() if t < horizon]:
+                del self._last_sent[k]
+
+    def cancel(self) -> None:
+        """Drop pending items and timers (e.g. when the connection closes)."""
+        for task in self._timers.values():
+            task.cancel()
+        self._timers.clear()
+        self._pending.clear()
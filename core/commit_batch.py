@@ -0,0 +1,116 @@
+"""After-commit batch scopes shared by ``core.realtime`` and ``core.audit``.
+
+Both defer their side effects with ``transaction.on_commit`` and want a
+request's (or Celery task's) committed items handed over together. Each
+registers a :class:`Batcher` with its own ``dispatch``:
+
+* :meth:`Batcher.defer` stages items once the current transaction commits,
+  so rolled-back work (savepoints included) produces nothing;
+* inside a :func:`batch` scope (each request via
+  ``core.middleware.CommitBatchMiddleware``, each Celery task via the task
+  signals) staged items are collected per batcher and dispatched together
+  when the scope ends, or early once ``max_batch`` is reached; outside a
+  scope each commit's items are dispatched right away.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections.abc import Callable, Iterable
+from contextlib import contextmanager
+from functools import partial
+
+from asgiref.local import Local
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+_state = Local()
+_batchers: list[Batcher] = []
+
+
+class Batcher:
+    """One kind of after-commit work, e.g. channel-layer messages."""
+
+    def __init__(self, dispatch: Callable[[list], None], max_batch: Callable[[], int]):
+        self.dispatch = dispatch
+        self.max_batch = max_batch
+        _batchers.append(self)
+
+    def _pending(self) -> list | None:
+        """This batcher's items in the open scope, or None outside :func:`batch`."""
+        scope = getattr(_state, "scope", None)
+        return None if scope is None else scope.setdefault(self, [])
+
+    def stage(self, items: list) -> None:
+        pending = self._pending()
+        if pending is None:
+            self.dispatch(items)
+            return
+        pending.extend(items)
+        if len(pending) >= self.max_batch():
+            self.flush()
+
+    def defer(self, items: Iterable, *, using: str | None = None) -> None:
+        """Stage ``items`` as one unit once the current transaction commits."""
+        items = list(items)
+        if items:
+            transaction.on_commit(partial(self.stage, items), using=using)
+
+    def flush(self) -> None:
+        """Dispatch whatever the open scope holds for this batcher."""
+        pending = self._pending()
+        if pending:
+            items = pending[:]
+            pending.clear()
+            self.dispatch(items)
+
+
+def flush() -> None:
+    for batcher in _batchers:
+        try:
+            batcher.flush()
+        except Exception:
+            # one failing sink must not keep the others from flushing
+            logger.exception("commit batch flush failed")
+
+
+@contextmanager
+def batch():
+    """Collect committed items and dispatch them together on exit (nestable)."""
+    if getattr(_state, "scope", None) is not None:
+        yield
+        return
+    _state.scope = {}
+    try:
+        yield
+    finally:
+        try:
+            flush()
+        finally:
+            _state.scope = None
+
+
+# ---- Celery: one batch per task ----
+_task_batches: dict[str, object] = {}
+
+
+def _task_started(task_id=None, **kwargs):
+    scope = batch()
+    scope.__enter__()
+    _task_batches[task_id] = scope
+
+
+def _task_finished(task_id=None, **kwargs):
+    scope = _task_batches.pop(task_id, None)
+    if scope is not None:
+        scope.__exit__(None, None, None)
+
+
+def connect_task_signals() -> None:
+    try:
+        from celery.signals import task_postrun, task_prerun
+    except ImportError:  # pragma: no cover - celery not installed
+        return
+    task_prerun.connect(_task_started, weak=False)
+    task_postrun.connect(_task_finished, weak=False)
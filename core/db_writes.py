@@ -0,0 +1,53 @@
+"""Bounded thread pool for ORM writes issued from async consumers.
+
+Reads in consumers use Django's async ORM. Writes still need a sync
+connection, and ``database_sync_to_async`` would borrow a slot from the
+shared default executor for each one. Routing them through this pool
+(``WS_DB_WRITE_POOL_SIZE`` threads) keeps connected sockets from starving
+other work: at most that many writes run at once, and each worker thread
+holds one connection.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from core import metrics
+
+_EXECUTOR: ThreadPoolExecutor | None = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def write_executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(
+                max_workers=int(getattr(settings, "WS_DB_WRITE_POOL_SIZE", 4)),
+                thread_name_prefix="ws-db-write",
+            )
+        return _EXECUTOR
+
+
+def _call(fn, args, kwargs):
+    # Same connection hygiene as channels' database_sync_to_async.
+    close_old_connections()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_write(fn, *args, **kwargs):
+    """Run ``fn(*args, **kwargs)`` on the write pool and await its result."""
+    loop = asyncio.get_running_loop()
+    with metrics.timer("ws_db_write_seconds"):
+        return await loop.run_in_executor(
+            write_executor(), functools.partial(_call, fn, args, kwargs)
+        )
@@ -0,0 +1,65 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.test.utils import setup_databases, teardown_databases
+
+from core.ws_loadtest import LoadTestConfig, run_loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the delivery tracker and notifications WebSockets in-process "
+        "(in-memory channel layer, throwaway test database)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--drivers", type=int, default=10)
+        parser.add_argument(
+            "--watchers", type=int, default=5, help="subscribers per delivery"
+        )
+        parser.add_argument("--notify-users", type=int, default=0)
+        parser.add_argument("--duration", type=float, default=5.0, help="seconds")
+        parser.add_argument("--rate", type=float, default=1.0, help="fixes/s/driver")
+        parser.add_argument("--notify-rate", type=float, default=1.0)
+        parser.add_argument("--fanout-interval", type=float, default=None)
+        parser.add_argument("--client-interval", type=float, default=None)
+        parser.add_argument(
+            "--keepdb", action="store_true", help="reuse the test database"
+        )
+        parser.add_argument("--json", action="store_true", help="print JSON only")
+
+    def handle(self, *args, **o):
+        cfg = LoadTestConfig(
+            drivers=o["drivers"],
+            watchers=o["watchers"],
+            notify_users=o["notify_users"],
+            duration=o["duration"],
+            rate=o["rate"],
+            notify_rate=o["notify_rate"],
+            fanout_interval=o["fanout_interval"],
+            client_interval=o["client_interval"],
+        )
+        old = setup_databases(verbosity=0, interactive=False, keepdb=o["keepdb"])
+        try:
+            report = run_loadtest(cfg)
+        finally:
+            teardown_databases(old, verbosity=0, keepdb=o["keepdb"])
+
+        if o["json"]:
+            self.stdout.write(json.dumps(report.as_dict()))
+            return
+        lat = report.latency_ms
+        self.stdout.write(
+            f"connections={report.connections} seconds={report.seconds} "
+            f"frames_in={report.frames_in} frames_out={report.frames_out} "
+            f"({report.frames_out_per_s}/s)"
+        )
+        self.stdout.write(
+            "fan-out latency ms: "
+            + (" ".join(f"{k}={v}" for k, v in lat.items()) or "no samples")
+        )
+        self.stdout.write(
+            f"db queries={report.db_queries} "
+            f"({report.queries_per_frame_in}/inbound frame) "
+            f"mem/conn={report.mem_per_conn_kb} KiB errors={report.errors}"
+        )
@@ -5,6 +5,8 @@ import uuid
 
 from django.conf import settings
 
+from core import commit_batch
+
 # Allowed origins for local development (both HTTP and HTTPS)
 DEV_ORIGINS = (
     "http://127.0.0.1:8000",
@@ -83,3 +85,14 @@ class PermissionsPolicyMiddleware:
 
         _set_header(resp, "Permissions-Policy", ", ".join(parts))
         return resp
+
+
+class CommitBatchMiddleware:
+    """Flush a request's after-commit batches (realtime, audit) at its end."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with commit_batch.batch():
+            return self.get_response(request)
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 from django.conf import settings
-from django.db import models, transaction
+from django.db import models
+
+from core import audit
 
 
 class AuditLog(models.Model):
@@ -21,7 +23,6 @@ class AuditLog(models.Model):
         ]
 
 
-@transaction.atomic
 def log_action(
     actor,
     owner_id: int | None,
@@ -30,11 +31,14 @@ def log_action(
     target_id,
     meta: dict | None = None,
 ) -> AuditLog:
-    return AuditLog.objects.create(
-        actor=actor if getattr(actor, "pk", None) else None,
-        owner_id=owner_id,
-        action=action,
-        target_type=target_type,
-        target_id=str(target_id),
-        meta=meta or {},
+    """Record an audit entry; it is written after commit (see ``core.audit``)."""
+    return audit.record(
+        AuditLog(
+            actor=actor if getattr(actor, "pk", None) else None,
+            owner_id=owner_id,
+            action=action,
+            target_type=target_type,
+            target_id=str(target_id),
+            meta=meta or {},
+        )
     )
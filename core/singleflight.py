@@ -0,0 +1,93 @@
+"""Per-process request coalescing ("single flight").
+
+Concurrent callers asking for the same key share one execution of the
+underlying function: the first caller runs it, the rest wait for its result
+(or exception). Nothing is cached once the call completes.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+
+class _Call:
+    __slots__ = ("event", "result", "exc")
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result: Any = None
+        self.exc: BaseException | None = None
+
+
+class SingleFlight:
+    """Thread-based coalescing for sync code paths (WSGI workers, thread pools)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call] = {}
+
+    def do(
+        self, key: str, fn: Callable[[], Any], *, timeout: float | None = None
+    ) -> tuple[Any, bool]:
+        """Return (result, shared). ``shared`` is True when another caller ran fn.
+
+        If the leader does not finish within ``timeout`` seconds the waiter
+        runs ``fn`` itself rather than blocking indefinitely.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if call.event.wait(timeout):
+                if call.exc is not None:
+                    raise call.exc
+                return call.result, True
+            return fn(), False
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as exc:
+            call.exc = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+
+class AsyncSingleFlight:
+    """Coroutine-based coalescing for a single event loop (ASGI workers)."""
+
+    def __init__(self) -> None:
+        self._calls: dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        loop = asyncio.get_running_loop()
+        fut = self._calls.get(key)
+        if fut is not None and fut.get_loop() is loop and not fut.done():
+            return await asyncio.shield(fut), True
+
+        fut = loop.create_future()
+        self._calls[key] = fut
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as exc:
+            fut.set_exception(exc)
+            fut.exception()  # mark retrieved when nobody else is waiting
+            raise
+        else:
+            fut.set_result(result)
+            return result, False
+        finally:
+            if self._calls.get(key) is fut:
+                del self._calls[key]
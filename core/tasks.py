@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+from celery import shared_task
+
+from core import audit
+
+
+@shared_task
+def write_audit_entries(rows: list[dict]) -> int:
+    """Bulk-insert audit rows shipped by ``core.audit`` in queue mode."""
+    return audit.write_serialized(rows)
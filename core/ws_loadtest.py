@@ -0,0 +1,347 @@
+"""In-process WebSocket load test for the delivery tracker and notifications.
+
+Drives the real ASGI ``application`` (auth middleware, routing, consumers)
+with ``channels.testing.WebsocketCommunicator`` over the in-memory channel
+layer, so results show consumer and ORM cost per worker without network or
+Redis noise:
+
+* ``drivers`` simulated drivers, each on their own delivery, send position
+  fixes at ``rate`` Hz; ``watchers`` sockets per delivery (the customer's
+  tabs/devices) receive the fan-out;
+* ``notify_users`` sockets on ``/ws/notifications/`` receive ``notify``
+  pushes at ``notify_rate`` Hz each.
+
+Fan-out latency is measured from the moment a frame is handed to the sender
+until a subscriber reads it. DB queries are counted on every connection
+opened during the run, and memory per connection is the tracemalloc delta
+across the connect phase.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http.request import validate_host
+from django.test.utils import override_settings
+
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+LAT0, LNG0 = -1.2921, 36.8219
+STEP = 1e-5  # ~1.1 m per fix; also encodes the fix number in the latitude
+
+
+@dataclass
+class LoadTestConfig:
+    drivers: int = 10
+    watchers: int = 5
+    notify_users: int = 0
+    duration: float = 5.0
+    rate: float = 1.0
+    notify_rate: float = 1.0
+    fanout_interval: float | None = None  # WS_POSITION_FANOUT_INTERVAL
+    client_interval: float | None = None  # WS_POSITION_CLIENT_INTERVAL
+
+
+@dataclass
+class LoadTestReport:
+    connections: int = 0
+    frames_in: int = 0
+    frames_out: int = 0
+    seconds: float = 0.0
+    frames_out_per_s: float = 0.0
+    latency_ms: dict[str, float] = field(default_factory=dict)
+    db_queries: int = 0
+    queries_per_frame_in: float = 0.0
+    mem_per_conn_kb: float = 0.0
+    errors: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def _percentiles(samples: list[float]) -> dict[str, float]:
+    if not samples:
+        return {}
+    s = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(s[min(len(s) - 1, int(q * len(s)))], 2)
+
+    return {
+        "p50": pick(0.50),
+        "p90": pick(0.90),
+        "p99": pick(0.99),
+        "max": round(s[-1], 2),
+    }
+
+
+class _QueryCounter:
+    """Counts queries on every DB connection opened while installed."""
+
+    def __init__(self):
+        self.count = 0
+        self.enabled = False
+        self._patched = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.enabled:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def _attach(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+            self._patched.append(connection)
+
+    def install(self):
+        connection_created.connect(self._attach)
+        for conn in connections.all():
+            self._attach(None, conn)
+
+    def uninstall(self):
+        connection_created.disconnect(self._attach)
+        for conn in self._patched:
+            if self in conn.execute_wrappers:
+                conn.execute_wrappers.remove(self)
+
+
+# ---- fixtures ----
+def seed(cfg: LoadTestConfig) -> dict:
+    """Create users, deliveries and session cookies for one run."""
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.models import Group
+
+    from orders.models import Delivery, Order
+    from users.constants import DRIVER
+
+    User = get_user_model()
+    tag = f"lt{int(time.time() * 1000) % 10**9}"
+    drivers_group, _ = Group.objects.get_or_create(name=DRIVER)
+    customer = User.objects.create_user(username=f"{tag}_c", password=None)
+    deliveries: list[tuple[int, str]] = []
+    notify: list[tuple[int, str]] = []
+    for i in range(cfg.drivers):
+        driver = User.objects.create_user(username=f"{tag}_d{i}", password=None)
+        driver.groups.add(drivers_group)
+        order = Order.objects.create(
+            user=customer,
+            full_name="Load test",
+            email="loadtest@example.com",
+            address="-",
+            latitude=LAT0,  # coords present: no geocoding on save
+            longitude=LNG0,
+            dest_address_text="-",
+            dest_lat=LAT0,
+            dest_lng=LNG0,
+        )
+        d = Delivery.objects.create(
+            order=order,
+            driver=driver,
+            status=Delivery.Status.ASSIGNED,
+            origin_lat=LAT0,
+            origin_lng=LNG0,
+            dest_lat=LAT0,
+            dest_lng=LNG0,
+        )
+        deliveries.append((d.pk, _session_cookie(driver)))
+    for i in range(cfg.notify_users):
+        u = User.objects.create_user(username=f"{tag}_n{i}", password=None)
+        notify.append((u.pk, _session_cookie(u)))
+    return {
+        "customer": _session_cookie(customer),
+        "deliveries": deliveries,
+        "notify": notify,
+    }
+
+
+def _session_cookie(user) -> str:
+    store = import_module(settings.SESSION_ENGINE).SessionStore()
+    store[SESSION_KEY] = str(user.pk)
+    store[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    store.save()
+    return f"{settings.SESSION_COOKIE_NAME}={store.session_key}"
+
+
+# ---- run ----
+async def _open(app, path: str, cookie: str, origin: str) -> WebsocketCommunicator:
+    headers = [(b"cookie", cookie.encode())]
+    if origin:
+        headers.append((b"origin", origin.encode()))
+    comm = WebsocketCommunicator(app, path, headers=headers)
+    connected, _ = await comm.connect(timeout=10)
+    if not connected:
+        raise RuntimeError(f"WebSocket refused: {path}")
+    return comm
+
+
+async def _read(comm, on_frame) -> None:
+    # No short timeout: on timeout the communicator cancels the application.
+    # Readers are cancelled instead once the run is over.
+    while True:
+        try:
+            raw = await comm.receive_from(timeout=3600)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            return
+        on_frame(raw)
+
+
+def _target():
+    """The full ASGI app plus an Origin it accepts.
+
+    When no configured origin is also an allowed host (e.g. prod origins under
+    the test runner) the stack below the origin validators is used instead;
+    auth, routing and consumers are the same.
+    """
+    from channels.auth import AuthMiddlewareStack
+    from channels.routing import URLRouter
+
+    from Rahim_Online_ClothesStore import asgi
+
+    for origin in asgi.ALLOWED_ORIGINS:
+        host = urlsplit(origin).hostname
+        if host and validate_host(host, settings.ALLOWED_HOSTS):
+            return asgi.application, origin
+    return AuthMiddlewareStack(URLRouter(asgi.websocket_urlpatterns)), ""
+
+
+async def _run(cfg: LoadTestConfig, fx: dict) -> LoadTestReport:
+    from orders.services.ping_buffer import ping_buffer
+
+    app, origin = _target()
+    report = LoadTestReport()
+    sent: dict[tuple[int, int], float] = {}
+    latencies: list[float] = []
+    counter = _QueryCounter()
+    counter.install()
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    watchers, drivers, notified = [], [], []
+    for delivery_id, cookie in fx["deliveries"]:
+        path = f"/ws/delivery/track/{delivery_id}/"
+        for _ in range(cfg.watchers):
+            watchers.append(
+                (delivery_id, await _open(app, path, fx["customer"], origin))
+            )
+        drivers.append((delivery_id, await _open(app, path, cookie, origin)))
+    for user_id, cookie in fx["notify"]:
+        notified.append(
+            (user_id, await _open(app, "/ws/notifications/", cookie, origin))
+        )
+    report.connections = len(watchers) + len(drivers) + len(notified)
+    if report.connections:
+        grown = tracemalloc.get_traced_memory()[0] - before
+        report.mem_per_conn_kb = round(grown / report.connections / 1024, 2)
+    tracemalloc.stop()
+
+    def on_position(delivery_id):
+        def handle(raw):
+            report.frames_out += 1
+            try:
+                msg = json.loads(raw)
+            except (TypeError, ValueError):
+                return
+            if msg.get("type") != "position_update":
+                return
+            seq = round((float(msg["lat"]) - LAT0) / STEP)
+            t0 = sent.get((delivery_id, seq))
+            if t0 is not None:
+                latencies.append((time.perf_counter() - t0) * 1000)
+
+        return handle
+
+    def on_notify(raw):
+        report.frames_out += 1
+        try:
+            t0 = json.loads(raw).get("t0")
+        except (TypeError, ValueError):
+            return
+        if t0 is not None:
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    async def drive(delivery_id, comm, deadline):
+        seq = 0
+        while time.perf_counter() < deadline:
+            seq += 1
+            frame = {"op": "update", "lat": LAT0 + seq * STEP, "lng": LNG0}
+            sent[(delivery_id, seq)] = time.perf_counter()
+            await comm.send_json_to(frame)
+            report.frames_in += 1
+            await asyncio.sleep(1.0 / cfg.rate)
+
+    async def push(user_id, deadline):
+        layer = get_channel_layer()
+        while time.perf_counter() < deadline:
+            payload = {"type": "loadtest", "t0": time.perf_counter()}
+            await layer.group_send(
+                f"user_{user_id}", {"type": "notify", "payload": payload}
+            )
+            await asyncio.sleep(1.0 / cfg.notify_rate)
+
+    readers = [
+        asyncio.ensure_future(_read(c, on_position(d))) for d, c in watchers + drivers
+    ] + [asyncio.ensure_future(_read(c, on_notify)) for _, c in notified]
+
+    counter.enabled = True
+    started = time.perf_counter()
+    deadline = started + cfg.duration
+    senders = [drive(d, c, deadline) for d, c in drivers]
+    senders += [push(u, deadline) for u, _ in notified if cfg.notify_rate > 0]
+    results = await asyncio.gather(*senders, return_exceptions=True)
+    report.errors = sum(isinstance(r, Exception) for r in results)
+    # let coalesced trailing frames arrive
+    tail = max(
+        float(getattr(settings, "WS_POSITION_FANOUT_INTERVAL", 1.0)),
+        float(getattr(settings, "WS_POSITION_CLIENT_INTERVAL", 0.5)),
+    )
+    await asyncio.sleep(tail + 0.1)
+    report.seconds = round(time.perf_counter() - started, 3)
+    if ping_buffer.depth:
+        await ping_buffer.aflush(get_channel_layer())
+    counter.enabled = False
+
+    for task in readers:
+        task.cancel()
+    await asyncio.gather(*readers, return_exceptions=True)
+    for _, comm in watchers + drivers + notified:
+        await comm.disconnect()
+    counter.uninstall()
+
+    report.frames_out_per_s = round(report.frames_out / report.seconds, 1)
+    report.latency_ms = _percentiles(latencies)
+    report.db_queries = counter.count
+    if report.frames_in:
+        report.queries_per_frame_in = round(counter.count / report.frames_in, 3)
+    return report
+
+
+def run_loadtest(cfg: LoadTestConfig) -> LoadTestReport:
+    """Seed fixtures and run one load test (call from sync code)."""
+    overrides: dict[str, object] = {"CHANNEL_LAYERS": IN_MEMORY_LAYER}
+    if cfg.fanout_interval is not None:
+        overrides["WS_POSITION_FANOUT_INTERVAL"] = cfg.fanout_interval
+    if cfg.client_interval is not None:
+        overrides["WS_POSITION_CLIENT_INTERVAL"] = cfg.client_interval
+    with override_settings(**overrides):
+        from orders import consumers
+
+        consumers._FANOUT = None  # pick up the interval for this run
+        fx = seed(cfg)
+        try:
+            return asyncio.run(_run(cfg, fx))
+        finally:
+            consumers._FANOUT = None
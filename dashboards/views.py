@@ -110,7 +110,8 @@ def vendor_dashboard(request):
 @login_required
 def vendor_live(request):
     """
-    Simple live board that polls vendor deliveries API and renders a table.
+    Live board fed by the vendor WebSocket (snapshot + diffs); falls back to
+    polling the vendor deliveries API while the socket is down.
     Requires vendor or staff role. Owner context can be passed to the client.
     """
     u = request.user
@@ -1,20 +1,16 @@
 from __future__ import annotations
 
 import os
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
 from product_app.models import ProductStock
 from django.db.models import Sum
 
+from core import realtime
+
 
 def _publish_vendor(owner_id: int, event: str, payload: dict | None = None) -> None:
     """
-    Send a websocket event to a vendor's group.
+    Send a websocket event to a vendor's group (after commit).
     """
-    layer = get_channel_layer()
-    if not layer:
-        return
-
     data: dict[str, object] = {
         "type": "vendor.event",
         "t": event,
@@ -24,7 +20,7 @@ def _publish_vendor(owner_id: int, event: str, payload: dict | None = None) -> N
     if payload:
         data.update(payload)
 
-    async_to_sync(layer.group_send)(f"vendor.{owner_id}", data)
+    realtime.publish(f"vendor.{owner_id}", data)
 
 
 def check_low_stock_and_notify(product) -> None:
@@ -23,3 +23,41 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+
+
+class OutboundEmail(models.Model):
+    """One queued message for one recipient.
+
+    Callers enqueue through ``notifications.outbox``; a worker drains due
+    rows over a single SMTP connection and retries failures with backoff
+    until the message is parked as ``dead``.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        SENT = "sent", "Sent"
+        DEAD = "dead", "Dead letter"
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True, default="")
+    html_body = models.TextField(blank=True, default="")
+    from_email = models.CharField(max_length=254, blank=True, default="")
+    reply_to = models.JSONField(default=list, blank=True)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+            models.Index(fields=["to_email", "sent_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.to_email}: {self.subject}"
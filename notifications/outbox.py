@@ -0,0 +1,224 @@
+"""Outbound mail queue.
+
+Callers used to send in-line, one ``send_mail`` per message and a fresh
+SMTP connection each time, sometimes inside the request. They now only
+:func:`enqueue` an ``OutboundEmail`` row; once the transaction commits a
+worker (``notifications.tasks.send_outbound_email``, swept every minute by
+beat) runs :func:`drain`, which:
+
+* claims up to ``EMAIL_OUTBOX_BATCH_SIZE`` due rows with
+  ``SELECT ... FOR UPDATE SKIP LOCKED`` and leases them, so concurrent
+  workers never send the same message;
+* sends them over one opened connection with ``send_messages``;
+* retries a failed message with exponential backoff, parking it as
+  ``dead`` after ``EMAIL_OUTBOX_MAX_ATTEMPTS``;
+* paces sends to ``EMAIL_OUTBOX_MAX_PER_SECOND`` and defers messages to a
+  recipient who already got ``EMAIL_OUTBOX_PER_RECIPIENT_PER_HOUR``.
+
+``EMAIL_OUTBOX_SEND_INLINE`` drains right after commit in-process (no
+worker needed).
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from core import metrics
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# how long a claimed row stays hidden from other workers
+CLAIM_LEASE = timedelta(minutes=10)
+MAX_BACKOFF_SECONDS = 6 * 60 * 60
+RECIPIENT_WINDOW = timedelta(hours=1)
+
+
+def enqueue(
+    to_email: str,
+    subject: str,
+    body: str = "",
+    html_body: str = "",
+    *,
+    from_email: str | None = None,
+    reply_to: list[str] | None = None,
+) -> OutboundEmail | None:
+    """Queue one message; it is handed to a worker once the transaction commits."""
+    if not to_email:
+        return None
+    msg = OutboundEmail.objects.create(
+        to_email=to_email,
+        subject=subject[:255],
+        body=body,
+        html_body=html_body,
+        from_email=from_email or "",
+        reply_to=list(reply_to or []),
+    )
+    metrics.inc("outbound_email", outcome="queued")
+    transaction.on_commit(kick)
+    return msg
+
+
+def kick() -> None:
+    """Ask a worker to drain the queue (in-process if that fails)."""
+    if not getattr(settings, "EMAIL_OUTBOX_SEND_INLINE", False):
+        from notifications.tasks import send_outbound_email
+
+        try:
+            send_outbound_email.delay()
+            return
+        except Exception as exc:  # broker unreachable
+            logger.warning("notifications.outbox.enqueue_failed: %s", exc)
+    drain()
+
+
+def _backoff(attempts: int) -> timedelta:
+    base = float(getattr(settings, "EMAIL_OUTBOX_RETRY_BACKOFF_SECONDS", 60))
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS))
+
+
+def _claim(limit: int, now) -> list[OutboundEmail]:
+    with transaction.atomic():
+        rows = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboundEmail.Status.PENDING)
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+            .order_by("id")[:limit]
+        )
+        OutboundEmail.objects.filter(pk__in=[r.pk for r in rows]).update(
+            next_attempt_at=now + CLAIM_LEASE
+        )
+    return rows
+
+
+def _release(rows, when) -> None:
+    """Hand claimed rows back without counting an attempt."""
+    OutboundEmail.objects.filter(pk__in=[r.pk for r in rows]).update(
+        next_attempt_at=when
+    )
+
+
+def _fail(row: OutboundEmail, exc: Exception, now) -> str:
+    row.attempts += 1
+    row.last_error = f"{type(exc).__name__}: {exc}"[:2000]
+    if row.attempts >= int(getattr(settings, "EMAIL_OUTBOX_MAX_ATTEMPTS", 6)):
+        row.status = OutboundEmail.Status.DEAD
+        row.next_attempt_at = None
+        outcome = "dead"
+        logger.error(
+            "notifications.outbox.dead: email %s to %s after %s attempts: %s",
+            row.pk,
+            row.to_email,
+            row.attempts,
+            row.last_error,
+        )
+    else:
+        row.next_attempt_at = now + _backoff(row.attempts)
+        outcome = "retry"
+    row.save(update_fields=["attempts", "last_error", "status", "next_attempt_at"])
+    return outcome
+
+
+def _message(row: OutboundEmail, connection) -> EmailMultiAlternatives:
+    msg = EmailMultiAlternatives(
+        row.subject,
+        row.body,
+        row.from_email or settings.DEFAULT_FROM_EMAIL,
+        [row.to_email],
+        reply_to=row.reply_to or None,
+        connection=connection,
+    )
+    if row.html_body:
+        msg.attach_alternative(row.html_body, "text/html")
+    return msg
+
+
+def _sent_recently(rows, now) -> Counter:
+    recipients = {r.to_email for r in rows}
+    return Counter(
+        dict(
+            OutboundEmail.objects.filter(
+                to_email__in=recipients, sent_at__gte=now - RECIPIENT_WINDOW
+            )
+            .values("to_email")
+            .annotate(n=Count("id"))
+            .values_list("to_email", "n")
+        )
+    )
+
+
+def drain(*, limit: int | None = None, now=None, sleep_fn=time.sleep) -> dict:
+    """Send one batch of due messages. Returns a count per outcome."""
+    now = now or timezone.now()
+    if not limit:
+        limit = int(getattr(settings, "EMAIL_OUTBOX_BATCH_SIZE", 100))
+    rows = _claim(limit, now)
+    counts: Counter = Counter(claimed=len(rows))
+    if not rows:
+        return dict(counts)
+
+    per_recipient = int(getattr(settings, "EMAIL_OUTBOX_PER_RECIPIENT_PER_HOUR", 20))
+    rate = float(getattr(settings, "EMAIL_OUTBOX_MAX_PER_SECOND", 0))
+    sent_recently = _sent_recently(rows, now) if per_recipient else Counter()
+
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        # server unreachable: nobody's fault, try the whole batch later
+        _release(rows, now + _backoff(1))
+        counts["deferred"] += len(rows)
+        logger.warning("notifications.outbox.connect_failed: %s", exc)
+        return dict(counts)
+
+    try:
+        for i, row in enumerate(rows):
+            if per_recipient and sent_recently[row.to_email] >= per_recipient:
+                _release([row], now + RECIPIENT_WINDOW / per_recipient)
+                counts["throttled"] += 1
+                continue
+            if rate and counts["sent"]:
+                sleep_fn(1 / rate)
+            try:
+                if not connection.send_messages([_message(row, connection)]):
+                    raise RuntimeError("backend did not send the message")
+            except Exception as exc:
+                outcome = _fail(row, exc, now)
+                # start the next message on a clean connection
+                try:
+                    connection.close()
+                    connection.open()
+                except Exception as reconnect_exc:
+                    _release(rows[i + 1 :], now + _backoff(1))
+                    counts["deferred"] += len(rows) - i - 1
+                    counts[outcome] += 1
+                    logger.warning(
+                        "notifications.outbox.connect_failed: %s", reconnect_exc
+                    )
+                    break
+            else:
+                row.status = OutboundEmail.Status.SENT
+                row.sent_at = timezone.now()
+                row.next_attempt_at = None
+                row.save(update_fields=["status", "sent_at", "next_attempt_at"])
+                sent_recently[row.to_email] += 1
+                outcome = "sent"
+            counts[outcome] += 1
+    finally:
+        connection.close()
+
+    for outcome, n in counts.items():
+        if outcome != "claimed":
+            metrics.inc("outbound_email", n, outcome=outcome)
+    logger.info("notifications.outbox.drained", extra={"counts": dict(counts)})
+    return dict(counts)
@@ -1,8 +1,8 @@
 # notifications/services.py
-from django.conf import settings
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
 
+from . import outbox
+
 from .models import Notification
 from .ws import push_to_user
 
@@ -13,23 +13,13 @@ def create_and_push(user, title, message, level="info", url=""):
         user=user, title=title, message=message, level=level, url=url
     )
 
-    # Email (best-effort)
+    # Email (queued; sent by the outbox worker)
     if getattr(user, "email", None):
         html = render_to_string(
             "emails/generic.html",
             {"user": user, "title": title, "message": message, "cta_url": url},
         )
-        try:
-            send_mail(
-                subject=title,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[user.email],
-                html_message=html,
-                fail_silently=True,
-            )
-        except Exception:
-            pass
+        outbox.enqueue(user.email, title, message, html)
 
     # WebSocket push (generic notification payload via per-user group)
     try:
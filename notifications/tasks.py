@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import logging
+
+from celery import shared_task
+from django.conf import settings
+
+from . import outbox
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def send_outbound_email(limit: int | None = None) -> dict[str, int]:
+    """Drain one batch of the mail outbox; re-queue while batches come back full."""
+    if not limit:
+        limit = int(getattr(settings, "EMAIL_OUTBOX_BATCH_SIZE", 100))
+    counts = outbox.drain(limit=limit)
+    if counts.get("claimed", 0) >= limit:
+        send_outbound_email.delay(limit)
+    return counts
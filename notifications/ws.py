@@ -1,17 +1,13 @@
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from core import realtime
 
 
 def push_to_user(user_id: int, payload: dict):
     """Deliver JSON payload to the per-user group via Channels.
 
-    Group name format: user_<pk>
+    Group name format: user_<pk>. Sent once the current transaction commits.
     """
     try:
-        layer = get_channel_layer()
-        if not layer:
-            return
-        async_to_sync(layer.group_send)(
+        realtime.publish(
             f"user_{int(user_id)}", {"type": "notify", "payload": payload or {}}
         )
     except Exception:
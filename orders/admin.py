@@ -5,7 +5,7 @@ from django import forms
 from django.contrib import admin, messages
 from django.core.validators import MaxValueValidator, MinValueValidator
 
-from .models import Delivery, DeliveryEvent, DeliveryPing, Order
+from .models import Delivery, DeliveryEvent, DeliveryPing, DeliveryTrack, Order
 from .services import assign_warehouses_and_update_stock
 
 Q6 = Decimal("0.000001")
@@ -21,6 +21,13 @@ class DeliveryPingAdmin(admin.ModelAdmin):
     search_fields = ("delivery__id",)
 
 
+@admin.register(DeliveryTrack)
+class DeliveryTrackAdmin(admin.ModelAdmin):
+    list_display = ("id", "delivery", "points", "started_at", "ended_at")
+    search_fields = ("delivery__id",)
+    exclude = ("data",)
+
+
 @admin.register(DeliveryEvent)
 class DeliveryEventAdmin(admin.ModelAdmin):
     list_display = ("id", "delivery", "type", "actor", "at")
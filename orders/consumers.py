@@ -1,18 +1,80 @@
 # orders/consumers.py
+import json
 import logging
 import math
 from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from urllib.parse import parse_qs
 
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from django.apps import apps
+from django.conf import settings
 from django.core.cache import cache
 from django.utils import timezone
+from rest_framework.exceptions import PermissionDenied
+
+from core.coalesce import LatestCoalescer
+from core.db_writes import run_write
+from users.utils import resolve_vendor_owner_for
+
+from .services import vendor_live
+from .services.ping_buffer import Fix, ping_buffer
+from .ws_codes import WSErr
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
 
 logger = logging.getLogger(__name__)
 
 Q6 = Decimal("0.000001")  # 6 dp (~0.11m at equator)
 
+FRAME_FORMATS = ("json", "compact", "msgpack")
+
+
+def _fanout_interval() -> float:
+    return float(getattr(settings, "WS_POSITION_FANOUT_INTERVAL", 1.0))
+
+
+def _frame_format(scope) -> str:
+    """Position frame format from ``?fmt=`` (json | compact | msgpack)."""
+    qs = parse_qs((scope.get("query_string") or b"").decode("latin-1"))
+    fmt = (qs.get("fmt") or ["json"])[0]
+    if fmt not in FRAME_FORMATS:
+        return "json"
+    if fmt == "msgpack" and msgpack is None:
+        return "compact"
+    return fmt
+
+
+async def _group_send(group: str, item) -> None:
+    channel_layer, message = item
+    await channel_layer.group_send(group, message)
+    try:
+        await vendor_live.apublish_position(
+            channel_layer,
+            message["delivery_id"],
+            message["lat"],
+            message["lng"],
+            message["ts"],
+        )
+    except Exception as e:
+        logger.debug("vendor position push failed: %s", e, exc_info=True)
+
+
+_FANOUT: LatestCoalescer | None = None
+
+
+def _position_fanout() -> LatestCoalescer:
+    """Process-wide coalescer for driver position broadcasts, keyed by group."""
+    global _FANOUT
+    if _FANOUT is None:
+        _FANOUT = LatestCoalescer(
+            _fanout_interval(), _group_send, name="ws_position_fanout"
+        )
+    return _FANOUT
+
 
 class DeliveryTrackerConsumer(AsyncJsonWebsocketConsumer):
     async def connect(self):
@@ -28,12 +90,22 @@ class DeliveryTrackerConsumer(AsyncJsonWebsocketConsumer):
             await self.close()
             return
 
-        # Allow both assigned driver and order owner to subscribe
-        if not await self._can_subscribe(self.delivery_id, self.user_id):
+        # Allow both assigned driver and order owner to subscribe. Roles are
+        # resolved once here and refreshed from group messages, so incoming
+        # frames never need a DB round trip just to authorize.
+        access = await self._resolve_access(self.delivery_id, self.user_id)
+        if access is None:
             await self.close()
             return
+        self._is_driver, self._is_order_owner = access
 
         self.group_name = f"delivery.{self.delivery_id}"
+        self._frame_format = _frame_format(self.scope)
+        self._outbox = LatestCoalescer(
+            float(getattr(settings, "WS_POSITION_CLIENT_INTERVAL", 0.5)),
+            self._send_position_frame,
+            name="ws_position_out",
+        )
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
 
@@ -42,6 +114,8 @@ class DeliveryTrackerConsumer(AsyncJsonWebsocketConsumer):
         self._last_saved_ll = None  # (lat, lng) float tuple
 
     async def disconnect(self, close_code):
+        if hasattr(self, "_outbox"):
+            self._outbox.cancel()
         try:
             if hasattr(self, "group_name"):
                 await self.channel_layer.group_discard(
@@ -49,6 +123,12 @@ class DeliveryTrackerConsumer(AsyncJsonWebsocketConsumer):
                 )
         except Exception as e:
             logger.debug("channels discard failed: %s", e, exc_info=True)
+        # Don't leave a departing driver's last fixes waiting for the timer.
+        if getattr(self, "_is_driver", False) and ping_buffer.depth:
+            try:
+                await ping_buffer.aflush(self.channel_layer)
+            except Exception as e:
+                logger.debug("ping flush on disconnect failed: %s", e, exc_info=True)
 
     # ---- Incoming messages ----
     async def receive_json(self, content, **kwargs):
@@ -78,22 +158,28 @@ class DeliveryTrackerConsumer(AsyncJsonWebsocketConsumer):
     async def delivery_event(self, event):
         kind = event.get("kind")
         if kind == "position_update":
-            await self.send_json(
+            await self._outbox.submit(
+                "position",
                 {
-                    "type": "position_update",
                     "lat": event.get("lat"),
                     "lng": event.get("lng"),
                     "status": event.get("status"),
                     "ts": event.get("ts"),
-                }
+                },
             )
             return
         if kind == "status":
             await self.send_json({"type": "status", "status": event.get("status")})
             return
+        if kind in ("assign", "unassign", "accept"):
+            await self._refresh_driver_role(event.get("driver_id"))
+            return
 
     async def status_update(self, event):
         # Emitted by post_save signals via group_send(type="status.update")
+        if "driver_id" in event:
+            if not await self._refresh_driver_role(event.get("driver_id")):
+                return
         await self.send_json(
             {
                 "type": "status_update",
@@ -108,7 +194,7 @@ class DeliveryTrackerConsumer(AsyncJsonWebsocketConsumer):
     # Back-compat for older senders using type="tracker.update"
     async def tracker_update(self, event):
         data = event.get("data", {}) or {}
-        await self.send_json({"type": "position_update", **data})
+        await self._outbox.submit("position", data)
 
     # Back-compat for staff debug sender using type="broadcast"
     async def broadcast(self, event):
@@ -116,6 +202,36 @@ class DeliveryTrackerConsumer(AsyncJsonWebsocketConsumer):
         await self.send_json(payload)
 
     # ---- Helpers ----
+    async def _send_position_frame(self, _key, data: dict) -> None:
+        """Write a position frame in the format the client asked for."""
+        fmt = self._frame_format
+        if fmt == "json":
+            await self.send_json({"type": "position_update", **data})
+            return
+        frame = [
+            "p",
+            data.get("lat"),
+            data.get("lng"),
+            data.get("ts"),
+            data.get("status"),
+        ]
+        if fmt == "msgpack":
+            await self.send(bytes_data=msgpack.packb(frame))
+        else:
+            await self.send(text_data=json.dumps(frame, separators=(",", ":")))
+
+    async def _refresh_driver_role(self, driver_id) -> bool:
+        """Update the cached driver role; return False if the socket was closed."""
+        try:
+            self._is_driver = driver_id is not None and int(driver_id) == self.user_id
+        except (TypeError, ValueError):
+            self._is_driver = False
+        if not self._is_driver and not getattr(self, "_is_order_owner", False):
+            # Unassigned driver with no other claim on this delivery.
+            await self.close(code=WSErr.FORBIDDEN)
+            return False
+        return True
+
     @staticmethod
     def _haversine_m(a, b):
         (lat1, lng1), (lat2, lng2) = a, b
@@ -130,91 +246,39 @@ class DeliveryTrackerConsumer(AsyncJsonWebsocketConsumer):
         )
         return 2 * R * math.asin(math.sqrt(s1))
 
-    @database_sync_to_async
-    def _can_subscribe(self, delivery_id: int, user_id: int) -> bool:
+    async def _resolve_access(
+        self, delivery_id: int, user_id: int
+    ) -> tuple[bool, bool] | None:
+        """Return (is_driver, is_order_owner), or None if the user may not subscribe."""
         Delivery = apps.get_model("orders", "Delivery")
-        try:
-            d = Delivery.objects.select_related("order").get(pk=int(delivery_id))
-        except Delivery.DoesNotExist:
-            return False
-        return (d.driver_id == user_id) or (
-            getattr(d.order, "user_id", None) == user_id
+        row = await (
+            Delivery.objects.filter(pk=int(delivery_id))
+            .values_list("driver_id", "order__user_id")
+            .afirst()
         )
-
-    @database_sync_to_async
-    def _is_owner_driver(self, delivery_id: int, user_id: int) -> bool:
-        try:
-            Delivery = apps.get_model("orders", "Delivery")
-            return Delivery.objects.filter(
-                pk=int(delivery_id), driver_id=user_id
-            ).exists()
-        except Exception:
-            return False
-
-    @database_sync_to_async
-    def _save_position(
+        if row is None:
+            return None
+        is_driver, is_owner = row[0] == user_id, row[1] == user_id
+        if not (is_driver or is_owner):
+            return None
+        return is_driver, is_owner
+
+    async def _save_position(
         self, delivery_id: int, user_id: int, lat: Decimal, lng: Decimal
-    ):
+    ) -> None:
         """
-        Persist position for the assigned driver.
-        Returns (changed: bool, new_status: str|None).
+        Queue the fix on the process-wide write-behind buffer. The buffer
+        persists pings/events in bulk and broadcasts ASSIGNED -> EN_ROUTE.
         """
-        Delivery = apps.get_model("orders", "Delivery")
-        DeliveryPing = apps.get_model("orders", "DeliveryPing")
-
-        try:
-            d = Delivery.objects.get(pk=int(delivery_id), driver_id=user_id)
-        except Delivery.DoesNotExist:
-            return False, None
-
-        changed = False
-        new_status = None
-        now = timezone.now()
-
-        if d.last_lat != lat or d.last_lng != lng:
-            d.last_lat = lat
-            d.last_lng = lng
-            changed = True
-
-        d.last_ping_at = now
-
-        try:
-            if d.status == Delivery.Status.ASSIGNED:
-                d.status = Delivery.Status.EN_ROUTE
-                new_status = d.status
-        except Exception as e:
-            # Enum/choices not available? ignore gracefully
-            logger.debug("channels discard failed: %s", e, exc_info=True)
+        fix = Fix(delivery_id, user_id, lat, lng, timezone.now())
+        await ping_buffer.aadd(fix, self.channel_layer)
 
-        fields = ["last_lat", "last_lng", "last_ping_at", "updated_at"]
-        if new_status is not None:
-            fields.append("status")
-        d.save(update_fields=fields)
-
-        if changed:
-            # History + audit (best-effort)
-            try:
-                DeliveryPing.objects.create(delivery=d, lat=lat, lng=lng)
-            except Exception as e:
-                logger.debug("channels discard failed: %s", e, exc_info=True)
-            try:
-                DeliveryEvent = apps.get_model("orders", "DeliveryEvent")
-                DeliveryEvent.objects.create(
-                    delivery=d,
-                    actor_id=user_id,
-                    type="position",
-                    note={"lat": float(lat), "lng": float(lng)},
-                )
-            except Exception as e:
-                logger.debug("channels discard failed: %s", e, exc_info=True)
-
-        return changed, new_status
-
-    @database_sync_to_async
-    def _update_status(self, delivery_id: int, user_id: int, status_new: str) -> bool:
+    async def _update_status(
+        self, delivery_id: int, user_id: int, status_new: str
+    ) -> bool:
         Delivery = apps.get_model("orders", "Delivery")
         try:
-            d = Delivery.objects.get(pk=int(delivery_id), driver_id=user_id)
+            d = await Delivery.objects.aget(pk=int(delivery_id), driver_id=user_id)
         except Delivery.DoesNotExist:
             return False
 
@@ -232,7 +296,11 @@ class DeliveryTrackerConsumer(AsyncJsonWebsocketConsumer):
             d.picked_up_at = now
         if status_new == Delivery.Status.DELIVERED:
             d.delivered_at = now
-        d.save(update_fields=["status", "picked_up_at", "delivered_at", "updated_at"])
+        # save() (not aupdate) so post_save broadcasts still fire
+        await run_write(
+            d.save,
+            update_fields=["status", "picked_up_at", "delivered_at", "updated_at"],
+        )
         return True
 
     # ---- Message handlers ----
@@ -241,7 +309,7 @@ class DeliveryTrackerConsumer(AsyncJsonWebsocketConsumer):
         lng_raw = content.get("lng")
 
         # Only assigned driver can persist/broadcast positions
-        if not await self._is_owner_driver(self.delivery_id, self.user_id):
+        if not self._is_driver:
             await self.send_json({"type": "error", "error": "forbidden"})
             return
 
@@ -260,17 +328,35 @@ class DeliveryTrackerConsumer(AsyncJsonWebsocketConsumer):
             await self.send_json({"type": "error", "error": "out_of_range"})
             return
 
+        now_ms = int(timezone.now().timestamp() * 1000)
+        lat_f, lng_f = float(lat_d), float(lng_d)
+
+        # Live UX: every fix goes to the per-group coalescer, which forwards
+        # at most one per WS_POSITION_FANOUT_INTERVAL and always the latest.
+        await _position_fanout().submit(
+            self.group_name,
+            (
+                self.channel_layer,
+                {
+                    "type": "delivery.event",
+                    "kind": "position_update",
+                    "delivery_id": self.delivery_id,
+                    "lat": lat_f,
+                    "lng": lng_f,
+                    "ts": now_ms,
+                },
+            ),
+        )
+
         # Global throttle per (driver, delivery): 5s using cache
         cache_key = f"ws:last:{self.user_id}:{self.delivery_id}"
         last = cache.get(cache_key)
-        now_ms = int(timezone.now().timestamp() * 1000)
         if last and (now_ms - int(last)) < 5000:
             return
         cache.set(cache_key, now_ms, timeout=30)
 
         # Connection throttle: save every â‰¥8s AND after â‰¥25m movement
         due = (now_ms - self._last_saved_at_ms) >= 8000
-        lat_f, lng_f = float(lat_d), float(lng_d)
         moved_enough = (
             True
             if self._last_saved_ll is None
@@ -279,29 +365,9 @@ class DeliveryTrackerConsumer(AsyncJsonWebsocketConsumer):
 
         # Persist if due + moved
         if due and moved_enough:
-            changed, new_status = await self._save_position(
-                self.delivery_id, self.user_id, lat_d, lng_d
-            )
-            if changed:
-                self._last_saved_at_ms = now_ms
-                self._last_saved_ll = (lat_f, lng_f)
-            if new_status is not None:
-                await self.channel_layer.group_send(
-                    self.group_name,
-                    {"type": "delivery.event", "kind": "status", "status": new_status},
-                )
-
-        # Always broadcast (after permission checks) for live UX
-        await self.channel_layer.group_send(
-            self.group_name,
-            {
-                "type": "delivery.event",
-                "kind": "position_update",
-                "lat": lat_f,
-                "lng": lng_f,
-                "ts": now_ms,
-            },
-        )
+            await self._save_position(self.delivery_id, self.user_id, lat_d, lng_d)
+            self._last_saved_at_ms = now_ms
+            self._last_saved_ll = (lat_f, lng_f)
 
     async def _handle_status_broadcast(self, content):
         status_new = content.get("status")
@@ -309,7 +375,7 @@ class DeliveryTrackerConsumer(AsyncJsonWebsocketConsumer):
             return
 
         # Only the assigned driver can broadcast status hints
-        if not await self._is_owner_driver(self.delivery_id, self.user_id):
+        if not self._is_driver:
             await self.send_json({"type": "error", "error": "forbidden"})
             return
 
@@ -318,3 +384,94 @@ class DeliveryTrackerConsumer(AsyncJsonWebsocketConsumer):
             self.group_name,
             {"type": "delivery.event", "kind": "status", "status": status_new},
         )
+
+
+class VendorLiveConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Vendor live board: one snapshot on connect, then pushed diffs.
+
+    Frames sent to the client:
+    - {"type":"snapshot", "owner_id": .., "deliveries":[row, ...]}
+    - {"type":"delivery", "delivery": row}        (Delivery saved)
+    - {"type":"position", "id", "lat", "lng", "ts"}  (coalesced per delivery)
+    - {"type":"event", ...}                       (other vendor.event pushes)
+    """
+
+    async def connect(self):
+        user = self.scope.get("user")
+        if not user or not user.is_authenticated:
+            await self.close()
+            return
+        qs = parse_qs((self.scope.get("query_string") or b"").decode("latin-1"))
+        owner_id = await self._resolve_owner(user, (qs.get("owner_id") or [None])[0])
+        if owner_id is None:
+            await self.close(code=WSErr.FORBIDDEN)
+            return
+
+        self.owner_id = owner_id
+        self.group_name = f"vendor.{owner_id}"
+        self._positions = LatestCoalescer(
+            float(getattr(settings, "WS_POSITION_CLIENT_INTERVAL", 0.5)),
+            self._send_position,
+            name="ws_vendor_position_out",
+        )
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await self.send_json(
+            {
+                "type": "snapshot",
+                "owner_id": owner_id,
+                "deliveries": await self._snapshot(owner_id),
+            }
+        )
+
+    async def disconnect(self, close_code):
+        if hasattr(self, "_positions"):
+            self._positions.cancel()
+        try:
+            if hasattr(self, "group_name"):
+                await self.channel_layer.group_discard(
+                    self.group_name, self.channel_name
+                )
+        except Exception as e:
+            logger.debug("channels discard failed: %s", e, exc_info=True)
+
+    async def receive_json(self, content, **kwargs):
+        if (content.get("type") or content.get("op")) == "ping":
+            await self.send_json({"type": "pong"})
+
+    # ---- Group event fanout ----
+    async def vendor_delivery(self, event):
+        await self.send_json({"type": "delivery", "delivery": event.get("delivery")})
+
+    async def vendor_position(self, event):
+        await self._positions.submit(str(event.get("id")), event)
+
+    async def vendor_event(self, event):
+        payload = {k: v for k, v in event.items() if k != "type"}
+        await self.send_json({"type": "event", **payload})
+
+    # ---- Helpers ----
+    async def _send_position(self, _key, event) -> None:
+        await self.send_json(
+            {
+                "type": "position",
+                "id": event.get("id"),
+                "lat": event.get("lat"),
+                "lng": event.get("lng"),
+                "ts": event.get("ts"),
+            }
+        )
+
+    @database_sync_to_async
+    def _resolve_owner(self, user, raw_owner) -> int | None:
+        try:
+            return resolve_vendor_owner_for(
+                user, raw_owner, require_explicit_if_multiple=False
+            )
+        except (PermissionDenied, ValueError):
+            return None
+
+    @database_sync_to_async
+    def _snapshot(self, owner_id: int) -> list[dict]:
+        return vendor_live.vendor_deliveries(owner_id)
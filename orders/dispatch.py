@@ -0,0 +1,358 @@
+"""Automatic driver dispatch: batch-assign pending deliveries to idle drivers.
+
+Each run takes every ``PENDING`` delivery with a pickup point and every idle
+driver with a recent fix (``Delivery.last_lat/last_lng`` within
+``DISPATCH_DRIVER_FRESH_MINUTES``), builds a pickup-distance matrix in one
+vectorized haversine call and solves the assignment for the whole batch:
+
+* small problems (``min(n, m) <= DISPATCH_HUNGARIAN_MAX``) are solved exactly
+  with the Hungarian algorithm (shortest augmenting path, O(n^2 m));
+* large ones use greedy cheapest-pair matching followed by local improvement
+  (pairwise swaps and moves to unused columns) until no step lowers the cost,
+  capped at ``DISPATCH_IMPROVE_SECONDS`` so the beat run stays bounded.
+
+Pairs further apart than ``DISPATCH_MAX_PICKUP_KM`` are never matched; the
+exact solver also maximizes how many deliveries get a driver before it
+minimizes distance. The chosen pairs are written (and broadcast) with
+:func:`orders.services.transitions.bulk_transition`.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+import numpy as np
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core import metrics
+from orders.eta import haversine_km
+from orders.services.transitions import bulk_transition
+from users.constants import DRIVER
+
+logger = logging.getLogger(__name__)
+
+# Stand-in for "not allowed": finite so the solvers never see inf - inf.
+FORBIDDEN = 1e9
+
+
+@dataclass
+class DispatchResult:
+    pending: int = 0
+    idle_drivers: int = 0
+    assigned: list[tuple[int, int]] = field(default_factory=list)
+    total_km: float = 0.0
+    solver: str = ""
+    seconds: float = 0.0
+
+
+def _setting(name: str, default):
+    return type(default)(getattr(settings, name, default))
+
+
+# ---- solvers ----
+def hungarian(cost: np.ndarray) -> np.ndarray:
+    """Optimal assignment for an ``n x m`` matrix with ``n <= m``.
+
+    Returns the column index for every row. Each augmenting-path step updates
+    the whole row of reduced costs with NumPy, so the Python loop is O(n * m)
+    iterations at most and usually far fewer.
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)  # p[j]: row (1-based) matched to column j
+    way = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            masked = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(masked)) + 1
+            delta = masked[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    cols = np.empty(n, dtype=np.int64)
+    for j in range(1, m + 1):
+        if p[j]:
+            cols[p[j] - 1] = j - 1
+    return cols
+
+
+def greedy(cost: np.ndarray) -> np.ndarray:
+    """Cheapest-pair-first matching for ``n <= m``; -1 for unmatched rows."""
+    n, m = cost.shape
+    cols = np.full(n, -1, dtype=np.int64)
+    col_used = np.zeros(m, dtype=bool)
+    left = n
+    for flat in np.argsort(cost, axis=None, kind="stable"):
+        r, c = divmod(int(flat), m)
+        if cols[r] >= 0 or col_used[c]:
+            continue
+        if cost[r, c] >= FORBIDDEN:
+            break
+        cols[r] = c
+        col_used[c] = True
+        left -= 1
+        if not left:
+            break
+    return cols
+
+
+def improve(
+    cost: np.ndarray,
+    cols: np.ndarray,
+    max_rounds: int = 500,
+    *,
+    deadline: float | None = None,
+) -> np.ndarray:
+    """Local search over a matching: best swap or move per round.
+
+    The pairwise swap gains and every row's cheapest unused column are built
+    once and patched after each step (O(k) for the rows that changed), so a
+    round costs one argmax instead of rebuilding k x k matrices. Stops after
+    ``max_rounds`` steps, at ``deadline`` (``time.monotonic()``) or when no
+    step lowers the cost.
+    """
+    cols = cols.copy()
+    rows = np.flatnonzero(cols >= 0)
+    if rows.size == 0:
+        return cols
+    k = rows.size
+    c = cols[rows]
+    d = cost[rows, c]
+    # S[i, j]: cost of row i on row j's column; gain[i, j]: saving of a swap
+    S = cost[np.ix_(rows, c)]
+    gain = d[:, None] + d[None, :] - S - S.T
+    unused = np.ones(cost.shape[1], dtype=bool)
+    unused[c] = False
+    best_col: np.ndarray = np.full(k, -1, dtype=np.int64)
+    best_cost = np.full(k, np.inf)
+
+    def rescan(idx: np.ndarray) -> None:
+        free = np.flatnonzero(unused)
+        if free.size == 0 or idx.size == 0:
+            best_col[idx], best_cost[idx] = -1, np.inf
+            return
+        sub = cost[np.ix_(rows[idx], free)]
+        pick = sub.argmin(axis=1)
+        best_col[idx] = free[pick]
+        best_cost[idx] = sub[np.arange(idx.size), pick]
+
+    def refresh(i: int) -> None:
+        S[i, :] = cost[rows[i], c]
+        S[:, i] = cost[rows, c[i]]
+        gain[i, :] = d[i] + d - S[i, :] - S[:, i]
+        gain[:, i] = gain[i, :]
+
+    rescan(np.arange(k))
+    for _ in range(max_rounds):
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        move_gains = d - best_cost
+        i = int(move_gains.argmax())
+        move_gain = float(move_gains[i])
+        a, b = divmod(int(gain.argmax()), k)
+        swap_gain = float(gain[a, b])
+
+        if swap_gain > max(move_gain, 1e-9):
+            c[a], c[b] = c[b], c[a]
+            d[a], d[b] = S[a, b], S[b, a]
+            refresh(a)
+            refresh(b)
+        elif move_gain > 1e-9:
+            old, new = int(c[i]), int(best_col[i])
+            c[i], d[i] = new, best_cost[i]
+            refresh(i)
+            unused[new], unused[old] = False, True
+            freed = cost[rows, old]
+            better = freed < best_cost
+            best_col[better], best_cost[better] = old, freed[better]
+            rescan(np.flatnonzero(best_col == new))
+        else:
+            break
+    cols[rows] = c
+    return cols
+
+
+def solve(cost: np.ndarray, *, exact_max: int | None = None) -> tuple[list, str]:
+    """Return ``([(row, col), ...], solver_name)`` minimizing total cost."""
+    if cost.size == 0:
+        return [], "none"
+    exact_max = (
+        _setting("DISPATCH_HUNGARIAN_MAX", 200) if exact_max is None else exact_max
+    )
+    transposed = cost.shape[0] > cost.shape[1]
+    work = cost.T if transposed else cost
+    if work.shape[0] <= exact_max:
+        cols, name = hungarian(work), "hungarian"
+    else:
+        budget = _setting("DISPATCH_IMPROVE_SECONDS", 0.25)
+        cols = improve(work, greedy(work), deadline=time.monotonic() + budget)
+        name = "greedy"
+    pairs = [
+        (r, int(c))
+        for r, c in enumerate(cols.tolist())
+        if c >= 0 and work[r, c] < FORBIDDEN
+    ]
+    if transposed:
+        pairs = [(c, r) for r, c in pairs]
+    return sorted(pairs), name
+
+
+def cost_matrix(
+    d_lat, d_lng, v_lat, v_lng, *, max_km: float | None = None
+) -> np.ndarray:
+    """Pickup km from every driver (columns) to every delivery origin (rows)."""
+    d_lat, d_lng, v_lat, v_lng = (
+        np.asarray(a, dtype=float) for a in (d_lat, d_lng, v_lat, v_lng)
+    )
+    km = haversine_km(d_lat[:, None], d_lng[:, None], v_lat[None, :], v_lng[None, :])
+    if max_km:
+        km[km > max_km] = FORBIDDEN
+    return km
+
+
+# ---- data ----
+def pending_deliveries(limit: int) -> tuple[list[int], np.ndarray, np.ndarray]:
+    Delivery = apps.get_model("orders", "Delivery")
+    rows = list(
+        Delivery.objects.filter(
+            status=Delivery.Status.PENDING,
+            driver__isnull=True,
+            origin_lat__isnull=False,
+            origin_lng__isnull=False,
+        )
+        .order_by("created_at", "pk")
+        .values_list("pk", "origin_lat", "origin_lng")[:limit]
+    )
+    if not rows:
+        return [], np.empty(0), np.empty(0)
+    ids, lat, lng = zip(*rows)
+    return list(ids), np.array(lat, dtype=float), np.array(lng, dtype=float)
+
+
+def idle_drivers(
+    fresh_minutes: int, now=None
+) -> tuple[list[int], np.ndarray, np.ndarray]:
+    """Drivers with no active delivery and a fix newer than ``fresh_minutes``.
+
+    The position is the newest ``last_lat/last_lng`` over the driver's
+    deliveries; one range scan on the ``last_ping_at`` index.
+    """
+    Delivery = apps.get_model("orders", "Delivery")
+    S = Delivery.Status
+    cutoff = (now or timezone.now()) - timedelta(minutes=fresh_minutes)
+    busy = Delivery.objects.filter(
+        status__in=[S.ASSIGNED, S.PICKED_UP, S.EN_ROUTE], driver__isnull=False
+    ).values("driver_id")
+    fixes = (
+        Delivery.objects.filter(
+            last_ping_at__gte=cutoff,
+            last_lat__isnull=False,
+            last_lng__isnull=False,
+            driver__is_active=True,
+            driver__groups__name=DRIVER,
+        )
+        .exclude(driver_id__in=busy)
+        .order_by("driver_id", "-last_ping_at")
+        .values_list("driver_id", "last_lat", "last_lng")
+    )
+    latest: dict[int, tuple] = {}
+    for driver_id, lat, lng in fixes:
+        latest.setdefault(driver_id, (lat, lng))
+    if not latest:
+        return [], np.empty(0), np.empty(0)
+    ids = list(latest)
+    lat = np.array([latest[i][0] for i in ids], dtype=float)
+    lng = np.array([latest[i][1] for i in ids], dtype=float)
+    return ids, lat, lng
+
+
+def plan(
+    delivery_ids, d_lat, d_lng, driver_ids, v_lat, v_lng, *, max_km=None
+) -> tuple[list[tuple[int, int, float]], str]:
+    """Pure planning step: ``[(delivery_id, driver_id, km), ...]`` and solver."""
+    cost = cost_matrix(d_lat, d_lng, v_lat, v_lng, max_km=max_km)
+    pairs, name = solve(cost)
+    return [(delivery_ids[r], driver_ids[c], float(cost[r, c])) for r, c in pairs], name
+
+
+def dispatch(*, dry_run: bool = False) -> DispatchResult:
+    """Assign as many pending deliveries as possible in one batch."""
+    started = time.monotonic()
+    result = DispatchResult()
+    delivery_ids, d_lat, d_lng = pending_deliveries(
+        _setting("DISPATCH_MAX_BATCH", 1000)
+    )
+    driver_ids, v_lat, v_lng = idle_drivers(
+        _setting("DISPATCH_DRIVER_FRESH_MINUTES", 10)
+    )
+    result.pending, result.idle_drivers = len(delivery_ids), len(driver_ids)
+    if not delivery_ids or not driver_ids:
+        result.seconds = time.monotonic() - started
+        return result
+
+    chosen, result.solver = plan(
+        delivery_ids,
+        d_lat,
+        d_lng,
+        driver_ids,
+        v_lat,
+        v_lng,
+        max_km=_setting("DISPATCH_MAX_PICKUP_KM", 15.0),
+    )
+    km = {d: k for d, _, k in chosen}
+    if dry_run:
+        result.assigned = [(d, v) for d, v, _ in chosen]
+    elif chosen:
+        result.assigned = _apply([(d, v) for d, v, _ in chosen], km)
+    result.total_km = round(sum(km[d] for d, _ in result.assigned), 3)
+    result.seconds = time.monotonic() - started
+    metrics.inc("dispatch_assigned", len(result.assigned), solver=result.solver)
+    metrics.observe("dispatch_seconds", result.seconds)
+    return result
+
+
+def _apply(pairs: list[tuple[int, int]], km: dict[int, float]) -> list:
+    Delivery = apps.get_model("orders", "Delivery")
+    S = Delivery.Status
+    with transaction.atomic():
+        # drivers that picked up work since planning are skipped
+        busy = set(
+            Delivery.objects.filter(
+                driver_id__in=[v for _, v in pairs],
+                status__in=[S.ASSIGNED, S.PICKED_UP, S.EN_ROUTE],
+            ).values_list("driver_id", flat=True)
+        )
+        drivers = {d: v for d, v in pairs if v not in busy}
+        result = bulk_transition(
+            [(d, "assigned") for d in drivers],
+            drivers=drivers,
+            notes={d: {"auto": True, "pickup_km": round(km[d], 3)} for d in drivers},
+            # anything assigned or cancelled since planning is left alone
+            queryset=Delivery.objects.filter(status=S.PENDING, driver__isnull=True),
+        )
+    return [(d, drivers[d]) for d in result.updated]
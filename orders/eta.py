@@ -0,0 +1,296 @@
+"""Delivery ETA model: ridge regression in NumPy, served from a ``.npz`` file.
+
+Training reads the CSV written by ``export_eta_training`` (one row per
+completed delivery, target ``duration_min`` from pickup to delivery). The
+fitted model is a handful of arrays saved with ``np.savez_compressed``;
+workers load it once (:func:`get_model`) and predict for whole querysets in
+one vectorized call (:func:`delivery_etas`) without contacting the router.
+
+When no model file is present predictions fall back to a constant city
+speed, so callers always get a number for deliveries with known coordinates.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+FEATURES = (
+    "dist_haversine_km",
+    "route_distance_km",
+    "hour_sin",
+    "hour_cos",
+    "dow_sin",
+    "dow_cos",
+)
+FALLBACK_SPEED_KMH = 25.0
+DEFAULT_ROUTE_RATIO = 1.3  # road km per straight-line km when nothing is known
+MIN_ETA_MIN = 1.0
+MAX_ETA_MIN = 240.0
+
+
+def haversine_km(a_lat, a_lng, b_lat, b_lng) -> np.ndarray:
+    """Vectorized great-circle distance in km (inputs in degrees)."""
+    a_lat, a_lng, b_lat, b_lng = map(np.radians, (a_lat, a_lng, b_lat, b_lng))
+    h = (
+        np.sin((b_lat - a_lat) / 2) ** 2
+        + np.cos(a_lat) * np.cos(b_lat) * np.sin((b_lng - a_lng) / 2) ** 2
+    )
+    return 2 * 6371.0 * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def feature_matrix(
+    dist_km: np.ndarray,
+    route_km: np.ndarray,
+    hour: np.ndarray,
+    dow: np.ndarray,
+    route_ratio: float,
+) -> np.ndarray:
+    """Rows of FEATURES; missing route distances are imputed from haversine."""
+    dist_km = np.asarray(dist_km, dtype=float)
+    route_km = np.asarray(route_km, dtype=float)
+    route_km = np.where(np.isnan(route_km), dist_km * route_ratio, route_km)
+    h = 2 * np.pi * np.asarray(hour, dtype=float) / 24.0
+    d = 2 * np.pi * np.asarray(dow, dtype=float) / 7.0
+    return np.column_stack(
+        [dist_km, route_km, np.sin(h), np.cos(h), np.sin(d), np.cos(d)]
+    )
+
+
+@dataclass
+class EtaModel:
+    mean: np.ndarray
+    scale: np.ndarray
+    coef: np.ndarray
+    intercept: float
+    route_ratio: float
+    n_train: int = 0
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        z = (np.asarray(X, dtype=float) - self.mean) / self.scale
+        return np.clip(z @ self.coef + self.intercept, MIN_ETA_MIN, MAX_ETA_MIN)
+
+    def save(self, path: str | Path) -> None:
+        np.savez_compressed(
+            path,
+            features=np.array(FEATURES),
+            mean=self.mean,
+            scale=self.scale,
+            coef=self.coef,
+            intercept=np.float64(self.intercept),
+            route_ratio=np.float64(self.route_ratio),
+            n_train=np.int64(self.n_train),
+        )
+
+    @classmethod
+    def load(cls, path: str | Path) -> EtaModel:
+        with np.load(path, allow_pickle=False) as z:
+            if tuple(z["features"].tolist()) != FEATURES:
+                raise ValueError("ETA model was trained on different features")
+            return cls(
+                mean=z["mean"],
+                scale=z["scale"],
+                coef=z["coef"],
+                intercept=float(z["intercept"]),
+                route_ratio=float(z["route_ratio"]),
+                n_train=int(z["n_train"]),
+            )
+
+
+def fit_ridge(X: np.ndarray, y: np.ndarray, *, alpha: float = 1.0, route_ratio=None):
+    """Closed-form ridge on standardized features (intercept not penalized)."""
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale < 1e-9] = 1.0  # constant columns (std is float noise, not 0)
+    Z = (X - mean) / scale
+    y_mean = y.mean()
+    A = Z.T @ Z + alpha * np.eye(Z.shape[1])
+    coef = np.linalg.solve(A, Z.T @ (y - y_mean))
+    return EtaModel(
+        mean=mean,
+        scale=scale,
+        coef=coef,
+        intercept=float(y_mean),
+        route_ratio=float(route_ratio or DEFAULT_ROUTE_RATIO),
+        n_train=len(y),
+    )
+
+
+def load_training_csv(path: str | Path) -> tuple[np.ndarray, np.ndarray, float]:
+    """Return (X, y, route_ratio) from an ``export_eta_training`` CSV or ``.npz``."""
+    data: dict[str, np.ndarray]
+    if str(path).endswith(".npz"):
+        with np.load(path, allow_pickle=False) as z:
+            data = {k: z[k].astype(float) for k in z.files}
+    else:
+        table = np.atleast_1d(
+            np.genfromtxt(
+                path, delimiter=",", names=True, dtype=float, encoding="utf-8"
+            )
+        )
+        data = {name: table[name] for name in table.dtype.names or ()}
+    size = len(data.get("duration_min", ()))
+    if size == 0:
+        raise ValueError(f"{path} has no training rows")
+    dist = data["dist_haversine_km"]
+    # older exports have no road distance; it is imputed from the ratio
+    route = data.get("route_distance_km", np.full(size, np.nan))
+    known = ~np.isnan(route) & (dist > 0.05)
+    ratio = (
+        float(np.median(route[known] / dist[known]))
+        if known.any()
+        else DEFAULT_ROUTE_RATIO
+    )
+    hour = np.nan_to_num(data["picked_hour"])
+    dow = np.nan_to_num(data["picked_dow"])
+    X = feature_matrix(dist, route, hour, dow, ratio)
+    return X, data["duration_min"], ratio
+
+
+def train_from_csv(path: str | Path, *, alpha: float = 1.0) -> EtaModel:
+    X, y, ratio = load_training_csv(path)
+    return fit_ridge(X, y, alpha=alpha, route_ratio=ratio)
+
+
+# ---- serving ----
+_MODEL: EtaModel | None = None
+_MODEL_LOADED = False
+_LOCK = threading.Lock()
+
+
+def model_path() -> Path:
+    return Path(
+        getattr(settings, "ETA_MODEL_PATH", None)
+        or Path(settings.BASE_DIR) / "eta_model.npz"
+    )
+
+
+def get_model() -> EtaModel | None:
+    """The worker's model, loaded from ETA_MODEL_PATH on first use."""
+    global _MODEL, _MODEL_LOADED
+    if _MODEL_LOADED:
+        return _MODEL
+    with _LOCK:
+        if not _MODEL_LOADED:
+            path = model_path()
+            try:
+                _MODEL = EtaModel.load(path) if path.exists() else None
+            except Exception as exc:
+                logger.warning("ETA model at %s could not be loaded: %s", path, exc)
+                _MODEL = None
+            _MODEL_LOADED = True
+    return _MODEL
+
+
+def reset_model() -> None:
+    """Forget the loaded model (tests, or after writing a new file)."""
+    global _MODEL, _MODEL_LOADED
+    with _LOCK:
+        _MODEL, _MODEL_LOADED = None, False
+
+
+def predict_minutes(
+    from_lat, from_lng, to_lat, to_lng, route_km=None, when: datetime | None = None
+) -> np.ndarray:
+    """Vectorized ETA in minutes for arrays of start/end coordinates."""
+    from_lat, from_lng, to_lat, to_lng = (
+        np.asarray(v, dtype=float) for v in (from_lat, from_lng, to_lat, to_lng)
+    )
+    dist = haversine_km(from_lat, from_lng, to_lat, to_lng)
+    if route_km is None:
+        route_km = np.full(dist.shape, np.nan)
+    local = timezone.localtime(when or timezone.now())
+    model = get_model()
+    if model is None:
+        route = np.where(
+            np.isnan(route_km), dist * DEFAULT_ROUTE_RATIO, np.asarray(route_km)
+        )
+        out = np.clip(route / FALLBACK_SPEED_KMH * 60.0, MIN_ETA_MIN, MAX_ETA_MIN)
+    else:
+        X = feature_matrix(
+            dist,
+            route_km,
+            np.full(dist.shape, local.hour),
+            np.full(dist.shape, local.weekday()),
+            model.route_ratio,
+        )
+        out = model.predict(X)
+    return out
+
+
+def cached_route_km(a_lat, a_lng, b_lat, b_lng) -> np.ndarray:
+    """Road km per row from the route cache (one ``get_many``), NaN on a miss.
+
+    Straight-line fallbacks carry no duration and are treated as misses.
+    """
+    from orders.services.routes import route_cache_key
+
+    keys = [
+        route_cache_key(*row)
+        for row in zip(
+            np.asarray(a_lat).tolist(),
+            np.asarray(a_lng).tolist(),
+            np.asarray(b_lat).tolist(),
+            np.asarray(b_lng).tolist(),
+        )
+    ]
+    out = np.full(len(keys), np.nan)
+    if not keys:
+        return out
+    try:
+        cached = cache.get_many(keys)
+    except Exception:  # pragma: no cover - cache outage
+        return out
+    for i, k in enumerate(keys):
+        hit = cached.get(k) or {}
+        if hit.get("duration_min") is not None and hit.get("distance_km"):
+            out[i] = float(hit["distance_km"])
+    return out
+
+
+def delivery_etas(deliveries) -> dict[int, float | None]:
+    """ETA (minutes, 1 dp) for each delivery, in one vectorized prediction.
+
+    Travel starts from the driver's last fix when there is one, otherwise from
+    the warehouse origin. Delivered/cancelled deliveries and ones without
+    coordinates get ``None``. Road distances come from the route cache when a
+    router answer is already there; the router itself is never called.
+    """
+    from orders.services.routes import delivery_route_endpoints
+
+    deliveries = list(deliveries)
+    done = {"delivered", "cancelled"}
+    out: dict[int, float | None] = {d.pk: None for d in deliveries}
+    rows, ends = [], []
+    for d in deliveries:
+        if d.status in done:
+            continue
+        try:
+            ends.append(delivery_route_endpoints(d))
+        except ValueError:
+            continue
+        rows.append(d)
+    if not rows:
+        return out
+
+    a_lat, a_lng, b_lat, b_lng = (
+        np.array(col, dtype=float)
+        for col in zip(*[(a[0], a[1], b[0], b[1]) for a, b in ends])
+    )
+    route_km = cached_route_km(a_lat, a_lng, b_lat, b_lng)
+    minutes = predict_minutes(a_lat, a_lng, b_lat, b_lng, route_km)
+    for d, m in zip(rows, minutes.tolist()):
+        out[d.pk] = round(m, 1)
+    return out
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from orders.services.tracks import compact_finished_deliveries
+
+
+class Command(BaseCommand):
+    help = "Fold raw pings of finished deliveries into compact DeliveryTrack blobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument(
+            "--grace-minutes",
+            type=int,
+            default=10,
+            help="skip deliveries finished more recently than this",
+        )
+        parser.add_argument(
+            "--max-batches", type=int, default=None, help="stop after N batches"
+        )
+
+    def handle(self, *args, **opts):
+        result = compact_finished_deliveries(
+            batch_size=opts["batch_size"],
+            grace_minutes=opts["grace_minutes"],
+            max_batches=opts["max_batches"],
+        )
+        self.stdout.write(
+            f"compacted deliveries={result['deliveries']} "
+            f"points={result['points']} batches={result['batches']}"
+        )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from orders.dispatch import dispatch
+
+
+class Command(BaseCommand):
+    help = "Assign pending deliveries to idle drivers in one optimized batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true", help="plan only, write nothing"
+        )
+
+    def handle(self, *args, **opts):
+        result = dispatch(dry_run=opts["dry_run"])
+        for delivery_id, driver_id in result.assigned:
+            self.stdout.write(f"delivery {delivery_id} -> driver {driver_id}")
+        self.stdout.write(
+            f"pending={result.pending} idle_drivers={result.idle_drivers} "
+            f"assigned={len(result.assigned)} total_km={result.total_km} "
+            f"solver={result.solver or '-'} seconds={result.seconds:.3f}"
+        )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from orders.services.tracks import downsample_old_tracks
+
+
+class Command(BaseCommand):
+    help = "Simplify the trails of deliveries delivered more than N days ago"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30)
+        parser.add_argument(
+            "--tolerance", type=float, default=10.0, help="metres (Douglas-Peucker)"
+        )
+        parser.add_argument(
+            "--bucket", type=float, default=0, help="keep one fix per N seconds"
+        )
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument(
+            "--max-batches", type=int, default=None, help="stop after N batches"
+        )
+
+    def handle(self, *args, **opts):
+        result = downsample_old_tracks(
+            older_than_days=opts["days"],
+            tolerance_m=opts["tolerance"],
+            bucket_seconds=opts["bucket"],
+            batch_size=opts["batch_size"],
+            max_batches=opts["max_batches"],
+        )
+        self.stdout.write(
+            f"downsampled deliveries={result['deliveries']} "
+            f"points {result['points_before']} -> {result['points_after']}"
+        )
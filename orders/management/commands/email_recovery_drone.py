@@ -5,7 +5,7 @@ from orders.views import send_payment_receipt_email
 
 
 class Command(BaseCommand):
-    help = "THAAD-3: Resend payment emails for transactions marked success but missing email delivery."
+    help = "THAAD-3: Queue payment emails for transactions marked success but missing email delivery."
 
     def handle(self, *args, **kwargs):
         txs = Transaction.objects.filter(status="success", email_sent=False)
@@ -20,7 +20,7 @@ class Command(BaseCommand):
                 tx.save()
                 count += 1
                 self.stdout.write(
-                    self.style.SUCCESS(f"✅ Email sent for TX: {tx.reference}")
+                    self.style.SUCCESS(f"✅ Email queued for TX: {tx.reference}")
                 )
             except Exception as e:
                 self.stdout.write(
@@ -28,5 +28,5 @@ class Command(BaseCommand):
                 )
 
         self.stdout.write(
-            self.style.SUCCESS(f"🛰️ THAAD-3 completed: {count} email(s) sent.")
+            self.style.SUCCESS(f"🛰️ THAAD-3 completed: {count} email(s) queued.")
         )
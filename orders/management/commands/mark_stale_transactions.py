@@ -1,16 +1,20 @@
 from datetime import timedelta
+import time
 
-import requests
-from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
 from orders.models import Transaction
+from payments.services.reconcile import ReconcileError, verify_paystack_many
 
 
 class Command(BaseCommand):
     help = "Verifies stale transactions with Paystack if callback was missed."
 
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=None)
+        parser.add_argument("--rps", type=float, default=None)
+
     def handle(self, *args, **kwargs):
         cutoff_time = timezone.now() - timedelta(minutes=15)
 
@@ -18,30 +22,38 @@ class Command(BaseCommand):
             status="unknown", callback_received=False, created_at__lt=cutoff_time
         )
 
-        for tx in stale_transactions:
-            url = f"https://api.paystack.co/transaction/verify/{tx.reference}"
-            headers = {"Authorization": f"Bearer {settings.PAYSTACK_SECRET_KEY}"}
-
-            try:
-                res = requests.get(url, headers=headers, timeout=10)
-                data = res.json()
-
-                if data["status"] and data["data"]["status"] == "success":
-                    tx.status = "success"
-                elif data["status"] and data["data"]["status"] == "failed":
-                    tx.status = "failed"
-                else:
-                    tx.status = "failed"  # Fallback if status is unclear
-
-                tx.callback_received = True  # We confirmed manually
-                tx.save()
-
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f"[✓] Verified {tx.reference} → {tx.status.upper()}"
-                    )
-                )
-            except Exception as e:
+        counts = {"success": 0, "failed": 0, "error": 0}
+        started = time.monotonic()
+        results = verify_paystack_many(
+            stale_transactions,
+            concurrency=kwargs["concurrency"],
+            rps=kwargs["rps"],
+        )
+        for tx, verify in results:
+            if isinstance(verify, ReconcileError):
+                counts["error"] += 1
                 self.stdout.write(
-                    self.style.WARNING(f"[!] Could not verify {tx.reference}: {str(e)}")
+                    self.style.WARNING(f"[!] Could not verify {tx.reference}: {verify}")
                 )
+                continue
+
+            if verify.status == "success":
+                tx.status = "success"
+            else:
+                tx.status = "failed"  # Fallback if status is unclear
+
+            tx.callback_received = True  # We confirmed manually
+            tx.save(update_fields=["status", "callback_received"])
+            counts[tx.status] += 1
+
+            self.stdout.write(
+                self.style.SUCCESS(f"[✓] Verified {tx.reference} → {tx.status.upper()}")
+            )
+
+        elapsed = time.monotonic() - started
+        total = sum(counts.values())
+        self.stdout.write(
+            f"{total} transactions in {elapsed:.1f}s "
+            f"({total / elapsed if elapsed else 0:.1f}/s): "
+            + ", ".join(f"{k}={v}" for k, v in counts.items())
+        )
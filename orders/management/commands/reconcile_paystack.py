@@ -1,14 +1,14 @@
 # orders/management/commands/reconcile_paystack.py
 
 import logging
+import time
 from datetime import timedelta
 
-import requests
-from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
 from orders.models import EmailDispatchLog, Transaction
+from payments.services.reconcile import ReconcileError, verify_paystack_many
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +23,18 @@ class Command(BaseCommand):
             default=10,
             help="Only reconcile transactions older than this many minutes (default: 10)",
         )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=None,
+            help="Parallel verify requests (default: PAYSTACK_RECONCILE_CONCURRENCY)",
+        )
+        parser.add_argument(
+            "--rps",
+            type=float,
+            default=None,
+            help="Max verify requests per second (default: PAYSTACK_RECONCILE_RPS)",
+        )
 
     def handle(self, *args, **options):
         cutoff = timezone.now() - timedelta(minutes=options["minutes"])
@@ -31,39 +43,38 @@ class Command(BaseCommand):
             status="unknown",
             callback_received=False,
             created_at__lt=cutoff,
-        )
+        ).select_related("order")
 
         if not qs.exists():
             self.stdout.write("No stale Paystack transactions to reconcile.")
             return
 
-        headers = {"Authorization": f"Bearer {settings.PAYSTACK_SECRET_KEY}"}
-        for tx in qs:
-            url = f"https://api.paystack.co/transaction/verify/{tx.reference}"
-            try:
-                resp = requests.get(url, headers=headers, timeout=15)
-                data = resp.json()
-            except Exception as e:
-                logger.warning(f"Network error verifying {tx.reference}: {e}")
+        counts = {"success": 0, "failed": 0, "unknown": 0, "error": 0}
+        started = time.monotonic()
+        results = verify_paystack_many(
+            qs, concurrency=options["concurrency"], rps=options["rps"]
+        )
+        for tx, verify in results:
+            if isinstance(verify, ReconcileError):
+                logger.warning(f"Network error verifying {tx.reference}: {verify}")
+                counts["error"] += 1
                 continue
 
-            api_ok = data.get("status", False)
-            api_status = data.get("data", {}).get("status")
-
             # Mark the callback as received (we’ve done the manual check)
             tx.callback_received = True
-            tx.verified = api_ok and api_status == "success"
+            tx.verified = verify.status == "success"
 
             # Map Paystack statuses to our model
-            if api_ok and api_status == "success":
+            if verify.status == "success":
                 tx.status = "success"
-            elif api_ok and api_status in ("failed", "abandoned", "error"):
+            elif verify.status == "failed":
                 tx.status = "failed"
             else:
                 # leave it unknown if Paystack didn’t confirm failure
                 tx.status = "unknown"
 
             tx.save(update_fields=["status", "callback_received", "verified"])
+            counts[tx.status] += 1
 
             self.stdout.write(
                 self.style.SUCCESS(f"{tx.reference}: reconciled → {tx.status}")
@@ -80,4 +91,13 @@ class Command(BaseCommand):
                     transaction=tx, status="queued", note="Reconciled via verify API"
                 )
 
-        self.stdout.write(self.style.SUCCESS("Reconciliation run complete."))
+        elapsed = time.monotonic() - started
+        total = sum(counts.values())
+        rate = total / elapsed if elapsed else 0.0
+        summary = ", ".join(f"{k}={v}" for k, v in counts.items())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Reconciliation run complete: {total} in {elapsed:.1f}s "
+                f"({rate:.1f}/s); {summary}"
+            )
+        )
@@ -9,6 +9,7 @@ from django.test import Client
 from django.urls import NoReverseMatch, reverse
 
 from orders.models import Order, Transaction
+from orders.services import webhooks
 
 
 class Command(BaseCommand):
@@ -99,6 +100,9 @@ class Command(BaseCommand):
             HTTP_X_PAYSTACK_SIGNATURE=signature,
         )
         self.stdout.write(f"Response status: {response.status_code}")
+        # the webhook only stores the event; apply it here instead of a worker
+        outcome = webhooks.process_reference("paystack", reference)
+        self.stdout.write(f"Processed: {outcome}")
 
         tx.refresh_from_db()
         order = Order.objects.get(id=order_id)
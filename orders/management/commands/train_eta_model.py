@@ -0,0 +1,41 @@
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import eta
+
+
+class Command(BaseCommand):
+    help = "Fit the ETA ridge model from an export_eta_training CSV"
+
+    def add_arguments(self, p):
+        p.add_argument("--csv", default="eta_training.csv")
+        p.add_argument("--out", default=None, help="defaults to ETA_MODEL_PATH")
+        p.add_argument("--alpha", type=float, default=1.0)
+        p.add_argument(
+            "--holdout", type=float, default=0.2, help="fraction kept for MAE"
+        )
+        p.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **o):
+        try:
+            X, y, ratio = eta.load_training_csv(o["csv"])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        rng = np.random.default_rng(o["seed"])
+        idx = rng.permutation(len(y))
+        n_test = int(len(y) * o["holdout"]) if len(y) >= 10 else 0
+        test, train = idx[:n_test], idx[n_test:]
+
+        model = eta.fit_ridge(X[train], y[train], alpha=o["alpha"], route_ratio=ratio)
+        if n_test:
+            mae = float(np.mean(np.abs(model.predict(X[test]) - y[test])))
+            self.stdout.write(f"holdout MAE: {mae:.2f} min over {n_test} rows")
+            model = eta.fit_ridge(X, y, alpha=o["alpha"], route_ratio=ratio)
+
+        out = o["out"] or eta.model_path()
+        model.save(out)
+        eta.reset_model()
+        self.stdout.write(
+            self.style.SUCCESS(f"Trained on {model.n_train} rows -> {out}")
+        )
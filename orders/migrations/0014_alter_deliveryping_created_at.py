@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 02:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0013_backfill_transaction_body_sha256"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="deliveryping",
+            name="created_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-19 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0015_deliverytrack"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="deliverytrack",
+            name="tolerance_m",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
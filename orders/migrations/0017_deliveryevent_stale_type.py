@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 03:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0016_deliverytrack_tolerance_m"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="deliveryevent",
+            name="type",
+            field=models.CharField(
+                choices=[
+                    ("assign", "Assigned"),
+                    ("unassign", "Unassigned"),
+                    ("picked", "Picked up"),
+                    ("en_route", "En route"),
+                    ("delivered", "Delivered"),
+                    ("position", "Position"),
+                    ("stale", "Driver silent"),
+                ],
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.1 on 2026-10-19 03:40
+
+from django.db import migrations, models
+
+
+def mark_existing_processed(apps, schema_editor):
+    # Events stored before the async pipeline were handled inline.
+    PaymentEvent = apps.get_model("orders", "PaymentEvent")
+    PaymentEvent.objects.update(status="processed")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0017_deliveryevent_stale_type"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="paymentevent",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="paymentevent",
+            name="last_error",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="paymentevent",
+            name="next_attempt_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="paymentevent",
+            name="processed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="paymentevent",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("received", "Received"),
+                    ("processed", "Processed"),
+                    ("dead", "Dead letter"),
+                ],
+                default="received",
+                max_length=10,
+            ),
+        ),
+        migrations.RunPython(mark_existing_processed, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="paymentevent",
+            index=models.Index(
+                fields=["status", "next_attempt_at"],
+                name="orders_paym_status_35c142_idx",
+            ),
+        ),
+    ]
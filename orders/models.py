@@ -341,6 +341,10 @@ class Delivery(models.Model):
         self.status = self.Status.ASSIGNED
         self.save(update_fields=["driver", "assigned_at", "status", "updated_at"])
 
+        from .services.routes import schedule_route_precompute
+
+        schedule_route_precompute(self.pk)
+
     @transaction.atomic
     def mark_picked_up(self, by=None, when=None):
         """assigned -> picked_up (idempotent)."""
@@ -422,7 +426,7 @@ class DeliveryPing(models.Model):
     )
     lat = models.DecimalField(max_digits=9, decimal_places=6)
     lng = models.DecimalField(max_digits=9, decimal_places=6)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         indexes = [
@@ -439,6 +443,29 @@ class DeliveryPing(models.Model):
         return super().save(*args, **kwargs)
 
 
+class DeliveryTrack(models.Model):
+    """Compacted breadcrumb trail of a finished delivery.
+
+    ``data`` holds the pings delta-encoded as integer microdegrees and
+    millisecond offsets from ``started_at`` (see ``orders.services.tracks``).
+    """
+
+    delivery = models.OneToOneField(
+        Delivery, related_name="track", on_delete=models.CASCADE
+    )
+    data = models.BinaryField()
+    points = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+    # Set once retention has simplified the trail (metres, Douglas-Peucker).
+    tolerance_m = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Track for delivery {self.delivery_id} ({self.points} pts)"
+
+
 class DeliveryEvent(models.Model):
     TYPE_CHOICES = (
         ("assign", "Assigned"),
@@ -447,6 +474,7 @@ class DeliveryEvent(models.Model):
         ("en_route", "En route"),
         ("delivered", "Delivered"),
         ("position", "Position"),
+        ("stale", "Driver silent"),
     )
     delivery = models.ForeignKey(
         "orders.Delivery", on_delete=models.CASCADE, related_name="events"
@@ -522,11 +550,32 @@ class EmailDispatchLog(models.Model):
 
 
 class PaymentEvent(models.Model):
+    """Raw gateway webhook, persisted before it is acknowledged.
+
+    ``orders.services.webhooks`` processes events per ``(provider, reference)``
+    in arrival order; an event that keeps failing is parked as ``dead``.
+    """
+
+    class Status(models.TextChoices):
+        RECEIVED = "received", "Received"
+        PROCESSED = "processed", "Processed"
+        DEAD = "dead", "Dead letter"
+
     provider = models.CharField(max_length=20)
     reference = models.CharField(max_length=100)
     body = models.JSONField()
     body_sha256 = models.CharField(max_length=64, unique=True)
     received_at = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.RECEIVED
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    processed_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
-        indexes = [models.Index(fields=["provider", "reference"])]
+        indexes = [
+            models.Index(fields=["provider", "reference"]),
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
@@ -1,11 +1,12 @@
 # orders/routing.py
 from django.urls import re_path
 
-from .consumers import DeliveryTrackerConsumer
+from .consumers import DeliveryTrackerConsumer, VendorLiveConsumer
 
 websocket_urlpatterns = [
     re_path(
         r"^/?ws/delivery/track/(?P<delivery_id>\d+)/?$",
         DeliveryTrackerConsumer.as_asgi(),
     ),
+    re_path(r"^/?ws/vendor/live/?$", VendorLiveConsumer.as_asgi()),
 ]
@@ -3,13 +3,13 @@
 from collections.abc import Iterable
 
 from django.db import transaction
-from django.db.models import F
 
 from product_app.models import Product, ProductStock
 from users.permissions import NotBuyingOwnListing
 
 from ..assignment import pick_warehouse
 from ..models import Order, OrderItem
+from .stock import allocate_order_items
 
 
 def create_order_from_cart(user, cart):
@@ -80,7 +80,9 @@ def assign_warehouses_and_update_stock(order):
     if order.latitude is None or order.longitude is None or order.stock_updated:
         return
     with transaction.atomic():
-        items = order.items.select_for_update().select_related("product")
+        items = list(
+            order.items.select_for_update().select_related("product").order_by("pk")
+        )
         for item in items:
             if not item.warehouse_id:
                 stock_entry = get_nearest_stock(
@@ -90,13 +92,7 @@ def assign_warehouses_and_update_stock(order):
                     raise ValueError("No stock available")
                 item.warehouse = stock_entry.warehouse
                 item.save(update_fields=["warehouse"])
-            updated = ProductStock.objects.filter(
-                product=item.product,
-                warehouse=item.warehouse,
-                quantity__gte=item.quantity,
-            ).update(quantity=F("quantity") - item.quantity)
-            if updated == 0:
-                raise ValueError("Insufficient stock")
+        allocate_order_items(items)
         order.stock_updated = True
         order.save(update_fields=["stock_updated"])
 
@@ -0,0 +1,215 @@
+"""Geoapify address autocomplete with prefix-aware caching.
+
+Results are cached per normalized query in the shared Django cache. A longer
+query ("umoja in") can be answered by filtering the cached results of one of
+its prefixes ("umoja") when that prefix's result set was complete, i.e. the
+provider returned fewer rows than the requested limit. Upstream calls are
+rate limited per client through ``core.rate_limit`` and identical in-flight
+queries are coalesced.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+from typing import Any
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from core import metrics
+from core.rate_limit import hit, make_key
+from core.singleflight import AsyncSingleFlight, SingleFlight
+
+logger = logging.getLogger(__name__)
+
+AUTOCOMPLETE_URL = "https://api.geoapify.com/v1/geocode/autocomplete"
+CACHE_PREFIX = "geo:ac:v1:"
+MIN_QUERY_LEN = 3
+RESULT_LIMIT = 6
+
+_WS_RE = re.compile(r"\s+")
+
+_FLIGHTS = SingleFlight()
+_AFLIGHTS = AsyncSingleFlight()
+
+
+def _cache_ttl() -> int:
+    return int(getattr(settings, "GEO_AUTOCOMPLETE_CACHE_TTL", 24 * 60 * 60))
+
+
+def normalize_query(q: str) -> str:
+    return _WS_RE.sub(" ", (q or "").strip().lower())
+
+
+def _cache_key(q: str) -> str:
+    return CACHE_PREFIX + hashlib.sha1(q.encode("utf-8")).hexdigest()  # nosec B324
+
+
+def _params(q: str) -> dict[str, Any]:
+    return {
+        "text": q,
+        "limit": RESULT_LIMIT,
+        "format": "json",
+        "filter": "countrycode:ke",
+        "apiKey": getattr(settings, "GEOAPIFY_API_KEY", ""),
+    }
+
+
+def _haystack(row: dict) -> str:
+    parts = [
+        row.get("formatted"),
+        row.get("address_line1"),
+        row.get("address_line2"),
+        row.get("name"),
+        row.get("street"),
+        row.get("suburb"),
+        row.get("city"),
+    ]
+    return normalize_query(" ".join(str(p) for p in parts if p))
+
+
+def _filter(results: list[dict], q: str) -> list[dict]:
+    tokens = q.split(" ")
+    return [r for r in results if all(t in _haystack(r) for t in tokens)]
+
+
+def _entry(results: list[dict]) -> dict[str, Any]:
+    return {"results": results, "complete": len(results) < RESULT_LIMIT}
+
+
+def _lookup_plan(q: str) -> list[str]:
+    """Exact key first, then each shorter prefix down to MIN_QUERY_LEN."""
+    return [q[:n] for n in range(len(q), MIN_QUERY_LEN - 1, -1)]
+
+
+def _from_entries(q: str, plan: list[str], found: dict[str, Any]) -> list | None:
+    for prefix in plan:
+        entry = found.get(_cache_key(prefix))
+        if not entry:
+            continue
+        if prefix == q:
+            metrics.inc("geo_autocomplete_cache_hit", kind="exact")
+            return entry["results"]
+        if entry.get("complete"):
+            filtered = _filter(entry["results"], q)
+            if filtered:
+                metrics.inc("geo_autocomplete_cache_hit", kind="prefix")
+                return filtered
+    return None
+
+
+def cached_results(q: str) -> list[dict] | None:
+    """Serve q from its own cache entry or by filtering a complete prefix entry."""
+    plan = _lookup_plan(q)
+    try:
+        found = cache.get_many([_cache_key(p) for p in plan])
+    except Exception as exc:  # pragma: no cover - cache outage
+        logger.warning("Autocomplete cache read failed: %s", exc)
+        return None
+    return _from_entries(q, plan, found)
+
+
+def _store(q: str, results: list[dict]) -> None:
+    try:
+        cache.set(_cache_key(q), _entry(results), timeout=_cache_ttl())
+    except Exception as exc:  # pragma: no cover - cache outage
+        logger.warning("Autocomplete cache write failed: %s", exc)
+
+
+def _rate_limited(client_key: str) -> bool:
+    limit = int(getattr(settings, "GEO_AUTOCOMPLETE_RATE_LIMIT", 5))
+    window = int(getattr(settings, "GEO_AUTOCOMPLETE_RATE_WINDOW", 1))
+    return hit(make_key("geo_ac", client_key), window) > limit
+
+
+def _fetch_upstream(q: str) -> list[dict] | None:
+    try:
+        r = requests.get(AUTOCOMPLETE_URL, params=_params(q), timeout=5)
+    except requests.RequestException as exc:
+        logger.warning("Autocomplete request error: %s", exc)
+        return None
+    if not r.ok:
+        logger.warning("Autocomplete response %s", r.status_code)
+        return None
+    try:
+        return list((r.json() or {}).get("results") or [])
+    except ValueError:
+        return None
+
+
+async def _afetch_upstream(q: str) -> list[dict] | None:
+    try:
+        async with httpx.AsyncClient(timeout=5, follow_redirects=False) as client:
+            r = await client.get(AUTOCOMPLETE_URL, params=_params(q))
+    except httpx.HTTPError as exc:
+        logger.warning("Autocomplete request error: %s", exc)
+        return None
+    if r.status_code != 200:
+        logger.warning("Autocomplete response %s", r.status_code)
+        return None
+    try:
+        return list((r.json() or {}).get("results") or [])
+    except ValueError:
+        return None
+
+
+def autocomplete(q: str, client_key: str) -> list[dict]:
+    """Return address suggestions for q (empty list when throttled or failing)."""
+    q = normalize_query(q)
+    if len(q) < MIN_QUERY_LEN:
+        return []
+    results = cached_results(q)
+    if results is not None:
+        return results
+    if _rate_limited(client_key):
+        metrics.inc("geo_autocomplete_throttled")
+        return []
+
+    def _miss() -> list[dict] | None:
+        fresh = _fetch_upstream(q)
+        if fresh is not None:
+            _store(q, fresh)
+        return fresh
+
+    results, shared = _FLIGHTS.do(q, _miss, timeout=6)
+    if shared:
+        metrics.inc("geo_autocomplete_coalesced")
+    return results or []
+
+
+async def aautocomplete(q: str, client_key: str) -> list[dict]:
+    """Async variant of :func:`autocomplete` for ASGI views."""
+    q = normalize_query(q)
+    if len(q) < MIN_QUERY_LEN:
+        return []
+    plan = _lookup_plan(q)
+    try:
+        found = await cache.aget_many([_cache_key(p) for p in plan])
+    except Exception as exc:  # pragma: no cover - cache outage
+        logger.warning("Autocomplete cache read failed: %s", exc)
+        found = {}
+    results = _from_entries(q, plan, found)
+    if results is not None:
+        return results
+    if await sync_to_async(_rate_limited)(client_key):
+        metrics.inc("geo_autocomplete_throttled")
+        return []
+
+    async def _miss() -> list[dict] | None:
+        fresh = await _afetch_upstream(q)
+        if fresh is not None:
+            try:
+                await cache.aset(_cache_key(q), _entry(fresh), timeout=_cache_ttl())
+            except Exception as exc:  # pragma: no cover - cache outage
+                logger.warning("Autocomplete cache write failed: %s", exc)
+        return fresh
+
+    results, shared = await _AFLIGHTS.do(q, _miss)
+    if shared:
+        metrics.inc("geo_autocomplete_coalesced")
+    return results or []
@@ -0,0 +1,330 @@
+"""Streaming export of completed deliveries for ETA training.
+
+Rows are read with a chunked ``values_list`` cursor (never model instances)
+and every feature is computed per chunk with NumPy. Output is either the CSV
+read by ``train_eta_model`` (header :data:`COLUMNS`, identical to the checked-in
+``eta_training.csv``) or a columnar ``.npz`` with one array per column.
+
+Large exports can be split over date ranges (:func:`split_range`) and run in
+worker processes; each worker writes a columnar part and the parent stitches
+the parts together in range order, so output is deterministic.
+"""
+
+from __future__ import annotations
+
+import csv
+import os
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from itertools import islice
+
+import numpy as np
+import numpy.typing as npt
+from django.apps import apps
+from django.utils import timezone
+
+from orders import eta
+
+COLUMNS = (
+    "delivery_id",
+    "driver_id",
+    "wh_lat",
+    "wh_lng",
+    "dest_lat",
+    "dest_lng",
+    "asgmt_hour",
+    "asgmt_dow",
+    "picked_hour",
+    "picked_dow",
+    "dist_haversine_km",
+    "route_distance_km",
+    "duration_min",  # target
+)
+# Integer-valued columns; NaN marks "missing" and is written as an empty cell.
+_INT_COLUMNS = {
+    "delivery_id",
+    "driver_id",
+    "asgmt_hour",
+    "asgmt_dow",
+    "picked_hour",
+    "picked_dow",
+}
+_ROUND = {
+    "wh_lat": 6,
+    "wh_lng": 6,
+    "dest_lat": 6,
+    "dest_lng": 6,
+    "dist_haversine_km": 4,
+    "route_distance_km": 4,
+    "duration_min": 2,
+}
+_FIELDS = (
+    "pk",
+    "driver_id",
+    "origin_lat",
+    "origin_lng",
+    "dest_lat",
+    "dest_lng",
+    "assigned_at",
+    "picked_up_at",
+    "delivered_at",
+)
+MIN_DURATION_MIN = 1.0
+MAX_DURATION_MIN = 240.0
+DEFAULT_CHUNK_SIZE = 5000
+
+Chunk = dict[str, np.ndarray]
+
+
+@dataclass
+class ExportStats:
+    rows: int = 0
+    skips: dict[str, int] = field(
+        default_factory=lambda: {"no_origin": 0, "no_dest": 0, "outlier": 0}
+    )
+
+    def merge(self, other: ExportStats) -> None:
+        self.rows += other.rows
+        for k, v in other.skips.items():
+            self.skips[k] = self.skips.get(k, 0) + v
+
+
+def _floats(values) -> np.ndarray:
+    return np.array([np.nan if v is None else float(v) for v in values], dtype=float)
+
+
+def _local_clock(values) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(epoch seconds, local hour, local weekday) arrays; NaN where missing."""
+    n = len(values)
+    epoch = np.full(n, np.nan)
+    local: npt.NDArray[np.datetime64] = np.full(
+        n, np.datetime64("NaT"), dtype="datetime64[s]"
+    )
+    for i, v in enumerate(values):
+        if v is not None:
+            epoch[i] = v.timestamp()
+            local[i] = np.datetime64(timezone.localtime(v).replace(tzinfo=None), "s")
+    days: npt.NDArray[np.datetime64] = local.astype("datetime64[D]")
+    hour = ((local - days).astype("timedelta64[h]")).astype(float)
+    # 1970-01-01 was a Thursday (weekday() == 3)
+    weekday: npt.NDArray[np.int64] = (days.astype("int64") + 3) % 7
+    missing = np.isnat(local)
+    hour[missing] = np.nan
+    dow = weekday.astype(float)
+    dow[missing] = np.nan
+    return epoch, hour, dow
+
+
+def features(rows: list[tuple]) -> tuple[Chunk, ExportStats]:
+    """Vectorized feature columns for one chunk of ``_FIELDS`` tuples."""
+    stats = ExportStats()
+    if not rows:
+        return {c: np.empty(0) for c in COLUMNS}, stats
+    pk, driver, *coords, assigned, picked, delivered = zip(*rows)
+    o_lat, o_lng, t_lat, t_lng = map(_floats, coords)
+    _, a_hour, a_dow = _local_clock(assigned)
+    p_epoch, p_hour, p_dow = _local_clock(picked)
+    d_epoch, _, _ = _local_clock(delivered)
+    duration = (d_epoch - p_epoch) / 60.0
+
+    no_origin = np.isnan(o_lat) | np.isnan(o_lng)
+    no_dest = ~no_origin & (np.isnan(t_lat) | np.isnan(t_lng))
+    outlier = (duration <= MIN_DURATION_MIN) | (duration > MAX_DURATION_MIN)
+    outlier &= ~no_origin & ~no_dest
+    keep = ~(no_origin | no_dest | outlier)
+    stats.skips["no_origin"] = int(no_origin.sum())
+    stats.skips["no_dest"] = int(no_dest.sum())
+    stats.skips["outlier"] = int(outlier.sum())
+    stats.rows = int(keep.sum())
+
+    o_lat, o_lng, t_lat, t_lng = (a[keep] for a in (o_lat, o_lng, t_lat, t_lng))
+    chunk = {
+        "delivery_id": np.asarray(pk, dtype=float)[keep],
+        "driver_id": _floats(driver)[keep],
+        "wh_lat": o_lat,
+        "wh_lng": o_lng,
+        "dest_lat": t_lat,
+        "dest_lng": t_lng,
+        "asgmt_hour": a_hour[keep],
+        "asgmt_dow": a_dow[keep],
+        "picked_hour": p_hour[keep],
+        "picked_dow": p_dow[keep],
+        "dist_haversine_km": eta.haversine_km(o_lat, o_lng, t_lat, t_lng),
+        "route_distance_km": eta.cached_route_km(o_lat, o_lng, t_lat, t_lng),
+        "duration_min": duration[keep],
+    }
+    for name, places in _ROUND.items():
+        chunk[name] = np.round(chunk[name], places)
+    return chunk, stats
+
+
+def iter_chunks(
+    since: datetime | None = None,
+    until: datetime | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[tuple[Chunk, ExportStats]]:
+    """Yield feature chunks for deliveries completed in ``[since, until)``."""
+    Delivery = apps.get_model("orders", "Delivery")
+    qs = Delivery.objects.exclude(picked_up_at=None).exclude(delivered_at=None)
+    if since is not None:
+        qs = qs.filter(delivered_at__gte=since)
+    if until is not None:
+        qs = qs.filter(delivered_at__lt=until)
+    cursor = qs.order_by("pk").values_list(*_FIELDS).iterator(chunk_size=chunk_size)
+    while rows := list(islice(cursor, chunk_size)):
+        yield features(rows)
+
+
+# ---- writers ----
+def _cell(name: str, v: float):
+    if np.isnan(v):
+        return ""
+    return int(v) if name in _INT_COLUMNS else v
+
+
+class CsvWriter:
+    def __init__(self, path: str, *, append: bool = False):
+        exists = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self._f = open(path, "a" if append else "w", newline="")
+        self._w = csv.writer(self._f)
+        if not exists:
+            self._w.writerow(COLUMNS)
+
+    def write(self, chunk: Chunk) -> None:
+        cols = [[_cell(c, v) for v in chunk[c].tolist()] for c in COLUMNS]
+        self._w.writerows(zip(*cols))
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class NpzWriter:
+    """Collects column chunks and saves one compressed array per column.
+
+    With ``append`` the columns of an existing file are kept in front.
+    """
+
+    def __init__(self, path: str, *, append: bool = False):
+        self._path = path
+        self._parts: dict[str, list[np.ndarray]] = {c: [] for c in COLUMNS}
+        if append and os.path.exists(path):
+            with np.load(path, allow_pickle=False) as z:
+                for c in COLUMNS:
+                    self._parts[c].append(z[c])
+
+    def write(self, chunk: Chunk) -> None:
+        for c in COLUMNS:
+            self._parts[c].append(chunk[c])
+
+    def close(self) -> None:
+        np.savez_compressed(
+            self._path,
+            **{
+                c: np.concatenate(p) if p else np.empty(0)
+                for c, p in self._parts.items()
+            },
+        )
+
+
+def open_writer(path: str, fmt: str | None = None, *, append: bool = False):
+    fmt = fmt or ("npz" if path.endswith(".npz") else "csv")
+    if fmt == "npz":
+        return NpzWriter(path, append=append)
+    if fmt == "csv":
+        return CsvWriter(path, append=append)
+    raise ValueError(f"unknown format {fmt!r}")
+
+
+# ---- parallel ----
+def split_range(
+    start: datetime, end: datetime, parts: int
+) -> list[tuple[datetime, datetime]]:
+    """``parts`` contiguous ``[a, b)`` windows covering ``[start, end)``."""
+    parts = max(1, int(parts))
+    step = (end - start) / parts
+    edges = [start + step * i for i in range(parts)] + [end]
+    return [(a, b) for a, b in zip(edges, edges[1:]) if b > a]
+
+
+def completed_range() -> tuple[datetime, datetime] | None:
+    from django.db.models import Max, Min
+
+    Delivery = apps.get_model("orders", "Delivery")
+    agg = (
+        Delivery.objects.exclude(picked_up_at=None)
+        .exclude(delivered_at=None)
+        .aggregate(lo=Min("delivered_at"), hi=Max("delivered_at"))
+    )
+    if agg["lo"] is None:
+        return None
+    return agg["lo"], agg["hi"]
+
+
+def _export_part(args) -> tuple[str, ExportStats]:
+    """Worker entry point: export one date window to a columnar part file."""
+    from django.db import connections
+
+    since, until, chunk_size, part_path = args
+    connections.close_all()  # never share the parent's sockets
+    writer = NpzWriter(part_path)
+    total = ExportStats()
+    for chunk, stats in iter_chunks(since, until, chunk_size):
+        writer.write(chunk)
+        total.merge(stats)
+    writer.close()
+    connections.close_all()
+    return part_path, total
+
+
+def export(
+    out: str,
+    *,
+    fmt: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int = 1,
+    append: bool = False,
+) -> ExportStats:
+    writer = open_writer(out, fmt, append=append)
+    total = ExportStats()
+    try:
+        if workers <= 1:
+            for chunk, stats in iter_chunks(since, until, chunk_size):
+                writer.write(chunk)
+                total.merge(stats)
+            return total
+
+        bounds = completed_range()
+        if bounds is None:
+            return total
+        lo = max(bounds[0], since) if since else bounds[0]
+        # the newest row is ``bounds[1]`` itself; the end bound is exclusive
+        hi = until or bounds[1] + timedelta(seconds=1)
+        windows = split_range(lo, hi, workers)
+        jobs = [
+            (a, b, chunk_size, f"{out}.part{i}.npz") for i, (a, b) in enumerate(windows)
+        ]
+        _run_parts(jobs, workers, writer, total)
+        return total
+    finally:
+        writer.close()
+
+
+def _run_parts(jobs, workers: int, writer, total: ExportStats) -> None:
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    from django.db import connections
+
+    connections.close_all()
+    ctx = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        for part_path, stats in pool.map(_export_part, jobs):
+            try:
+                with np.load(part_path, allow_pickle=False) as z:
+                    writer.write({c: z[c] for c in COLUMNS})
+            finally:
+                os.remove(part_path)
+            total.merge(stats)
@@ -0,0 +1,251 @@
+"""Write-behind buffer for driver position fixes.
+
+Each worker process keeps one :data:`ping_buffer`. Tracker consumers append
+fixes to it; the buffer flushes every ``PING_BUFFER_FLUSH_INTERVAL`` seconds or
+once ``PING_BUFFER_MAX_ROWS`` fixes are pending, whichever comes first. A flush
+costs a fixed number of queries regardless of how many drivers reported:
+
+* one SELECT to check the fixes still belong to the assigned driver,
+* one ``bulk_update`` of ``Delivery.last_*`` (newest fix per delivery),
+* at most one UPDATE moving ASSIGNED deliveries to EN_ROUTE (whose new
+  rows are then queued for the vendor board, which gets no ``post_save``),
+* one ``bulk_create`` each for ``DeliveryPing`` and ``DeliveryEvent``, for
+  the fixes that moved away from the delivery's previous position.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core import metrics
+from core.db_writes import run_write
+
+from . import vendor_live
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Fix:
+    delivery_id: int
+    driver_id: int
+    lat: Decimal
+    lng: Decimal
+    at: datetime
+
+
+@dataclass
+class WriteResult:
+    written: int = 0
+    unchanged: int = 0  # repeated the previous position; no history row
+    moved: list[int] = field(default_factory=list)  # ASSIGNED -> EN_ROUTE
+    latest: dict[int, Fix] = field(default_factory=dict)  # advanced last_*
+
+
+def write_fixes(batch: list[Fix]) -> WriteResult:
+    """Persist fixes in a fixed number of queries (see module docstring).
+
+    Fixes from drivers no longer assigned are dropped. ``last_*`` only moves
+    forward: a delivery is updated when its newest fix in the batch is newer
+    than the stored ``last_ping_at`` (offline-buffered fixes can be older).
+    Like the per-ping writer before it, history rows are only written for
+    fixes whose lat/lng differ from the delivery's previous position.
+    """
+    Delivery = apps.get_model("orders", "Delivery")
+    DeliveryPing = apps.get_model("orders", "DeliveryPing")
+    DeliveryEvent = apps.get_model("orders", "DeliveryEvent")
+
+    ids = {f.delivery_id for f in batch}
+    rows = list(
+        Delivery.objects.filter(pk__in=ids).values_list(
+            "pk", "driver_id", "status", "last_ping_at", "last_lat", "last_lng"
+        )
+    )
+    owners = {pk: driver_id for pk, driver_id, *_ in rows}
+    assigned = {pk for pk, _d, st, *_ in rows if st == Delivery.Status.ASSIGNED}
+    last_at = {pk: at for pk, _d, _st, at, *_ in rows}
+    last_pos = {pk: (lat, lng) for pk, _d, _st, _at, lat, lng in rows}
+    # Drop fixes from drivers who were unassigned since the fix arrived.
+    batch = [f for f in batch if owners.get(f.delivery_id) == f.driver_id]
+    if not batch:
+        return WriteResult()
+
+    newest: dict[int, Fix] = {}
+    for f in batch:
+        cur = newest.get(f.delivery_id)
+        if cur is None or f.at >= cur.at:
+            newest[f.delivery_id] = f
+    latest = {
+        pk: f
+        for pk, f in newest.items()
+        if last_at.get(pk) is None or f.at >= last_at[pk]
+    }
+    # A stationary driver (or a replayed fix) only refreshes last_ping_at.
+    moves: list[Fix] = []
+    for f in sorted(batch, key=lambda f: (f.delivery_id, f.at)):
+        if last_pos.get(f.delivery_id) != (f.lat, f.lng):
+            moves.append(f)
+            last_pos[f.delivery_id] = (f.lat, f.lng)
+
+    now = timezone.now()
+    with transaction.atomic():
+        if latest:
+            Delivery.objects.bulk_update(
+                [
+                    Delivery(
+                        pk=f.delivery_id,
+                        last_lat=f.lat,
+                        last_lng=f.lng,
+                        last_ping_at=f.at,
+                        updated_at=now,
+                    )
+                    for f in latest.values()
+                ],
+                ["last_lat", "last_lng", "last_ping_at", "updated_at"],
+            )
+        moved = [pk for pk in newest if pk in assigned]
+        if moved:
+            Delivery.objects.filter(
+                pk__in=moved, status=Delivery.Status.ASSIGNED
+            ).update(status=Delivery.Status.EN_ROUTE, updated_at=now)
+            try:
+                vendor_live.publish_deliveries(Delivery.objects.filter(pk__in=moved))
+            except Exception as exc:  # pragma: no cover - cache/DB outage
+                logger.warning(
+                    "Vendor board update for moved deliveries failed: %s", exc
+                )
+        DeliveryPing.objects.bulk_create(
+            [
+                DeliveryPing(
+                    delivery_id=f.delivery_id, lat=f.lat, lng=f.lng, created_at=f.at
+                )
+                for f in moves
+            ]
+        )
+        DeliveryEvent.objects.bulk_create(
+            [
+                DeliveryEvent(
+                    delivery_id=f.delivery_id,
+                    actor_id=f.driver_id,
+                    type="position",
+                    note={"lat": float(f.lat), "lng": float(f.lng)},
+                )
+                for f in moves
+            ]
+        )
+    return WriteResult(
+        written=len(moves),
+        unchanged=len(batch) - len(moves),
+        moved=moved,
+        latest=latest,
+    )
+
+
+class PingBuffer:
+    def __init__(
+        self, *, max_rows: int | None = None, interval: float | None = None
+    ) -> None:
+        self.max_rows = max_rows or int(getattr(settings, "PING_BUFFER_MAX_ROWS", 200))
+        self.interval = interval or float(
+            getattr(settings, "PING_BUFFER_FLUSH_INTERVAL", 2.0)
+        )
+        # Cap retained rows after failed flushes so a DB outage cannot grow
+        # the buffer without bound.
+        self.max_retained = self.max_rows * 10
+        self._pending: list[Fix] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def add(self, fix: Fix) -> bool:
+        """Queue a fix; return True when the buffer is due for a size flush."""
+        with self._lock:
+            self._pending.append(fix)
+            return len(self._pending) >= self.max_rows
+
+    # ---- sync flush (thread pool / management commands / atexit) ----
+    def flush(self) -> list[int]:
+        """Persist pending fixes; return ids of deliveries moved to EN_ROUTE."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return []
+            metrics.observe("ping_buffer_depth", len(batch))
+            try:
+                with metrics.timer("ping_buffer_flush_seconds"):
+                    moved = self._write(batch)
+            except Exception:
+                logger.exception("Ping buffer flush failed (%s rows)", len(batch))
+                metrics.inc("ping_buffer_flush_failed")
+                with self._lock:
+                    self._pending = (batch + self._pending)[-self.max_retained :]
+                return []
+            metrics.inc("ping_buffer_rows", len(batch))
+            return moved
+
+    def _write(self, batch: list[Fix]) -> list[int]:
+        return write_fixes(batch).moved
+
+    # ---- async side (event loop of an ASGI worker) ----
+    async def aadd(self, fix: Fix, channel_layer=None) -> None:
+        self._ensure_timer(channel_layer)
+        if self.add(fix):
+            await self.aflush(channel_layer)
+
+    async def aflush(self, channel_layer=None) -> None:
+        moved = await run_write(self.flush)
+        if channel_layer is None or not moved:
+            return
+        for delivery_id in moved:
+            try:
+                await channel_layer.group_send(
+                    f"delivery.{delivery_id}",
+                    {"type": "delivery.event", "kind": "status", "status": "en_route"},
+                )
+            except Exception as e:
+                logger.debug("status broadcast failed: %s", e, exc_info=True)
+
+    def _ensure_timer(self, channel_layer) -> None:
+        loop = asyncio.get_running_loop()
+        task = self._task
+        if task is not None and not task.done() and task.get_loop() is loop:
+            return
+        self._task = loop.create_task(self._run(channel_layer))
+
+    async def _run(self, channel_layer) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if self._pending:
+                try:
+                    await self.aflush(channel_layer)
+                except Exception:  # pragma: no cover - keep the timer alive
+                    logger.exception("Periodic ping flush failed")
+
+
+ping_buffer = PingBuffer()
+
+
+@atexit.register
+def _flush_at_shutdown() -> None:  # pragma: no cover - process exit
+    if not ping_buffer.depth:
+        return
+    try:
+        ping_buffer.flush()
+    except Exception:
+        logger.exception("Ping buffer flush at shutdown failed")
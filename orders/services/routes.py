@@ -0,0 +1,348 @@
+"""Driving routes with a two-tier cache (in-process LRU + shared Django cache).
+
+Upstream calls (Geoapify, then OSRM, then a straight line) are coalesced per
+origin/destination key: concurrent callers in one worker share a single
+in-flight fetch, and workers coordinate through a short-lived cache lock so
+only one of them hits the routing provider.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+
+from core import metrics
+from core.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+ROUTE_CACHE_PREFIX = "route:v1:"
+_FALLBACK_TTL = 30  # seconds; straight-line fallbacks retry upstream sooner
+_LOCK_POLL_S = 0.1
+_SHORT_HOP_KM = 0.12  # ~120 m; no routing needed
+
+
+def _ttl() -> int:
+    return int(getattr(settings, "ROUTE_CACHE_TTL", 300))
+
+
+def _local_ttl() -> int:
+    return int(getattr(settings, "ROUTE_CACHE_LOCAL_TTL", 60))
+
+
+def _lock_ttl() -> int:
+    return int(getattr(settings, "ROUTE_FETCH_TIMEOUT", 10)) + 2
+
+
+# ---------- geometry helpers ----------
+def _haversine_km(a_lat, a_lng, b_lat, b_lng):
+    R = 6371
+    dLat = math.radians(b_lat - a_lat)
+    dLng = math.radians(b_lng - a_lng)
+    s1 = (
+        math.sin(dLat / 2) ** 2
+        + math.cos(math.radians(a_lat))
+        * math.cos(math.radians(b_lat))
+        * math.sin(dLng / 2) ** 2
+    )
+    return 2 * R * math.asin(math.sqrt(s1))
+
+
+def _to_latlng(coords, ref=None):
+    """Return coords as [lat, lng]. If ref given, choose orientation closest to ref."""
+    if not coords:
+        return []
+    if ref is not None:
+        first = coords[0]
+        as_is = _haversine_km(first[0], first[1], ref[0], ref[1])
+        flipped = _haversine_km(first[1], first[0], ref[0], ref[1])
+        if flipped < as_is:
+            return [[c[1], c[0]] for c in coords]
+        return [[c[0], c[1]] for c in coords]
+    return [[c[1], c[0]] for c in coords]
+
+
+# ---------- upstream providers ----------
+def _geoapify_route(a_lat, a_lng, b_lat, b_lng, api_key: str):
+    url = "https://api.geoapify.com/v1/routing"
+    params = {
+        "waypoints": f"{a_lat},{a_lng}|{b_lat},{b_lng}",
+        "mode": "drive",
+        "format": "geojson",
+        "apiKey": api_key,
+    }
+    r = requests.get(
+        url, params=params, timeout=getattr(settings, "ROUTE_FETCH_TIMEOUT", 10)
+    )
+    r.raise_for_status()
+    j = r.json()
+    feat = (j.get("features") or [None])[0]
+    if not feat:
+        raise ValueError("geoapify: no route")
+    coords = feat["geometry"]["coordinates"]
+    if isinstance(coords[0][0], (int, float)):  # LineString
+        coords_ll = _to_latlng(coords, (a_lat, a_lng))
+    else:  # MultiLineString
+        flat = [p for part in coords for p in part]
+        coords_ll = _to_latlng(flat, (a_lat, a_lng))
+    props = feat.get("properties", {})
+    dist_km = (props.get("distance", 0) or 0) / 1000.0
+    dur_min = (props.get("time", 0) or 0) / 60.0
+    return {"coords": coords_ll, "distance_km": dist_km, "duration_min": dur_min}
+
+
+def _osrm_route(a_lat, a_lng, b_lat, b_lng):
+    base = "https://router.project-osrm.org/route/v1/driving"
+    url = f"{base}/{a_lng},{a_lat};{b_lng},{b_lat}"
+    r = requests.get(
+        url,
+        params={"overview": "full", "geometries": "geojson"},
+        timeout=getattr(settings, "ROUTE_FETCH_TIMEOUT", 10),
+    )
+    r.raise_for_status()
+    j = r.json()
+    route = (j.get("routes") or [None])[0]
+    if not route:
+        raise ValueError("osrm: no route")
+    coords = route["geometry"]["coordinates"]
+    coords_ll = _to_latlng(coords, (a_lat, a_lng))
+    dist_km = (route.get("distance", 0) or 0) / 1000.0
+    dur_min = (route.get("duration", 0) or 0) / 60.0
+    return {"coords": coords_ll, "distance_km": dist_km, "duration_min": dur_min}
+
+
+def _fetch_upstream(a_lat, a_lng, b_lat, b_lng) -> tuple[dict, bool]:
+    """Return (payload, is_fallback)."""
+    try:
+        with metrics.timer("route_upstream_seconds"):
+            if getattr(settings, "GEOAPIFY_API_KEY", None):
+                payload = _geoapify_route(
+                    a_lat, a_lng, b_lat, b_lng, settings.GEOAPIFY_API_KEY
+                )
+            else:
+                payload = _osrm_route(a_lat, a_lng, b_lat, b_lng)
+        fallback = False
+    except Exception as exc:
+        logger.warning("Route lookup failed, using straight line: %s", exc)
+        payload = {
+            "coords": [[a_lat, a_lng], [b_lat, b_lng]],
+            "distance_km": _haversine_km(a_lat, a_lng, b_lat, b_lng),
+            "duration_min": None,
+        }
+        fallback = True
+    coords = payload.get("coords") or []
+    payload["coords"] = _to_latlng(coords, (a_lat, a_lng)) if coords else []
+    return payload, fallback
+
+
+# ---------- cache tiers ----------
+class _LocalLRU:
+    """Thread-safe, size-capped LRU with per-entry expiry."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, payload = item
+            if time.monotonic() >= expires:
+                self._data.pop(key, None)
+                return None
+            self._data.move_to_end(key)
+            return payload
+
+    def set(self, key: str, payload: dict, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, payload)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_LOCAL = _LocalLRU(int(getattr(settings, "ROUTE_CACHE_LOCAL_MAXSIZE", 512)))
+
+
+def route_cache_key(a_lat, a_lng, b_lat, b_lng) -> str:
+    # round to 5 dp (~1 m) to improve hit rate
+    return (
+        f"{ROUTE_CACHE_PREFIX}"
+        f"{round(a_lat, 5)},{round(a_lng, 5)}:{round(b_lat, 5)},{round(b_lng, 5)}"
+    )
+
+
+def get_cached_route(key: str) -> dict | None:
+    payload = _LOCAL.get(key)
+    if payload is not None:
+        metrics.inc("route_cache_hit", tier="local")
+        return payload
+    try:
+        payload = cache.get(key)
+    except Exception as exc:  # pragma: no cover - cache outage
+        logger.warning("Route cache read failed: %s", exc)
+        payload = None
+    if payload is not None:
+        metrics.inc("route_cache_hit", tier="shared")
+        _LOCAL.set(key, payload, min(_ttl(), _local_ttl()))
+    return payload
+
+
+def set_cached_route(key: str, payload: dict, *, ttl: int | None = None) -> None:
+    ttl = _ttl() if ttl is None else ttl
+    _LOCAL.set(key, payload, min(ttl, _local_ttl()))
+    try:
+        cache.set(key, payload, timeout=ttl)
+    except Exception as exc:  # pragma: no cover - cache outage
+        logger.warning("Route cache write failed: %s", exc)
+
+
+# ---------- single-flight ----------
+_FLIGHTS = SingleFlight()
+
+
+def _fetch_coalesced_across_workers(key: str, a_lat, a_lng, b_lat, b_lng) -> dict:
+    lock_key = f"{key}:lock"
+    lock_ttl = _lock_ttl()
+    try:
+        owner = cache.add(lock_key, 1, timeout=lock_ttl)
+    except Exception:  # pragma: no cover - cache outage
+        owner = True
+    if not owner:
+        # Another worker is fetching; wait for its result to land.
+        metrics.inc("route_coalesced", scope="shared")
+        deadline = time.monotonic() + lock_ttl
+        while time.monotonic() < deadline:
+            time.sleep(_LOCK_POLL_S)
+            payload = get_cached_route(key)
+            if payload is not None:
+                return payload
+        # Lock holder died or timed out; fetch ourselves.
+    try:
+        metrics.inc("route_cache_miss")
+        payload, fallback = _fetch_upstream(a_lat, a_lng, b_lat, b_lng)
+        set_cached_route(key, payload, ttl=_FALLBACK_TTL if fallback else None)
+        return payload
+    finally:
+        if owner:
+            try:
+                cache.delete(lock_key)
+            except Exception:  # pragma: no cover
+                pass
+
+
+def get_route(a_lat: float, a_lng: float, b_lat: float, b_lng: float) -> dict:
+    """Return {"coords", "distance_km", "duration_min"} for a -> b."""
+    if _haversine_km(a_lat, a_lng, b_lat, b_lng) < _SHORT_HOP_KM:
+        return {
+            "coords": [[a_lat, a_lng], [b_lat, b_lng]],
+            "distance_km": _SHORT_HOP_KM,
+            "duration_min": 1,
+        }
+
+    key = route_cache_key(a_lat, a_lng, b_lat, b_lng)
+    cached = get_cached_route(key)
+    if cached is not None:
+        return cached
+
+    payload, shared = _FLIGHTS.do(
+        key,
+        lambda: _fetch_coalesced_across_workers(key, a_lat, a_lng, b_lat, b_lng),
+        timeout=_lock_ttl(),
+    )
+    if shared:
+        metrics.inc("route_coalesced", scope="local")
+    return payload
+
+
+# ---------- delivery helpers ----------
+def delivery_route_endpoints(d) -> tuple[tuple[float, float], tuple[float, float]]:
+    """Return ((a_lat, a_lng), (b_lat, b_lng)); raise ValueError when incomplete."""
+    if d.last_lat is not None and d.last_lng is not None:
+        start = (float(d.last_lat), float(d.last_lng))
+    elif d.origin_lat is not None and d.origin_lng is not None:
+        start = (float(d.origin_lat), float(d.origin_lng))
+    else:
+        raise ValueError("no start position")
+    if d.dest_lat is None or d.dest_lng is None:
+        raise ValueError("no destination")
+    return start, (float(d.dest_lat), float(d.dest_lng))
+
+
+def precompute_delivery_route(delivery_id: int) -> dict[str, Any] | None:
+    """Warm the route cache for a delivery; safe to run off the request thread."""
+    from ..models import Delivery
+
+    try:
+        d = Delivery.objects.only(
+            "last_lat",
+            "last_lng",
+            "origin_lat",
+            "origin_lng",
+            "dest_lat",
+            "dest_lng",
+        ).get(pk=delivery_id)
+        (a_lat, a_lng), (b_lat, b_lng) = delivery_route_endpoints(d)
+        return get_route(a_lat, a_lng, b_lat, b_lng)
+    except (Delivery.DoesNotExist, ValueError):
+        return None
+    except Exception as exc:
+        logger.warning("Route precompute failed for delivery %s: %s", delivery_id, exc)
+        return None
+
+
+def _precompute_in_thread(delivery_id: int) -> None:
+    close_old_connections()
+    try:
+        precompute_delivery_route(delivery_id)
+    finally:
+        close_old_connections()
+
+
+_EXECUTOR: ThreadPoolExecutor | None = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(
+                max_workers=int(getattr(settings, "ROUTE_PRECOMPUTE_WORKERS", 2)),
+                thread_name_prefix="route-precompute",
+            )
+        return _EXECUTOR
+
+
+def schedule_route_precompute(delivery_id: int) -> None:
+    """Queue a background route warm-up once the current transaction commits."""
+    if not getattr(settings, "ROUTE_PRECOMPUTE_ENABLED", True):
+        return
+
+    def _submit():
+        try:
+            _executor().submit(_precompute_in_thread, delivery_id)
+        except RuntimeError as exc:  # interpreter shutting down
+            logger.debug("Route precompute not scheduled: %s", exc)
+
+    transaction.on_commit(_submit)
@@ -0,0 +1,134 @@
+"""Detect active deliveries whose driver has gone silent.
+
+One range query on the ``last_ping_at`` index finds active deliveries whose
+last fix falls in ``[now - lookback, now - stale_after)``; the lower bound
+keeps the scan proportional to recently-silent deliveries rather than to the
+whole table. Deliveries whose driver never sent a fix are measured from
+``assigned_at`` (``updated_at`` if unset) instead. Alerts are written in batch (one ``bulk_create`` of
+``DeliveryEvent`` rows and one ``vendor.event`` per vendor group per chunk).
+
+Which silences were already reported is kept in the cache, keyed by delivery
+and holding the silence start (``last_ping_at``) that was alerted on: a driver who comes back
+and then drops out again produces a new alert, repeated runs over the same
+silence do not.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core import metrics, realtime
+
+from . import vendor_live
+from .tracks import to_ms
+
+logger = logging.getLogger(__name__)
+
+STATE_PREFIX = "dlv:silent:v1:"
+
+
+def _state_key(delivery_id: int) -> str:
+    return f"{STATE_PREFIX}{int(delivery_id)}"
+
+
+def _publish(alerts_by_owner: dict[int, list[dict]]) -> None:
+    realtime.publish_many(
+        (
+            f"vendor.{owner_id}",
+            {"type": "vendor.event", "t": "delivery.stale", "deliveries": alerts},
+        )
+        for owner_id, alerts in alerts_by_owner.items()
+    )
+
+
+def _alert_chunk(rows: list[tuple], now) -> int:
+    """Alert for the rows not yet reported; return how many were new."""
+    DeliveryEvent = apps.get_model("orders", "DeliveryEvent")
+    keys = {pk: _state_key(pk) for pk, *_ in rows}
+    try:
+        seen = cache.get_many(list(keys.values()))
+    except Exception:  # pragma: no cover - cache outage
+        seen = {}
+    fresh = [r for r in rows if seen.get(keys[r[0]]) != to_ms(r[4])]
+    if not fresh:
+        return 0
+
+    events = []
+    by_owner: dict[int, list[dict]] = defaultdict(list)
+    owners = vendor_live.delivery_vendor_ids_many({pk: o for pk, o, *_ in fresh})
+    for pk, order_id, driver_id, status, silent_since, last_ping_at in fresh:
+        silent_s = int((now - silent_since).total_seconds())
+        note = {
+            "driver_id": driver_id,
+            "status": status,
+            "last_ping_at": last_ping_at and last_ping_at.isoformat(),
+            "silent_s": silent_s,
+        }
+        events.append(DeliveryEvent(delivery_id=pk, type="stale", note=note))
+        for owner_id in owners.get(pk, ()):
+            by_owner[owner_id].append({"id": pk, "order_id": order_id, **note})
+
+    DeliveryEvent.objects.bulk_create(events)
+    _publish(by_owner)
+    return len(fresh)
+
+
+def _remember(rows: list[tuple], ttl: int) -> None:
+    try:
+        cache.set_many({_state_key(r[0]): to_ms(r[4]) for r in rows}, timeout=ttl)
+    except Exception:  # pragma: no cover - cache outage
+        pass
+
+
+def detect_silent_deliveries(
+    *,
+    stale_after_minutes: int = 5,
+    lookback_minutes: int = 360,
+    chunk_size: int = 500,
+    now=None,
+) -> dict[str, int]:
+    """Emit one alert per newly silent active delivery; return counters."""
+    Delivery = apps.get_model("orders", "Delivery")
+    S = Delivery.Status
+    now = now or timezone.now()
+    upper = now - timedelta(minutes=stale_after_minutes)
+    lower = now - timedelta(minutes=max(lookback_minutes, stale_after_minutes))
+    rows_iter = (
+        Delivery.objects.annotate(
+            silent_since=Coalesce("last_ping_at", "assigned_at", "updated_at")
+        )
+        .filter(
+            Q(last_ping_at__gte=lower, last_ping_at__lt=upper)
+            # never pinged at all: silent since the assignment
+            | Q(
+                last_ping_at__isnull=True,
+                silent_since__gte=lower,
+                silent_since__lt=upper,
+            ),
+            status__in=[S.ASSIGNED, S.PICKED_UP, S.EN_ROUTE],
+        )
+        .order_by("silent_since", "pk")
+        .values_list(
+            "pk", "order_id", "driver_id", "status", "silent_since", "last_ping_at"
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+    # keep state until the silence has aged out of the scanned window
+    ttl = int((lookback_minutes + stale_after_minutes) * 60)
+    result = {"silent": 0, "alerted": 0, "chunks": 0}
+    while chunk := list(islice(rows_iter, chunk_size)):
+        result["chunks"] += 1
+        result["silent"] += len(chunk)
+        result["alerted"] += _alert_chunk(chunk, now)
+        _remember(chunk, ttl)
+    metrics.inc("delivery_silent_alerts", result["alerted"])
+    return result
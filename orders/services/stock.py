@@ -0,0 +1,84 @@
+"""Set-based stock allocation for paid orders.
+
+Both payment paths used to walk the order items and lock/decrement one
+``ProductStock`` row at a time, so two orders sharing products could take
+the row locks in opposite orders and deadlock, and every item cost its own
+round trips. :func:`allocate` instead:
+
+* locks every needed row in one ``SELECT ... FOR UPDATE ORDER BY id``, so
+  concurrent allocations always queue in the same order;
+* checks all quantities before touching anything (all or nothing) and
+  reports every short line at once;
+* applies the decrements with a single ``UPDATE ... SET quantity = CASE``.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from collections.abc import Iterable
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+
+from product_app.models import ProductStock
+
+
+class InsufficientStock(ValueError):
+    """Raised with ``short = {(product_id, warehouse_id): (available, needed)}``."""
+
+    def __init__(self, short: dict[tuple[int, int], tuple[int, int]]):
+        self.short = short
+        super().__init__("Insufficient stock")
+
+
+def allocate(lines: Iterable[tuple[int, int, int]]) -> dict[tuple[int, int], int]:
+    """Decrement stock for ``(product_id, warehouse_id, quantity)`` lines.
+
+    Lines for the same product and warehouse are summed. Returns the
+    remaining quantity per ``(product_id, warehouse_id)``; raises
+    :class:`InsufficientStock` and changes nothing if any line is short.
+    """
+    need: dict[tuple[int, int], int] = defaultdict(int)
+    for product_id, warehouse_id, qty in lines:
+        if qty > 0:
+            need[(product_id, warehouse_id)] += qty
+    if not need:
+        return {}
+
+    match = reduce(or_, (Q(product_id=p, warehouse_id=w) for p, w in need))
+    with transaction.atomic():
+        rows = {
+            (s.product_id, s.warehouse_id): s
+            for s in ProductStock.objects.select_for_update()
+            .filter(match)
+            .order_by("pk")
+            .only("pk", "product_id", "warehouse_id", "quantity")
+        }
+        short = {}
+        for pair, qty in need.items():
+            available = rows[pair].quantity if pair in rows else 0
+            if available < qty:
+                short[pair] = (available, qty)
+        if short:
+            raise InsufficientStock(short)
+
+        ProductStock.objects.filter(pk__in=[s.pk for s in rows.values()]).update(
+            quantity=Case(
+                *(
+                    When(pk=rows[pair].pk, then=F("quantity") - qty)
+                    for pair, qty in need.items()
+                ),
+                default=F("quantity"),
+                output_field=ProductStock._meta.get_field("quantity"),
+            )
+        )
+    return {pair: rows[pair].quantity - qty for pair, qty in need.items()}
+
+
+def allocate_order_items(items) -> dict[tuple[int, int], int]:
+    """:func:`allocate` the warehouse-assigned ``OrderItem`` rows of an order."""
+    return allocate(
+        (i.product_id, i.warehouse_id, i.quantity) for i in items if i.warehouse_id
+    )
@@ -0,0 +1,372 @@
+"""Compact storage for delivery breadcrumb trails.
+
+Finished deliveries have their ``DeliveryPing`` rows folded into a single
+``DeliveryTrack`` blob. Points are stored as three column-wise int32 arrays of
+deltas (latitude and longitude in microdegrees, time in milliseconds from the
+track start) and zlib-compressed; consecutive fixes differ by small amounts so
+a point costs a few bytes instead of a table row. Encoding and decoding run in
+C (``array`` + ``itertools.accumulate``) rather than per-row Python.
+"""
+
+from __future__ import annotations
+
+import bisect
+import logging
+import math
+import struct
+import sys
+import zlib
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from itertools import accumulate
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<BI")  # version, point count
+_SWAP = sys.byteorder != "little"
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_M_PER_E6_DEG = 0.111195  # metres per microdegree of latitude
+
+
+@dataclass
+class Track:
+    """Decoded trail: parallel lists of microdegrees and epoch milliseconds."""
+
+    lat_e6: list[int] = field(default_factory=list)
+    lng_e6: list[int] = field(default_factory=list)
+    t_ms: list[int] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.t_ms)
+
+    def extend(self, other: Track) -> None:
+        self.lat_e6.extend(other.lat_e6)
+        self.lng_e6.extend(other.lng_e6)
+        self.t_ms.extend(other.t_ms)
+
+    def since(self, since_ms: int | None) -> Track:
+        if since_ms is None:
+            return self
+        i = bisect.bisect_right(self.t_ms, since_ms)
+        return Track(self.lat_e6[i:], self.lng_e6[i:], self.t_ms[i:])
+
+    def tail(self, limit: int) -> Track:
+        if len(self) <= limit:
+            return self
+        return Track(self.lat_e6[-limit:], self.lng_e6[-limit:], self.t_ms[-limit:])
+
+    def coords(self) -> list[list[float]]:
+        return [[a / 1e6, b / 1e6] for a, b in zip(self.lat_e6, self.lng_e6)]
+
+
+def bucket(track: Track, seconds: float) -> Track:
+    """Keep the latest fix in each ``seconds``-wide time bucket."""
+    if seconds <= 0 or len(track) < 2:
+        return track
+    width = int(seconds * 1000)
+    keep = [
+        i
+        for i, (t, nxt) in enumerate(zip(track.t_ms, track.t_ms[1:]))
+        if t // width != nxt // width
+    ]
+    keep.append(len(track) - 1)
+    return _pick(track, keep)
+
+
+def simplify(track: Track, tolerance_m: float) -> Track:
+    """Douglas-Peucker: drop points within ``tolerance_m`` metres of the path.
+
+    Uses a local equirectangular projection, which is accurate to well under a
+    metre over the few kilometres a delivery covers.
+    """
+    n = len(track)
+    if tolerance_m <= 0 or n < 3:
+        return track
+    k = math.cos(math.radians(track.lat_e6[0] / 1e6))
+    xs = [v * _M_PER_E6_DEG * k for v in track.lng_e6]
+    ys = [v * _M_PER_E6_DEG for v in track.lat_e6]
+    tol2 = tolerance_m * tolerance_m
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        ax, ay, bx, by = xs[a], ys[a], xs[b], ys[b]
+        dx, dy = bx - ax, by - ay
+        seg2 = dx * dx + dy * dy
+        best, best_d2 = -1, tol2
+        for i in range(a + 1, b):
+            px, py = xs[i] - ax, ys[i] - ay
+            if seg2 == 0:
+                d2 = px * px + py * py
+            else:
+                u = max(0.0, min(1.0, (px * dx + py * dy) / seg2))
+                ex, ey = px - u * dx, py - u * dy
+                d2 = ex * ex + ey * ey
+            if d2 > best_d2:
+                best, best_d2 = i, d2
+        if best >= 0:
+            keep[best] = True
+            stack.append((a, best))
+            stack.append((best, b))
+    return _pick(track, [i for i in range(n) if keep[i]])
+
+
+def _pick(track: Track, idx: list[int]) -> Track:
+    return Track(
+        [track.lat_e6[i] for i in idx],
+        [track.lng_e6[i] for i in idx],
+        [track.t_ms[i] for i in idx],
+    )
+
+
+def to_ms(dt: datetime) -> int:
+    return (dt - _EPOCH) // timedelta(milliseconds=1)
+
+
+def from_ms(ms: int) -> datetime:
+    return _EPOCH + timedelta(milliseconds=ms)
+
+
+def _deltas(values: list[int]) -> array:
+    out = array("i", [b - a for a, b in zip([0, *values], values)])
+    if _SWAP:  # pragma: no cover - big-endian hosts
+        out.byteswap()
+    return out
+
+
+def _undelta(raw: bytes) -> list[int]:
+    col = array("i")
+    col.frombytes(raw)
+    if _SWAP:  # pragma: no cover - big-endian hosts
+        col.byteswap()
+    return list(accumulate(col))
+
+
+def encode(track: Track, started_ms: int) -> bytes:
+    """Pack a track whose timestamps are epoch ms, relative to ``started_ms``."""
+    n = len(track)
+    rel = [t - started_ms for t in track.t_ms]
+    body = b"".join(_deltas(col).tobytes() for col in (track.lat_e6, track.lng_e6, rel))
+    return _HEADER.pack(FORMAT_VERSION, n) + zlib.compress(body, 6)
+
+
+def decode(blob: bytes, started_ms: int) -> Track:
+    version, n = _HEADER.unpack_from(blob)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"unsupported track format {version}")
+    body = zlib.decompress(bytes(blob[_HEADER.size :]))
+    w = n * 4
+    lat, lng, rel = (_undelta(body[i * w : (i + 1) * w]) for i in range(3))
+    return Track(lat, lng, [t + started_ms for t in rel])
+
+
+def _ping_rows(delivery_id: int, *, since_ms: int | None = None, limit=None):
+    DeliveryPing = apps.get_model("orders", "DeliveryPing")
+    qs = DeliveryPing.objects.filter(delivery_id=delivery_id)
+    if since_ms is not None:
+        qs = qs.filter(created_at__gt=from_ms(since_ms))
+    if limit is None:
+        return list(
+            qs.order_by("created_at", "id").values_list(
+                "id", "lat", "lng", "created_at"
+            )
+        )
+    rows = list(
+        qs.order_by("-created_at", "-id").values_list("id", "lat", "lng", "created_at")[
+            :limit
+        ]
+    )
+    rows.reverse()
+    return rows
+
+
+def _track_from_rows(rows) -> Track:
+    return Track(
+        [int(round(lat * 1000000)) for _id, lat, _lng, _ts in rows],
+        [int(round(lng * 1000000)) for _id, _lat, lng, _ts in rows],
+        [to_ms(ts) for _id, _lat, _lng, ts in rows],
+    )
+
+
+def read_track(
+    delivery_id: int, *, since_ms: int | None = None, limit: int = 200
+) -> Track:
+    """Last ``limit`` points after ``since_ms``: compacted track, then raw pings."""
+    DeliveryTrack = apps.get_model("orders", "DeliveryTrack")
+    out = Track()
+    stored = (
+        DeliveryTrack.objects.filter(delivery_id=delivery_id)
+        .values_list("data", "started_at")
+        .first()
+    )
+    if stored is not None:
+        data, started_at = stored
+        out = decode(data, to_ms(started_at)).since(since_ms).tail(limit)
+    # Pings that arrived after compaction (e.g. a late buffer flush).
+    out.extend(
+        _track_from_rows(_ping_rows(delivery_id, since_ms=since_ms, limit=limit))
+    )
+    return out.tail(limit)
+
+
+def compact_delivery(delivery_id: int) -> int:
+    """Fold a delivery's pings into its DeliveryTrack; return points moved."""
+    DeliveryPing = apps.get_model("orders", "DeliveryPing")
+    DeliveryTrack = apps.get_model("orders", "DeliveryTrack")
+
+    with transaction.atomic():
+        rows = _ping_rows(delivery_id)
+        if not rows:
+            return 0
+        existing = (
+            DeliveryTrack.objects.select_for_update()
+            .filter(delivery_id=delivery_id)
+            .first()
+        )
+        track = Track()
+        if existing is not None:
+            track = decode(existing.data, to_ms(existing.started_at))
+        track.extend(_track_from_rows(rows))
+        track = _pick(track, sorted(range(len(track)), key=track.t_ms.__getitem__))
+        started_ms = track.t_ms[0]
+        DeliveryTrack.objects.update_or_create(
+            delivery_id=delivery_id,
+            defaults={
+                "data": encode(track, started_ms),
+                "points": len(track),
+                "started_at": from_ms(started_ms),
+                "ended_at": from_ms(track.t_ms[-1]),
+            },
+        )
+        DeliveryPing.objects.filter(
+            delivery_id=delivery_id, id__lte=max(r[0] for r in rows)
+        ).delete()
+    return len(rows)
+
+
+def compact_finished_deliveries(
+    *, batch_size: int = 200, grace_minutes: int = 10, max_batches: int | None = None
+) -> dict[str, int]:
+    """Compact delivered/cancelled deliveries that still have raw pings.
+
+    ``grace_minutes`` leaves recently finished deliveries alone so buffered
+    fixes have landed before the trail is sealed.
+    """
+    Delivery = apps.get_model("orders", "Delivery")
+    cutoff = timezone.now() - timedelta(minutes=grace_minutes)
+    qs = (
+        Delivery.objects.filter(
+            status__in=[Delivery.Status.DELIVERED, Delivery.Status.CANCELLED],
+            updated_at__lt=cutoff,
+            pings__isnull=False,
+        )
+        .values_list("pk", flat=True)
+        .distinct()
+        .order_by("pk")
+    )
+    deliveries = points = batches = 0
+    last_pk = 0
+    while max_batches is None or batches < max_batches:
+        ids = list(qs.filter(pk__gt=last_pk)[:batch_size])
+        if not ids:
+            break
+        batches += 1
+        for delivery_id in ids:
+            try:
+                moved = compact_delivery(delivery_id)
+            except Exception:
+                logger.exception("Track compaction failed for delivery %s", delivery_id)
+                metrics.inc("track_compact_failed")
+                continue
+            deliveries += 1
+            points += moved
+        last_pk = ids[-1]
+    metrics.inc("track_compact_points", points)
+    return {"deliveries": deliveries, "points": points, "batches": batches}
+
+
+def downsample_old_tracks(
+    *,
+    older_than_days: int,
+    tolerance_m: float,
+    bucket_seconds: float = 0,
+    batch_size: int = 200,
+    max_batches: int | None = None,
+) -> dict[str, int]:
+    """Retention: shrink trails of deliveries delivered over N days ago.
+
+    Remaining raw pings are compacted first, then each track is bucketed and
+    simplified once (``DeliveryTrack.tolerance_m`` records that it was).
+    Works in keyset-paged batches of ``batch_size`` deliveries.
+    """
+    Delivery = apps.get_model("orders", "Delivery")
+    DeliveryTrack = apps.get_model("orders", "DeliveryTrack")
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    candidates = (
+        Delivery.objects.filter(
+            status=Delivery.Status.DELIVERED, delivered_at__lt=cutoff
+        )
+        .filter(
+            Q(pings__isnull=False)
+            | Q(track__isnull=False, track__tolerance_m__isnull=True)
+        )
+        .values_list("pk", flat=True)
+        .distinct()
+        .order_by("pk")
+    )
+    deliveries = before = after = batches = 0
+    last_pk = 0
+    while max_batches is None or batches < max_batches:
+        ids = list(candidates.filter(pk__gt=last_pk)[:batch_size])
+        if not ids:
+            break
+        batches += 1
+        last_pk = ids[-1]
+        for delivery_id in ids:
+            try:
+                compact_delivery(delivery_id)
+                with transaction.atomic():
+                    row = (
+                        DeliveryTrack.objects.select_for_update()
+                        .filter(delivery_id=delivery_id)
+                        .first()
+                    )
+                    if row is None:
+                        continue
+                    track = decode(row.data, to_ms(row.started_at))
+                    slim = simplify(bucket(track, bucket_seconds), tolerance_m)
+                    row.data = encode(slim, to_ms(row.started_at))
+                    row.points = len(slim)
+                    row.tolerance_m = tolerance_m
+                    row.save(
+                        update_fields=["data", "points", "tolerance_m", "updated_at"]
+                    )
+            except Exception:
+                logger.exception(
+                    "Track downsampling failed for delivery %s", delivery_id
+                )
+                metrics.inc("track_downsample_failed")
+                continue
+            deliveries += 1
+            before += len(track)
+            after += len(slim)
+    metrics.inc("track_downsample_points_removed", before - after)
+    return {
+        "deliveries": deliveries,
+        "points_before": before,
+        "points_after": after,
+        "batches": batches,
+    }
@@ -0,0 +1,235 @@
+"""Bulk delivery state transitions.
+
+The single-row ``Delivery.mark_*`` methods each open a transaction, save one
+row and broadcast from ``post_save``. For a batch (a van of parcels leaving
+the warehouse) this module validates the same state machine for every
+delivery and applies it set-wise:
+
+* the targeted rows are locked once, in primary-key order;
+* one ``UPDATE ... WHERE pk IN (...) AND status IN (...)`` per target state,
+  with timestamps kept through ``COALESCE`` like the ``mark_*`` methods do;
+* one ``bulk_create`` of ``DeliveryEvent`` rows;
+* every status and vendor-board message is queued with ``core.realtime``
+  and sent after commit, in one batch.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core import metrics, realtime
+
+from . import vendor_live
+
+logger = logging.getLogger(__name__)
+
+# target status -> statuses it may be entered from (mirrors Delivery.mark_*)
+TRANSITIONS: dict[str, frozenset[str]] = {
+    "assigned": frozenset({"pending", "assigned"}),
+    "picked_up": frozenset({"assigned"}),
+    "en_route": frozenset({"assigned", "picked_up"}),
+    "delivered": frozenset({"picked_up", "en_route"}),
+}
+
+EVENT_TYPES = {
+    "assigned": "assign",
+    "picked_up": "picked",
+    "en_route": "en_route",
+    "delivered": "delivered",
+}
+
+# timestamps set on entry when still empty
+_STAMPS = {
+    "assigned": ("assigned_at",),
+    "picked_up": ("picked_up_at",),
+    "en_route": ("picked_up_at",),
+    "delivered": ("picked_up_at", "delivered_at"),
+}
+
+
+@dataclass
+class TransitionResult:
+    updated: list[int] = field(default_factory=list)
+    unchanged: list[int] = field(default_factory=list)
+    rejected: dict[int, str] = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        return {
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "rejected": {str(k): v for k, v in self.rejected.items()},
+        }
+
+
+def status_message(d) -> dict:
+    """Payload sent to ``delivery.<id>`` when a delivery changes state."""
+    return {
+        "type": "status.update",
+        "id": d.pk,
+        "status": d.status,
+        # Lets connected consumers refresh their cached driver role.
+        "driver_id": d.driver_id,
+        "assigned_at": d.assigned_at and d.assigned_at.isoformat(),
+        "picked_up_at": d.picked_up_at and d.picked_up_at.isoformat(),
+        "delivered_at": d.delivered_at and d.delivered_at.isoformat(),
+    }
+
+
+def _validate(changes, rows, driver_for) -> tuple[dict, TransitionResult]:
+    """Split the requested ``{pk: target}`` into applicable groups per target."""
+    result = TransitionResult()
+    plan: dict[str, list] = defaultdict(list)
+    for pk, target in sorted(changes.items()):
+        d = rows.get(pk)
+        if target is None:
+            result.rejected[pk] = "conflicting target statuses"
+        elif d is None:
+            result.rejected[pk] = "not found"
+        elif d.status == target and (
+            target != "assigned" or d.driver_id == driver_for(pk)
+        ):
+            result.unchanged.append(pk)
+        elif d.status in TRANSITIONS[target]:
+            plan[target].append(d)
+        else:
+            result.rejected[pk] = f"cannot go from {d.status} to {target}"
+    return plan, result
+
+
+def _update(Delivery, target: str, rows: list, driver_for, when) -> None:
+    values = {"status": target, "updated_at": when}
+    values.update({f: Coalesce(f, Value(when)) for f in _STAMPS[target]})
+    if target == "assigned":
+        drivers = {d.pk: driver_for(d.pk) for d in rows}
+        if len(set(drivers.values())) == 1:
+            values["driver_id"] = next(iter(drivers.values()))
+        else:
+            values["driver_id"] = Case(
+                *(When(pk=pk, then=Value(v)) for pk, v in drivers.items()),
+                output_field=Delivery._meta.get_field("driver").target_field,
+            )
+    n = Delivery.objects.filter(
+        pk__in=[d.pk for d in rows], status__in=TRANSITIONS[target]
+    ).update(**values)
+    if n != len(rows):  # pragma: no cover - rows are locked
+        raise RuntimeError(f"Bulk {target} touched {n} of {len(rows)} rows")
+    # mirror the UPDATE on the locked instances for events and broadcasts
+    for d in rows:
+        d._from_status = d.status
+        d.status = target
+        d.updated_at = when
+        for f in _STAMPS[target]:
+            if getattr(d, f) is None:
+                setattr(d, f, when)
+        if target == "assigned":
+            d.driver_id = driver_for(d.pk)
+
+
+def bulk_transition(
+    changes,
+    *,
+    actor=None,
+    driver_id: int | None = None,
+    drivers: Mapping[int, int] | None = None,
+    notes: Mapping[int, dict] | None = None,
+    when=None,
+    queryset=None,
+    all_or_nothing: bool = False,
+) -> TransitionResult:
+    """Move many deliveries to their target states in one transaction.
+
+    ``changes`` is an iterable of ``(delivery_id, target_status)``. Deliveries
+    outside ``queryset`` (default: all) are rejected as not found, as are
+    transitions the state machine forbids; already-applied ones are reported
+    as unchanged. Deliveries moving to ``assigned`` get ``drivers[pk]``, else
+    ``driver_id``; one of them is required. ``notes`` adds per-delivery keys
+    to the ``DeliveryEvent`` note. With ``all_or_nothing`` a single rejection
+    leaves every row untouched.
+    """
+    Delivery = apps.get_model("orders", "Delivery")
+    DeliveryEvent = apps.get_model("orders", "DeliveryEvent")
+    wanted: dict[int, str | None] = {}
+    for pk, target in changes:
+        if target not in TRANSITIONS:
+            raise ValueError(f"Unsupported target status: {target}")
+        pk = int(pk)
+        wanted[pk] = target if wanted.get(pk, target) == target else None
+    drivers = drivers or {}
+    notes = notes or {}
+
+    def driver_for(pk: int) -> int | None:
+        return drivers.get(pk, driver_id)
+
+    if any(t == "assigned" and driver_for(pk) is None for pk, t in wanted.items()):
+        raise ValueError("driver_id is required to assign deliveries")
+    when = when or timezone.now()
+
+    with transaction.atomic():
+        scope = Delivery.objects.all() if queryset is None else queryset
+        # resolve scope first: row locks and joins/DISTINCT do not mix
+        allowed = list(scope.filter(pk__in=wanted).values_list("pk", flat=True))
+        rows = {
+            d.pk: d
+            for d in Delivery.objects.select_for_update()
+            .filter(pk__in=allowed)
+            .order_by("pk")
+        }
+        plan, result = _validate(wanted, rows, driver_for)
+        if all_or_nothing and result.rejected:
+            return result
+
+        changed = []
+        for target, group in plan.items():
+            _update(Delivery, target, group, driver_for, when)
+            changed.extend(group)
+            metrics.inc("delivery_bulk_transitions", len(group), status=target)
+        DeliveryEvent.objects.bulk_create(
+            [
+                DeliveryEvent(
+                    delivery_id=d.pk,
+                    actor=actor,
+                    type=EVENT_TYPES[d.status],
+                    note={
+                        "from": d._from_status,
+                        "driver_id": d.driver_id,
+                        "bulk": True,
+                        **notes.get(d.pk, {}),
+                    },
+                )
+                for d in changed
+            ]
+        )
+        if changed:
+            publish_transitions(changed)
+        if plan.get("assigned"):
+            from .routes import schedule_route_precompute
+
+            for d in plan["assigned"]:
+                schedule_route_precompute(d.pk)
+
+    result.updated = sorted(d.pk for d in changed)
+    return result
+
+
+def publish_transitions(rows) -> None:
+    """Queue status and vendor-board updates for ``rows`` as one batch."""
+    try:
+        owners = vendor_live.delivery_vendor_ids_many({d.pk: d.order_id for d in rows})
+    except Exception as exc:  # pragma: no cover - cache/DB outage
+        logger.warning("Vendor lookup for bulk broadcast failed: %s", exc)
+        owners = {}
+    messages = []
+    for d in rows:
+        messages.append((d.ws_group, status_message(d)))
+        board = {"type": "vendor.delivery", "delivery": vendor_live.delivery_row(d)}
+        messages.extend((f"vendor.{o}", board) for o in owners.get(d.pk, ()))
+    realtime.publish_many(messages)
@@ -0,0 +1,182 @@
+"""Vendor live board: snapshots and push diffs for ``vendor.<owner_id>`` groups.
+
+Which vendors care about a delivery is decided by the owners of the products
+on its order. That join is computed once per delivery and kept in the cache
+(``delivery_vendor_ids``), so per-event routing is a cache read rather than a
+``DISTINCT`` over ``order__items__product__owner``.
+"""
+
+from __future__ import annotations
+
+import logging
+
+from channels.db import database_sync_to_async
+from django.apps import apps
+from django.core.cache import cache
+
+from core import realtime
+from product_app.utils import get_vendor_field
+
+logger = logging.getLogger(__name__)
+
+MAP_PREFIX = "dlv:vendors:v1:"
+MAP_TTL = 7 * 24 * 60 * 60
+SNAPSHOT_LIMIT = 300
+
+
+def _map_key(delivery_id: int) -> str:
+    return f"{MAP_PREFIX}{int(delivery_id)}"
+
+
+def _vendor_fk() -> str:
+    Product = apps.get_model("product_app", "Product")
+    return f"product__{get_vendor_field(Product)}_id"
+
+
+def delivery_row(d) -> dict:
+    """Wire shape shared by the REST API, the snapshot and the diffs."""
+    return {
+        "id": d.id,
+        "order_id": d.order_id,
+        "driver_id": d.driver_id,
+        "status": d.status,
+        "assigned_at": d.assigned_at and d.assigned_at.isoformat(),
+        "picked_up_at": d.picked_up_at and d.picked_up_at.isoformat(),
+        "delivered_at": d.delivered_at and d.delivered_at.isoformat(),
+        "last_lat": float(d.last_lat) if d.last_lat is not None else None,
+        "last_lng": float(d.last_lng) if d.last_lng is not None else None,
+        "last_ping_at": d.last_ping_at and d.last_ping_at.isoformat(),
+    }
+
+
+def vendor_deliveries(owner_id: int, limit: int = SNAPSHOT_LIMIT) -> list[dict]:
+    """Most recently updated deliveries containing the owner's products."""
+    Delivery = apps.get_model("orders", "Delivery")
+    qs = (
+        Delivery.objects.filter(**{f"order__items__{_vendor_fk()}": owner_id})
+        .distinct()
+        .order_by("-updated_at")
+    )
+    return [delivery_row(d) for d in qs[:limit]]
+
+
+def delivery_vendor_ids(delivery_id: int, order_id: int | None = None) -> list[int]:
+    """Vendor owner ids for a delivery, computed once and cached."""
+    key = _map_key(delivery_id)
+    ids = cache.get(key)
+    if ids is not None:
+        return ids
+    OrderItem = apps.get_model("orders", "OrderItem")
+    if order_id is None:
+        Delivery = apps.get_model("orders", "Delivery")
+        order_id = (
+            Delivery.objects.filter(pk=delivery_id)
+            .values_list("order_id", flat=True)
+            .first()
+        )
+    fk = _vendor_fk()
+    ids = sorted(
+        {
+            v
+            for v in OrderItem.objects.filter(order_id=order_id)
+            .values_list(fk, flat=True)
+            .distinct()
+            if v is not None
+        }
+    )
+    cache.set(key, ids, timeout=MAP_TTL)
+    return ids
+
+
+def delivery_vendor_ids_many(order_ids: dict[int, int]) -> dict[int, list[int]]:
+    """Batch form of :func:`delivery_vendor_ids` for ``{delivery_id: order_id}``.
+
+    One ``get_many`` for the cached mappings and one query for the misses.
+    """
+    keys = {pk: _map_key(pk) for pk in order_ids}
+    cached = cache.get_many(list(keys.values()))
+    out = {pk: cached[k] for pk, k in keys.items() if k in cached}
+    missing = {pk: oid for pk, oid in order_ids.items() if pk not in out}
+    if missing:
+        OrderItem = apps.get_model("orders", "OrderItem")
+        by_order: dict[int, set[int]] = {oid: set() for oid in missing.values()}
+        for oid, v in (
+            OrderItem.objects.filter(order_id__in=by_order)
+            .values_list("order_id", _vendor_fk())
+            .distinct()
+        ):
+            if v is not None:
+                by_order[oid].add(v)
+        fill = {pk: sorted(by_order[oid]) for pk, oid in missing.items()}
+        cache.set_many({keys[pk]: ids for pk, ids in fill.items()}, timeout=MAP_TTL)
+        out.update(fill)
+    return out
+
+
+def forget_order_vendors(order_id: int) -> None:
+    """Drop cached mappings for an order's deliveries (items changed)."""
+    Delivery = apps.get_model("orders", "Delivery")
+    ids = Delivery.objects.filter(order_id=order_id).values_list("pk", flat=True)
+    cache.delete_many([_map_key(pk) for pk in ids])
+
+
+def publish_delivery(d) -> None:
+    """Queue the current row of ``d`` for every vendor group that shows it."""
+    owners = delivery_vendor_ids(d.pk, d.order_id)
+    if not owners:
+        return
+    message = {"type": "vendor.delivery", "delivery": delivery_row(d)}
+    realtime.publish_many((f"vendor.{owner_id}", message) for owner_id in owners)
+
+
+def publish_deliveries(rows) -> None:
+    """Batch form of :func:`publish_delivery` (one mapping lookup for all rows)."""
+    rows = list(rows)
+    owners = delivery_vendor_ids_many({d.pk: d.order_id for d in rows})
+    realtime.publish_many(
+        (f"vendor.{owner_id}", {"type": "vendor.delivery", "delivery": delivery_row(d)})
+        for d in rows
+        for owner_id in owners.get(d.pk, ())
+    )
+
+
+def position_message(delivery_id: int, lat: float, lng: float, ts: int) -> dict:
+    return {
+        "type": "vendor.position",
+        "id": delivery_id,
+        "lat": lat,
+        "lng": lng,
+        "ts": ts,
+    }
+
+
+def publish_positions(positions: dict[int, tuple[float, float, int]]) -> None:
+    """Queue ``{delivery_id: (lat, lng, ts_ms)}`` for the vendor groups.
+
+    Sync counterpart of :func:`apublish_position` for batch uploads.
+    """
+    if not positions:
+        return
+    Delivery = apps.get_model("orders", "Delivery")
+    order_ids = dict(
+        Delivery.objects.filter(pk__in=positions).values_list("pk", "order_id")
+    )
+    owners = delivery_vendor_ids_many(order_ids)
+    realtime.publish_many(
+        (f"vendor.{owner_id}", position_message(pk, *positions[pk]))
+        for pk in order_ids
+        for owner_id in owners.get(pk, ())
+    )
+
+
+async def apublish_position(
+    channel_layer, delivery_id: int, lat: float, lng: float, ts: int
+) -> None:
+    """Forward a (coalesced) live position to the delivery's vendor groups."""
+    key = _map_key(delivery_id)
+    owners = await cache.aget(key)
+    if owners is None:
+        owners = await database_sync_to_async(delivery_vendor_ids)(delivery_id)
+    message = position_message(delivery_id, lat, lng, ts)
+    for owner_id in owners:
+        await channel_layer.group_send(f"vendor.{owner_id}", message)
@@ -0,0 +1,373 @@
+"""Two-stage payment webhook pipeline.
+
+Gateway webhooks used to do all the work (row locks, stock allocation,
+duplicate-refund checks, emails) before answering, so bursts pushed latency
+past the gateway timeout and the retries piled on more load. Views now only
+verify the request and call :func:`ingest`, which stores the raw body as a
+``PaymentEvent`` (deduplicated by its SHA-256) and acks. After commit the
+``(provider, reference)`` is handed to ``orders.tasks.process_payment_events``:
+
+* events of one reference are processed strictly in arrival order; only the
+  oldest unprocessed event is ever locked, so concurrent workers never
+  overtake each other;
+* a failing handler is rolled back to its savepoint and the event retried
+  with exponential backoff, blocking later events of the same reference;
+* after ``WEBHOOK_MAX_ATTEMPTS`` the event is parked as ``dead`` and the
+  queue moves on. ``orders.tasks.retry_payment_events`` sweeps due retries
+  and anything whose enqueue was lost.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+from collections import Counter
+from datetime import timedelta
+from functools import partial
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core import metrics
+from notifications import outbox
+from payments.gateways import maybe_refund_duplicate_success
+from payments.notify import emit_once, send_payment_email, send_refund_email
+
+from ..models import Order, PaymentEvent, Transaction
+from . import assign_warehouses_and_update_stock
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF_SECONDS = 60 * 60
+# a fresh event is left to its own enqueued task for this long
+SWEEP_GRACE = timedelta(seconds=60)
+
+HANDLERS = {}
+
+
+def handler(provider: str):
+    def register(fn):
+        HANDLERS[provider] = fn
+        return fn
+
+    return register
+
+
+def ingest(provider: str, reference: str, raw: bytes, body) -> tuple:
+    """Persist a verified webhook and queue its reference for processing.
+
+    Returns ``(event, created)``; a replayed body returns the stored event
+    with ``created=False`` and queues nothing.
+    """
+    sha = hashlib.sha256(raw).hexdigest().lower()
+    pe, created = PaymentEvent.objects.get_or_create(
+        body_sha256=sha,
+        defaults={"provider": provider, "reference": reference, "body": body},
+    )
+    metrics.inc("payment_events_received", provider=provider, created=created)
+    if created:
+        transaction.on_commit(partial(enqueue, provider, reference))
+    return pe, created
+
+
+def enqueue(provider: str, reference: str) -> None:
+    """Hand a reference to the worker pool (in-process if that fails)."""
+    if not getattr(settings, "WEBHOOK_PROCESS_INLINE", False):
+        from orders.tasks import process_payment_events
+
+        try:
+            process_payment_events.delay(provider, reference)
+            return
+        except Exception as exc:  # broker unreachable
+            logger.warning("payments.webhook.enqueue_failed: %s", exc)
+    process_reference(provider, reference)
+
+
+def _backoff(attempts: int) -> timedelta:
+    base = float(getattr(settings, "WEBHOOK_RETRY_BACKOFF_SECONDS", 30))
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS))
+
+
+def _fail(pe: PaymentEvent, exc: Exception, now) -> str:
+    pe.attempts += 1
+    pe.last_error = f"{type(exc).__name__}: {exc}"[:2000]
+    if pe.attempts >= int(getattr(settings, "WEBHOOK_MAX_ATTEMPTS", 8)):
+        pe.status = PaymentEvent.Status.DEAD
+        pe.next_attempt_at = None
+        outcome = "dead"
+        logger.error(
+            "payments.webhook.dead_letter provider=%s reference=%s event=%s: %s",
+            pe.provider,
+            pe.reference,
+            pe.pk,
+            pe.last_error,
+        )
+    else:
+        pe.next_attempt_at = now + _backoff(pe.attempts)
+        outcome = "retry"
+        logger.warning(
+            "payments.webhook.retry provider=%s reference=%s attempt=%s: %s",
+            pe.provider,
+            pe.reference,
+            pe.attempts,
+            pe.last_error,
+        )
+    pe.save(update_fields=["attempts", "last_error", "status", "next_attempt_at"])
+    return outcome
+
+
+def process_reference(provider: str, reference: str, *, now=None) -> dict:
+    """Process the pending events of one reference, oldest first.
+
+    Stops at an event waiting for its retry, or when another worker holds
+    the head of the queue. Returns a count per outcome.
+    """
+    counts: Counter = Counter()
+    pending = PaymentEvent.objects.filter(
+        provider=provider, reference=reference, status=PaymentEvent.Status.RECEIVED
+    )
+    while True:
+        current = now or timezone.now()
+        with transaction.atomic():
+            head = pending.order_by("id").values_list("pk", "next_attempt_at").first()
+            if head is None:
+                break
+            pk, not_before = head
+            if not_before and not_before > current:
+                counts["waiting"] += 1
+                break
+            pe = (
+                PaymentEvent.objects.select_for_update(skip_locked=True)
+                .filter(pk=pk, status=PaymentEvent.Status.RECEIVED)
+                .first()
+            )
+            if pe is None:  # another worker owns this reference
+                counts["busy"] += 1
+                break
+            fn = HANDLERS.get(provider)
+            try:
+                if fn is None:
+                    raise LookupError(f"No webhook handler for {provider}")
+                with transaction.atomic():
+                    fn(pe)
+            except Exception as exc:
+                outcome = _fail(pe, exc, current)
+            else:
+                pe.status = PaymentEvent.Status.PROCESSED
+                pe.processed_at = current
+                pe.next_attempt_at = None
+                pe.save(update_fields=["status", "processed_at", "next_attempt_at"])
+                outcome = "processed"
+        counts[outcome] += 1
+        metrics.inc("payment_events", provider=provider, outcome=outcome)
+        if outcome == "retry":
+            break
+    return dict(counts)
+
+
+def due_references(*, limit: int = 200, now=None) -> list[tuple[str, str]]:
+    """``(provider, reference)`` pairs with an event ready to (re)process."""
+    now = now or timezone.now()
+    return list(
+        PaymentEvent.objects.filter(status=PaymentEvent.Status.RECEIVED)
+        .filter(
+            Q(next_attempt_at__lte=now)
+            | Q(next_attempt_at__isnull=True, received_at__lt=now - SWEEP_GRACE)
+        )
+        .order_by("provider", "reference")
+        .values_list("provider", "reference")
+        .distinct()[:limit]
+    )
+
+
+# ---- Handlers ----
+_TX_FIELDS = ["callback_received", "status", "email", "raw_event", "processed_at"]
+_PAYSTACK_STATUS = {
+    "charge.success": "success",
+    "charge.failed": "failed",
+    "charge.cancelled": "cancelled",
+}
+
+
+@handler("paystack")
+def handle_paystack(pe: PaymentEvent) -> None:
+    event = pe.body
+    data = event.get("data", {}) or {}
+    event_type = event.get("event")
+    order_id = (data.get("metadata") or {}).get("order_id")
+    customer_email = (data.get("customer") or {}).get("email")
+
+    try:
+        tx = Transaction.objects.select_for_update().get(reference=pe.reference)
+    except Transaction.DoesNotExist:
+        logger.error(f"[Webhook] Unknown transaction: {pe.reference}")
+        return
+    if tx.callback_received:
+        return
+
+    tx.callback_received = True
+    tx.raw_event = event
+    tx.processed_at = timezone.now()
+    tx.body_sha256 = pe.body_sha256
+    if customer_email and not getattr(tx, "email", None):
+        tx.email = customer_email
+
+    order = None
+    if order_id:
+        try:
+            order = Order.objects.select_for_update().get(id=order_id)
+        except Order.DoesNotExist:
+            order = None
+
+    status = _PAYSTACK_STATUS.get(event_type, "pending")
+    tx.status = status
+    fields = [*_TX_FIELDS, "body_sha256"]
+    if status == "success":
+        tx.verified = True
+        fields.append("verified")
+    tx.save(update_fields=fields)
+    if status == "pending":
+        return
+
+    if order:
+        order.payment_status = status
+        if status == "success":
+            order.paid = True
+            order.save(update_fields=["paid", "payment_status"])
+            assign_warehouses_and_update_stock(order)
+        else:
+            order.save(update_fields=["payment_status"])
+
+    email = tx.email
+    if email:
+        label = "received" if status == "success" else status
+        emit_once(
+            event_key=f"payment_{status}:{tx.reference}",
+            user=getattr(tx, "user", None),
+            channel="email",
+            payload={"order_id": order_id, "amount": str(tx.amount)},
+            send_fn=partial(
+                send_payment_email, email, order_id, tx.amount, tx.reference, label
+            ),
+        )
+
+    if status == "success" and order_id:
+        refunded_refs = maybe_refund_duplicate_success(tx)
+        if refunded_refs and email:
+            for ref in refunded_refs:
+                emit_once(
+                    event_key=f"refund_completed:{ref}",
+                    user=getattr(tx, "user", None),
+                    channel="email",
+                    payload={"order_id": order_id, "amount": str(tx.amount)},
+                    send_fn=partial(
+                        send_refund_email, email, order_id, tx.amount, ref, "completed"
+                    ),
+                )
+
+
+@handler("stripe")
+def handle_stripe(pe: PaymentEvent) -> None:
+    event = pe.body
+    event_type = event.get("type")
+    if event_type == "checkout.session.completed":
+        session = (event.get("data") or {}).get("object") or {}
+        order_id = (session.get("metadata") or {}).get("order_id")
+        if order_id:
+            try:
+                order = Order.objects.select_for_update().get(id=order_id)
+            except Order.DoesNotExist:
+                return
+            order.payment_status = "paid"
+            order.paid = True
+            order.payment_intent_id = session.get("payment_intent")
+            order.save(update_fields=["payment_status", "paid", "payment_intent_id"])
+    elif event_type == "payment_intent.payment_failed":
+        logger.warning("Stripe payment failed")
+    elif event_type == "charge.refunded":
+        logger.info("Stripe refund processed")
+
+
+@handler("paypal")
+def handle_paypal(pe: PaymentEvent) -> None:
+    event = pe.body
+    if event.get("event_type") != "PAYMENT.CAPTURE.COMPLETED":
+        return
+    resource = event.get("resource", {}) or {}
+    invoice = resource.get("invoice_id")
+    Transaction.objects.filter(reference=resource.get("id")).update(status="success")
+    if invoice:
+        try:
+            order = Order.objects.select_for_update().get(id=invoice)
+        except Order.DoesNotExist:
+            return
+        order.paid = True
+        order.payment_status = "paid"
+        order.save(update_fields=["paid", "payment_status"])
+
+
+@handler("mpesa")
+def handle_mpesa(pe: PaymentEvent) -> None:
+    Payment = apps.get_model("Mpesa", "Payment")
+    data = (pe.body.get("Body") or {}).get("stkCallback") or {}
+    result_code = data.get("ResultCode", -1)
+    if result_code != 0:
+        logger.info("STK Push failed with ResultCode=%s", result_code)
+        return
+
+    merchant_request_id = data.get("MerchantRequestID")
+    checkout_request_id = data.get("CheckoutRequestID")
+    mpesa_receipt = next(
+        (
+            item["Value"]
+            for item in (data.get("CallbackMetadata") or {}).get("Item", [])
+            if item.get("Name") == "MpesaReceiptNumber"
+        ),
+        "",
+    )
+    try:
+        payment = Payment.objects.select_for_update().get(
+            merchant_request_id=merchant_request_id,
+            checkout_request_id=checkout_request_id,
+        )
+    except Payment.DoesNotExist:
+        logger.error(
+            "Payment not found for MerchantRequestID=%s, CheckoutRequestID=%s",
+            merchant_request_id,
+            checkout_request_id,
+        )
+        return
+
+    payment.code = mpesa_receipt
+    payment.status = "COMPLETED"
+    payment.save()
+    Transaction.objects.filter(reference=checkout_request_id).update(status="success")
+    order = payment.order
+    order.paid = True
+    order.save()
+
+    # sent after commit, so a mail failure can't roll back the payment
+    user = order.user
+    emit_once(
+        event_key=f"mpesa_paid:{checkout_request_id}",
+        user=user,
+        channel="email",
+        payload={"order_id": order.id, "amount": str(payment.amount)},
+        send_fn=partial(
+            outbox.enqueue,
+            user.email,
+            "Your Order Payment Was Successful",
+            (
+                f"Hi {user.username},\n\n"
+                f"We've received your payment for Order #{order.id}.\n"
+                f"Amount paid: KES {payment.amount}\n"
+                f"Transaction code: {mpesa_receipt}\n\n"
+                f"Your order is being processed and we'll update you on its status.\n\n"
+                f"Thank you for shopping with us!\n\n"
+                f"- The Rahim Online Clothing Store Team"
+            ),
+        ),
+    )
@@ -1,16 +1,21 @@
 import logging
 
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
+from core import realtime
+
 from .assignment import pick_warehouse
 from .models import Delivery, Order, OrderItem
+from .services import vendor_live
 from .services.destinations import ensure_order_coords
+from .services.transitions import status_message
 
 logger = logging.getLogger(__name__)
 
+# OrderItem fields that decide which vendor boards show a delivery
+_ROUTING_FIELDS = {"product", "product_id", "order", "order_id"}
+
 
 @receiver(post_save, sender=OrderItem)
 def assign_warehouse_on_create(sender, instance, created, **kwargs):
@@ -23,6 +28,37 @@ def assign_warehouse_on_create(sender, instance, created, **kwargs):
         instance.save(update_fields=["warehouse"])
 
 
+@receiver(pre_save, sender=OrderItem)
+def stash_old_item_routing(sender, instance, update_fields=None, **kwargs):
+    """Remember the stored (product, order) when a save may change them."""
+    instance._old_routing = None
+    if instance.pk is None:
+        return
+    if update_fields is not None and not _ROUTING_FIELDS & set(update_fields):
+        return
+    instance._old_routing = (
+        OrderItem.objects.filter(pk=instance.pk)
+        .values_list("product_id", "order_id")
+        .first()
+    )
+
+
+@receiver(post_save, sender=OrderItem)
+def forget_vendor_mapping_on_item_change(sender, instance, created, **kwargs):
+    old = getattr(instance, "_old_routing", None)
+    if created:
+        vendor_live.forget_order_vendors(instance.order_id)
+    elif old and old != (instance.product_id, instance.order_id):
+        vendor_live.forget_order_vendors(instance.order_id)
+        if old[1] != instance.order_id:
+            vendor_live.forget_order_vendors(old[1])
+
+
+@receiver(post_delete, sender=OrderItem)
+def forget_vendor_mapping_on_item_delete(sender, instance, **kwargs):
+    vendor_live.forget_order_vendors(instance.order_id)
+
+
 @receiver(post_save, sender=Order)
 def geocode_order_on_save(sender, instance, created, **kwargs):
     if instance.latitude is not None and instance.longitude is not None:
@@ -41,17 +77,15 @@ def broadcast_delivery_update(
 ):  # pragma: no cover - IO
     """Broadcast delivery status updates to its WS group with stable payload."""
     try:
-        layer = get_channel_layer()
-        if not layer:
-            return
-        payload = {
-            "type": "status.update",
-            "id": instance.pk,
-            "status": instance.status,
-            "assigned_at": instance.assigned_at and instance.assigned_at.isoformat(),
-            "picked_up_at": instance.picked_up_at and instance.picked_up_at.isoformat(),
-            "delivered_at": instance.delivered_at and instance.delivered_at.isoformat(),
-        }
-        async_to_sync(layer.group_send)(instance.ws_group, payload)
+        realtime.publish(instance.ws_group, status_message(instance))
     except Exception as exc:
         logger.warning("Delivery broadcast failed: %s", exc)
+
+
+@receiver(post_save, sender=Delivery)
+def push_delivery_to_vendors(sender, instance: Delivery, **kwargs):
+    """Send the changed row to the vendor live boards showing this delivery."""
+    try:
+        vendor_live.publish_delivery(instance)
+    except Exception as exc:
+        logger.warning("Vendor delivery push failed: %s", exc)
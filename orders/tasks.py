@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import logging
+
+from celery import shared_task
+from django.conf import settings
+
+from . import dispatch
+from .services import webhooks
+from .services.stale_deliveries import detect_silent_deliveries
+from .services.tracks import compact_finished_deliveries, downsample_old_tracks
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def compact_delivery_tracks() -> dict[str, int]:
+    result = compact_finished_deliveries(
+        batch_size=int(getattr(settings, "TRACK_COMPACT_BATCH_SIZE", 200)),
+        grace_minutes=int(getattr(settings, "TRACK_COMPACT_GRACE_MINUTES", 10)),
+    )
+    logger.info("tracks.compacted", extra=result)
+    return result
+
+
+@shared_task
+def downsample_delivery_tracks() -> dict[str, int]:
+    result = downsample_old_tracks(
+        older_than_days=int(getattr(settings, "TRACK_RETENTION_DAYS", 30)),
+        tolerance_m=float(getattr(settings, "TRACK_RETENTION_TOLERANCE_M", 10.0)),
+        bucket_seconds=float(getattr(settings, "TRACK_RETENTION_BUCKET_SECONDS", 0)),
+        batch_size=int(getattr(settings, "TRACK_COMPACT_BATCH_SIZE", 200)),
+    )
+    logger.info("tracks.downsampled", extra=result)
+    return result
+
+
+@shared_task
+def auto_dispatch_deliveries() -> dict:
+    if not getattr(settings, "DISPATCH_ENABLED", False):
+        return {"skipped": True}
+    result = dispatch.dispatch()
+    summary = {
+        "pending": result.pending,
+        "idle_drivers": result.idle_drivers,
+        "assigned": len(result.assigned),
+        "total_km": result.total_km,
+        "solver": result.solver,
+        "seconds": round(result.seconds, 3),
+    }
+    logger.info("dispatch.run", extra=summary)
+    return summary
+
+
+@shared_task
+def alert_silent_deliveries() -> dict[str, int]:
+    result = detect_silent_deliveries(
+        stale_after_minutes=int(getattr(settings, "DELIVERY_STALE_AFTER_MINUTES", 5)),
+        lookback_minutes=int(getattr(settings, "DELIVERY_STALE_LOOKBACK_MINUTES", 360)),
+    )
+    if result["alerted"]:
+        logger.info("deliveries.silent", extra=result)
+    return result
+
+
+@shared_task
+def process_payment_events(provider: str, reference: str) -> dict[str, int]:
+    """Process the queued webhook events of one payment reference in order."""
+    return webhooks.process_reference(provider, reference)
+
+
+@shared_task
+def retry_payment_events(limit: int = 200) -> dict[str, int]:
+    """Re-dispatch references with due retries or a lost enqueue."""
+    refs = webhooks.due_references(limit=limit)
+    for provider, reference in refs:
+        webhooks.enqueue(provider, reference)
+    if refs:
+        logger.info("payments.webhook.swept", extra={"references": len(refs)})
+    return {"references": len(refs)}
@@ -10,7 +10,7 @@ from orders.models import Order, OrderItem, PaymentEvent, Transaction
 from product_app.models import Category, Product, ProductStock, Warehouse
 
 
-@override_settings(PAYSTACK_SECRET_KEY="sk_test_example")
+@override_settings(PAYSTACK_SECRET_KEY="sk_test_example", WEBHOOK_PROCESS_INLINE=True)
 class PaystackWebhookHardenedTests(TestCase):
     def setUp(self):
         User = get_user_model()
@@ -61,12 +61,13 @@ class PaystackWebhookHardenedTests(TestCase):
             separators=(",", ":"),
         ).encode()
         sig = self._sign(body)
-        resp = self.client.post(
-            reverse("orders:paystack_webhook"),
-            body,
-            content_type="application/json",
-            HTTP_X_PAYSTACK_SIGNATURE=sig,
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(
+                reverse("orders:paystack_webhook"),
+                body,
+                content_type="application/json",
+                HTTP_X_PAYSTACK_SIGNATURE=sig,
+            )
         self.assertEqual(resp.status_code, 200)
         self.tx.refresh_from_db()
         self.order.refresh_from_db()
@@ -110,12 +111,19 @@ class PaystackWebhookHardenedTests(TestCase):
         ).encode()
         sig = self._sign(body)
         url = reverse("orders:paystack_webhook")
-        r1 = self.client.post(
-            url, body, content_type="application/json", HTTP_X_PAYSTACK_SIGNATURE=sig
-        )
-        r2 = self.client.post(
-            url, body, content_type="application/json", HTTP_X_PAYSTACK_SIGNATURE=sig
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            r1 = self.client.post(
+                url,
+                body,
+                content_type="application/json",
+                HTTP_X_PAYSTACK_SIGNATURE=sig,
+            )
+            r2 = self.client.post(
+                url,
+                body,
+                content_type="application/json",
+                HTTP_X_PAYSTACK_SIGNATURE=sig,
+            )
         self.assertEqual(r1.status_code, 200)
         self.assertEqual(r2.status_code, 200)
         self.assertEqual(PaymentEvent.objects.count(), 1)
@@ -10,6 +10,7 @@ from .views import (  # Orders & addresses; Generic payment result pages; Paymen
     driver_location_api,
     driver_route_api,
     geo_autocomplete,
+    geo_autocomplete_async,
     get_location_info,
     order_confirmation,
     order_create,
@@ -38,6 +39,11 @@ urlpatterns = [
     path("edit/<int:order_id>/", order_edit, name="order_edit"),
     path("api/reverse-geocode/", get_location_info, name="reverse_geocode"),
     path("api/geo/autocomplete/", geo_autocomplete, name="geo-autocomplete"),
+    path(
+        "api/geo/autocomplete/async/",
+        geo_autocomplete_async,
+        name="geo-autocomplete-async",
+    ),
     path("save-location/", save_location, name="save_location"),
     # ----- Stripe (dedicated names/paths) -----
     path("stripe/<int:order_id>/", stripe_checkout, name="stripe_checkout"),
@@ -5,8 +5,6 @@ import hashlib
 import hmac
 import json
 import logging
-import math
-import time
 from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
 from typing import Any
 
@@ -23,18 +21,25 @@ from django.shortcuts import get_object_or_404, redirect, render
 from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_GET, require_http_methods, require_POST
 
 from cart.models import Cart
+from core.rate_limit import get_client_ip
+from orders import eta
 from orders.forms import OrderForm
-from orders.models import Delivery, Order, OrderItem, PaymentEvent, Transaction
+from orders.models import Delivery, Order, OrderItem, Transaction
 from orders.money import to_minor_units
-from orders.services import assign_warehouses_and_update_stock
+from orders.services import (
+    assign_warehouses_and_update_stock,
+    autocomplete,
+    tracks,
+    webhooks,
+)
+from orders.services.routes import delivery_route_endpoints, get_route
 from orders.services.totals import safe_order_total
 from orders.utils import derive_ui_payment_status, reverse_geocode
-from payments.gateways import maybe_refund_duplicate_success
-from payments.notify import emit_once, send_payment_email, send_refund_email
 from payments.serializers import PaystackWebhookSerializer
 from users.utils import is_vendor_or_staff
 
@@ -79,101 +84,6 @@ def is_driver(u):
 
 driver_required = user_passes_test(is_driver)
 
-# ---------- Simple in-memory route cache (short TTL) ----------
-_ROUTE_CACHE: dict[str, tuple[float, dict]] = {}
-_ROUTE_TTL = 60  # seconds
-
-
-def _route_cache_key(a_lat, a_lng, b_lat, b_lng) -> str:
-    # round to ~11m precision to improve hit rate
-    return f"{round(a_lat, 5)},{round(a_lng, 5)}:{round(b_lat, 5)},{round(b_lng, 5)}"
-
-
-def _cache_get(k: str):
-    item = _ROUTE_CACHE.get(k)
-    if not item:
-        return None
-    ts, payload = item
-    if time.time() - ts > _ROUTE_TTL:
-        _ROUTE_CACHE.pop(k, None)
-        return None
-    return payload
-
-
-def _cache_set(k: str, payload: dict):
-    _ROUTE_CACHE[k] = (time.time(), payload)
-
-
-def _to_latlng(coords, ref=None):
-    """Return coords as [lat, lng]. If ref given, choose orientation closest to ref."""
-    if not coords:
-        return []
-    if ref is not None:
-        first = coords[0]
-        as_is = _haversine_km(first[0], first[1], ref[0], ref[1])
-        flipped = _haversine_km(first[1], first[0], ref[0], ref[1])
-        if flipped < as_is:
-            return [[c[1], c[0]] for c in coords]
-        return [[c[0], c[1]] for c in coords]
-    return [[c[1], c[0]] for c in coords]
-
-
-def _haversine_km(a_lat, a_lng, b_lat, b_lng):
-    R = 6371
-    dLat = math.radians(b_lat - a_lat)
-    dLng = math.radians(b_lng - a_lng)
-    s1 = (
-        math.sin(dLat / 2) ** 2
-        + math.cos(math.radians(a_lat))
-        * math.cos(math.radians(b_lat))
-        * math.sin(dLng / 2) ** 2
-    )
-    return 2 * R * math.asin(math.sqrt(s1))
-
-
-def _geoapify_route(a_lat, a_lng, b_lat, b_lng, api_key: str):
-    url = "https://api.geoapify.com/v1/routing"
-    params = {
-        "waypoints": f"{a_lat},{a_lng}|{b_lat},{b_lng}",
-        "mode": "drive",
-        "format": "geojson",
-        "apiKey": api_key,
-    }
-    r = requests.get(url, params=params, timeout=10)
-    r.raise_for_status()
-    j = r.json()
-    feat = (j.get("features") or [None])[0]
-    if not feat:
-        raise ValueError("geoapify: no route")
-    coords = feat["geometry"]["coordinates"]
-    if isinstance(coords[0][0], (int, float)):  # LineString
-        coords_ll = _to_latlng(coords, (a_lat, a_lng))
-    else:  # MultiLineString
-        flat = [p for part in coords for p in part]
-        coords_ll = _to_latlng(flat, (a_lat, a_lng))
-    props = feat.get("properties", {})
-    dist_km = (props.get("distance", 0) or 0) / 1000.0
-    dur_min = (props.get("time", 0) or 0) / 60.0
-    return {"coords": coords_ll, "distance_km": dist_km, "duration_min": dur_min}
-
-
-def _osrm_route(a_lat, a_lng, b_lat, b_lng):
-    base = "https://router.project-osrm.org/route/v1/driving"
-    url = f"{base}/{a_lng},{a_lat};{b_lng},{b_lat}"
-    r = requests.get(
-        url, params={"overview": "full", "geometries": "geojson"}, timeout=10
-    )
-    r.raise_for_status()
-    j = r.json()
-    route = (j.get("routes") or [None])[0]
-    if not route:
-        raise ValueError("osrm: no route")
-    coords = route["geometry"]["coordinates"]
-    coords_ll = _to_latlng(coords, (a_lat, a_lng))
-    dist_km = (route.get("distance", 0) or 0) / 1000.0
-    dur_min = (route.get("duration", 0) or 0) / 60.0
-    return {"coords": coords_ll, "distance_km": dist_km, "duration_min": dur_min}
-
 
 # ---------- DRIVER: HTML shell ----------
 @login_required
@@ -197,12 +107,12 @@ def driver_deliveries_api(request):
             "id": d.id,
             "order_id": d.order_id,
             "status": d.status,
-            "dest_lat": float(d.order.dest_lat)
-            if d.order.dest_lat is not None
-            else None,
-            "dest_lng": float(d.order.dest_lng)
-            if d.order.dest_lng is not None
-            else None,
+            "dest_lat": (
+                float(d.order.dest_lat) if d.order.dest_lat is not None else None
+            ),
+            "dest_lng": (
+                float(d.order.dest_lng) if d.order.dest_lng is not None else None
+            ),
             "last_lat": float(d.last_lat) if d.last_lat is not None else None,
             "last_lng": float(d.last_lng) if d.last_lng is not None else None,
             "last_ping_at": d.last_ping_at.isoformat() if d.last_ping_at else None,
@@ -300,79 +210,28 @@ def driver_route_api(request, delivery_id: int):
     except Delivery.DoesNotExist:
         return JsonResponse({"error": "not found"}, status=404)
 
-    # Determine start point
-    if d.last_lat is not None and d.last_lng is not None:
-        a_lat, a_lng = float(d.last_lat), float(d.last_lng)
-    elif d.origin_lat is not None and d.origin_lng is not None:
-        a_lat, a_lng = float(d.origin_lat), float(d.origin_lng)
-    else:
-        return JsonResponse({"error": "no start position"}, status=400)
-
-    if d.dest_lat is None or d.dest_lng is None:
-        return JsonResponse({"error": "no destination"}, status=400)
-    b_lat, b_lng = float(d.dest_lat), float(d.dest_lng)
-
-    if _haversine_km(a_lat, a_lng, b_lat, b_lng) < 0.12:  # ~120 m
-        coords = [[a_lat, a_lng], [b_lat, b_lng]]
-        return JsonResponse({"coords": coords, "distance_km": 0.12, "duration_min": 1})
-
-    key = _route_cache_key(a_lat, a_lng, b_lat, b_lng)
-    cached = _cache_get(key)
-    if cached:
-        return JsonResponse(cached)
-
     try:
-        if getattr(settings, "GEOAPIFY_API_KEY", None):
-            payload = _geoapify_route(
-                a_lat, a_lng, b_lat, b_lng, settings.GEOAPIFY_API_KEY
-            )
-        else:
-            payload = _osrm_route(a_lat, a_lng, b_lat, b_lng)
-    except Exception:
-        payload = {
-            "coords": [[a_lat, a_lng], [b_lat, b_lng]],
-            "distance_km": _haversine_km(a_lat, a_lng, b_lat, b_lng),
-            "duration_min": None,
-        }
+        (a_lat, a_lng), (b_lat, b_lng) = delivery_route_endpoints(d)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
 
-    coords = payload.get("coords") or []
-    payload["coords"] = _to_latlng(coords, (a_lat, a_lng)) if coords else []
-    _cache_set(key, payload)
-    return JsonResponse(payload)
+    return JsonResponse(get_route(a_lat, a_lng, b_lat, b_lng))
 
 
 # ---------- Geo autocomplete ----------
-_LAST_CALLS: dict[str, float] = {}
-
-
 @require_GET
 def geo_autocomplete(request):
-    q = (request.GET.get("q") or "").strip()
-    if len(q) < 3:
-        return JsonResponse({"results": []})
+    q = request.GET.get("q") or ""
+    results = autocomplete.autocomplete(q, get_client_ip(request))
+    return JsonResponse({"results": results})
 
-    ip = request.META.get("REMOTE_ADDR", "unknown")
-    now = time.time()
-    if now - _LAST_CALLS.get(ip, 0) < 0.2:
-        return JsonResponse({"results": []})
-    _LAST_CALLS[ip] = now
 
-    try:
-        r = requests.get(
-            "https://api.geoapify.com/v1/geocode/autocomplete",
-            params={
-                "text": q,
-                "limit": 6,
-                "format": "json",
-                "filter": "countrycode:ke",
-                "apiKey": getattr(settings, "GEOAPIFY_API_KEY", ""),
-            },
-            timeout=5,
-        )
-        data = r.json() if r.ok else {"results": []}
-        return JsonResponse(data, status=r.status_code if r.ok else 200)
-    except requests.RequestException:
-        return JsonResponse({"results": []}, status=200)
+@require_GET
+async def geo_autocomplete_async(request):
+    """Same contract as geo_autocomplete; does not hold a sync worker on upstream IO."""
+    q = request.GET.get("q") or ""
+    results = await autocomplete.aautocomplete(q, get_client_ip(request))
+    return JsonResponse({"results": results})
 
 
 # ---------- Order create ----------
@@ -670,7 +529,10 @@ def paystack_checkout(request, order_id: int):
 @csrf_exempt
 def paystack_webhook(request):
     """
-    Verified, idempotent Paystack webhook with replay dedupe and notifications.
+    Verified, idempotent Paystack webhook: stores the event and acks at once.
+
+    Transaction/order updates, stock allocation and notifications run in
+    ``orders.services.webhooks.handle_paystack`` on the worker.
     """
     logger_ps = logging.getLogger("paystack")
 
@@ -710,158 +572,8 @@ def paystack_webhook(request):
     if not reference:
         return JsonResponse({"detail": "missing reference"}, status=400)
 
-    # 4) Idempotency via body SHA256
-    sha = hashlib.sha256(raw).hexdigest().lower()
-    pe, created = PaymentEvent.objects.get_or_create(
-        body_sha256=sha,
-        defaults={"provider": "paystack", "reference": reference, "body": event},
-    )
-    if not created:
-        return HttpResponse(status=200)
-
-    event_type = event.get("event")
-    order_id = (data.get("metadata") or {}).get("order_id")
-    customer_email = (data.get("customer") or {}).get("email")
-
-    # 5) Single-source-of-truth update
-    with transaction.atomic():
-        try:
-            tx = Transaction.objects.select_for_update().get(reference=reference)
-        except Transaction.DoesNotExist:
-            logger_ps.error(f"[Webhook] Unknown transaction: {reference}")
-            return HttpResponse(status=200)
-
-        if tx.callback_received:
-            return HttpResponse(status=200)
-
-        tx.callback_received = True
-        tx.raw_event = event
-        tx.processed_at = timezone.now()
-        if customer_email and not getattr(tx, "email", None):
-            tx.email = customer_email
-
-        order = None
-        if order_id:
-            try:
-                order = Order.objects.select_for_update().get(id=order_id)
-            except Order.DoesNotExist:
-                order = None
-
-        if event_type == "charge.success":
-            tx.status = "success"
-            tx.verified = True
-            tx.body_sha256 = sha
-            tx.save(
-                update_fields=[
-                    "callback_received",
-                    "verified",
-                    "status",
-                    "email",
-                    "raw_event",
-                    "processed_at",
-                    "body_sha256",
-                ]
-            )
-            if order:
-                order.paid = True
-                order.payment_status = "success"
-                order.save(update_fields=["paid", "payment_status"])
-                assign_warehouses_and_update_stock(order)
-
-            if getattr(tx, "email", None):
-                emit_once(
-                    event_key=f"payment_success:{tx.reference}",
-                    user=getattr(tx, "user", None),
-                    channel="email",
-                    payload={"order_id": order_id, "amount": str(tx.amount)},
-                    send_fn=lambda: send_payment_email(
-                        tx.email, order_id, tx.amount, tx.reference, "received"
-                    ),
-                )
-
-            if order_id:
-                refunded_refs = maybe_refund_duplicate_success(tx)
-                if refunded_refs and getattr(tx, "email", None):
-                    for ref in refunded_refs:
-                        emit_once(
-                            event_key=f"refund_completed:{ref}",
-                            user=getattr(tx, "user", None),
-                            channel="email",
-                            payload={"order_id": order_id, "amount": str(tx.amount)},
-                            send_fn=lambda ref=ref: send_refund_email(
-                                tx.email, order_id, tx.amount, ref, "completed"
-                            ),
-                        )
-
-        elif event_type == "charge.failed":
-            tx.status = "failed"
-            tx.body_sha256 = sha
-            tx.save(
-                update_fields=[
-                    "callback_received",
-                    "status",
-                    "email",
-                    "raw_event",
-                    "processed_at",
-                    "body_sha256",
-                ]
-            )
-            if order:
-                order.payment_status = "failed"
-                order.save(update_fields=["payment_status"])
-
-            if getattr(tx, "email", None):
-                emit_once(
-                    event_key=f"payment_failed:{tx.reference}",
-                    user=getattr(tx, "user", None),
-                    channel="email",
-                    payload={"order_id": order_id, "amount": str(tx.amount)},
-                    send_fn=lambda: send_payment_email(
-                        tx.email, order_id, tx.amount, tx.reference, "failed"
-                    ),
-                )
-
-        elif event_type == "charge.cancelled":
-            tx.status = "cancelled"
-            tx.body_sha256 = sha
-            tx.save(
-                update_fields=[
-                    "callback_received",
-                    "status",
-                    "email",
-                    "raw_event",
-                    "processed_at",
-                    "body_sha256",
-                ]
-            )
-            if order:
-                order.payment_status = "cancelled"
-                order.save(update_fields=["payment_status"])
-
-            if getattr(tx, "email", None):
-                emit_once(
-                    event_key=f"payment_cancelled:{tx.reference}",
-                    user=getattr(tx, "user", None),
-                    channel="email",
-                    payload={"order_id": order_id, "amount": str(tx.amount)},
-                    send_fn=lambda: send_payment_email(
-                        tx.email, order_id, tx.amount, tx.reference, "cancelled"
-                    ),
-                )
-        else:
-            tx.status = "pending"
-            tx.body_sha256 = sha
-            tx.save(
-                update_fields=[
-                    "callback_received",
-                    "status",
-                    "email",
-                    "raw_event",
-                    "processed_at",
-                    "body_sha256",
-                ]
-            )
-
+    # 4) Persist the raw event and ack; orders.tasks processes it
+    webhooks.ingest("paystack", reference, raw, event)
     return HttpResponse(status=200)
 
 
@@ -885,14 +597,13 @@ def send_payment_receipt_email(transaction: Transaction, order: Order):
         "emails/payment_receipt.html",
         {"user": transaction.user, "order": order, "transaction": transaction},
     )
-    from django.core.mail import send_mail
-
-    send_mail(
-        subject=subject,
-        message="This is an HTML email. Please use an HTML-capable client.",
-        from_email=getattr(settings, "DEFAULT_FROM_EMAIL", None),
-        recipient_list=recipient,
-        html_message=message,
+    from notifications import outbox
+
+    outbox.enqueue(
+        recipient[0],
+        subject,
+        "This is an HTML email. Please use an HTML-capable client.",
+        message,
     )
 
 
@@ -974,30 +685,18 @@ def stripe_webhook(request):
     sig_header = request.META.get("HTTP_STRIPE_SIGNATURE")
     endpoint_secret = getattr(settings, "STRIPE_WEBHOOK_SECRET", "")
     try:
-        event = stripe.Webhook.construct_event(
+        stripe.Webhook.construct_event(
             payload=payload, sig_header=sig_header, secret=endpoint_secret
         )
     except Exception:
         return HttpResponse(status=400)
 
-    if event.get("type") == "checkout.session.completed":
-        session = event["data"]["object"]
-        order_id = (session.get("metadata") or {}).get("order_id")
-        if order_id:
-            try:
-                order = Order.objects.get(id=order_id)
-                order.payment_status = "paid"
-                order.paid = True
-                order.payment_intent_id = session.get("payment_intent")
-                order.save(
-                    update_fields=["payment_status", "paid", "payment_intent_id"]
-                )
-            except Order.DoesNotExist:
-                pass
-    elif event.get("type") == "payment_intent.payment_failed":
-        logger.warning("Stripe payment failed")
-    elif event.get("type") == "charge.refunded":
-        logger.info("Stripe refund processed")
+    # verified: persist the plain JSON body, keyed by its payment intent so
+    # the session, failure and refund events of one payment stay in order
+    event = json.loads(payload)
+    obj = (event.get("data") or {}).get("object") or {}
+    reference = obj.get("payment_intent") or obj.get("id") or event.get("id")
+    webhooks.ingest("stripe", str(reference), payload, event)
     return HttpResponse(status=200)
 
 
@@ -1011,19 +710,11 @@ def paypal_webhook(request):
     except json.JSONDecodeError:
         return HttpResponse(status=400)
 
-    if event.get("event_type") == "PAYMENT.CAPTURE.COMPLETED":
-        resource = event.get("resource", {}) or {}
-        reference = resource.get("id")
-        invoice = resource.get("invoice_id")
-        Transaction.objects.filter(reference=reference).update(status="success")
-        if invoice:
-            try:
-                order = Order.objects.get(id=invoice)
-                order.paid = True
-                order.payment_status = "paid"
-                order.save(update_fields=["paid", "payment_status"])
-            except Order.DoesNotExist:
-                pass
+    resource = event.get("resource", {}) or {}
+    reference = resource.get("id") or event.get("id")
+    if not reference:
+        return HttpResponse(status=400)
+    webhooks.ingest("paypal", str(reference), request.body, event)
     return HttpResponse(status=200)
 
 
@@ -1268,6 +959,7 @@ def track_order(request, order_id: int):
         "warehouse": warehouse,
         "destination": dest,
         "wsUrl": f"/ws/delivery/track/{delivery.id}/" if delivery else "",
+        "etaMinutes": eta.delivery_etas([delivery])[delivery.pk] if delivery else None,
     }
     return render(
         request,
@@ -1282,26 +974,49 @@ def track_order(request, order_id: int):
 
 
 # ---------- API: get recent delivery pings (for trail) ----------
+def _parse_since_ms(raw: str | None) -> int | None:
+    """Accept epoch milliseconds or an ISO-8601 datetime."""
+    if not raw:
+        return None
+    if raw.lstrip("-").isdigit():
+        return int(raw)
+    dt = parse_datetime(raw)
+    if dt is None:
+        raise ValueError(raw)
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return tracks.to_ms(dt)
+
+
 @login_required
 def delivery_pings_api(request, delivery_id: int):
     DeliveryModel = apps.get_model("orders", "Delivery")
-    PingModel = apps.get_model("orders", "DeliveryPing")
     d = get_object_or_404(DeliveryModel.objects.select_related("order"), pk=delivery_id)
 
     is_owner = d.order.user_id == request.user.id
     if not (is_owner or is_vendor_or_staff(request.user)):
         return HttpResponseForbidden("Not allowed")
 
-    qs = PingModel.objects.filter(delivery=d).order_by("-created_at")
-    limit = int(request.GET.get("limit", 200))
+    try:
+        limit = int(request.GET.get("limit", 200))
+        since_ms = _parse_since_ms(request.GET.get("since"))
+        tolerance_m = float(request.GET.get("tolerance", 0))
+        bucket_s = float(request.GET.get("bucket", 0))
+    except ValueError:
+        return JsonResponse({"error": "invalid query parameter"}, status=400)
     limit = max(10, min(limit, 1000))
-    rows = list(qs.values_list("lat", "lng", "created_at")[:limit])
-    rows.reverse()  # chronological
 
+    # Compacted track (finished deliveries) plus any raw pings, oldest first.
+    track = tracks.read_track(d.pk, since_ms=since_ms, limit=limit)
+    # Optional server-side thinning: newest fix per time bucket, then
+    # Douglas-Peucker within `tolerance` metres (capped to stay recognisable).
+    track = tracks.bucket(track, max(0.0, min(bucket_s, 3600.0)))
+    track = tracks.simplify(track, max(0.0, min(tolerance_m, 500.0)))
     data = {
         "delivery": d.pk,
-        "count": len(rows),
-        "coords": [[float(lat), float(lng)] for (lat, lng, _ts) in rows],
-        "ts": [ts.isoformat() for (_lat, _lng, ts) in rows],
+        "count": len(track),
+        "coords": track.coords(),
+        "t": track.t_ms,
+        "ts": [tracks.from_ms(t).isoformat() for t in track.t_ms],
     }
     return JsonResponse(data)
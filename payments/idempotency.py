@@ -1,14 +1,20 @@
 from __future__ import annotations
 
 import hashlib
-from collections.abc import Callable
-from functools import wraps
+import logging
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import partial, wraps
+from typing import Any
 
-from django.db import transaction
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import IntegrityError, transaction
+from django.utils.module_loading import import_string
 
-from .models import AuditLog, IdempotencyKey
+from core import metrics
 
-import logging
+from .models import IdempotencyKey
 
 logger = logging.getLogger(__name__)
 
@@ -17,17 +23,159 @@ def body_sha256(data: bytes) -> str:
     return hashlib.sha256(data or b"").hexdigest()
 
 
+# ---- Stores ----
+class DatabaseStore:
+    """Durable store: one ``IdempotencyKey`` row per claimed (scope, key).
+
+    A claim is a single INSERT guarded by the unique constraint, so
+    duplicates neither take row locks nor write anything.
+    """
+
+    def claim(self, scope: str, key: str) -> bool:
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(scope=scope, key=key)
+        except IntegrityError:
+            return False
+        return True
+
+    @contextmanager
+    def hold(self, scope: str, key: str) -> Iterator[bool]:
+        """Claim (scope, key) for the duration of the block; yields ``created``.
+
+        The INSERT stays uncommitted until the block exits, so a concurrent
+        duplicate blocks on the unique index until the first call commits
+        (and then replays) or rolls back (and then runs as the first).
+        """
+        with transaction.atomic():
+            yield self.claim(scope, key)
+
+    def record_response(self, scope: str, key: str, response_hash: str) -> None:
+        IdempotencyKey.objects.filter(scope=scope, key=key).update(
+            response_hash=response_hash
+        )
+
+
+def _redis_client():
+    import redis
+
+    return redis.Redis.from_url(
+        settings.REDIS_URL, ssl=getattr(settings, "REDIS_SSL", False)
+    )
+
+
+class RedisStore:
+    """Redis ``SET NX EX`` in front of :class:`DatabaseStore`.
+
+    Replays are answered by Redis alone; only keys Redis has not seen reach
+    the database, which stays the durable record (and the judge once the
+    Redis key has expired). Redis errors fall back to the database.
+    :meth:`hold` only uses Redis to skip the database for keys whose first
+    call has already committed.
+    """
+
+    prefix = "idem"
+    DONE = b"done"
+
+    def __init__(self, client=None, ttl: int | None = None, durable=None):
+        self._client = client
+        if not ttl:
+            ttl = int(getattr(settings, "IDEMPOTENCY_REDIS_TTL", 24 * 60 * 60))
+        self.ttl = ttl
+        self.durable = durable or DatabaseStore()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = _redis_client()
+        return self._client
+
+    def _key(self, scope: str, key: str) -> str:
+        return f"{self.prefix}:{scope}:{key}"
+
+    def claim(self, scope: str, key: str) -> bool:
+        try:
+            first = self.client.set(self._key(scope, key), b"1", nx=True, ex=self.ttl)
+        except Exception as exc:
+            metrics.inc("idempotency_redis_errors")
+            logger.warning("Idempotency Redis claim failed: %s", exc)
+            return self.durable.claim(scope, key)
+        if not first:
+            return False
+        try:
+            return self.durable.claim(scope, key)
+        except Exception:
+            self.client.delete(self._key(scope, key))
+            raise
+
+    @contextmanager
+    def hold(self, scope: str, key: str) -> Iterator[bool]:
+        """Like :meth:`DatabaseStore.hold`; keys Redis marked done skip the DB."""
+        name = self._key(scope, key)
+        try:
+            done = self.client.get(name) == self.DONE
+        except Exception as exc:
+            metrics.inc("idempotency_redis_errors")
+            logger.warning("Idempotency Redis lookup failed: %s", exc)
+            done = False
+        if done:
+            yield False
+            return
+        with self.durable.hold(scope, key) as created:
+            yield created
+            transaction.on_commit(partial(self._mark_done, name))
+
+    def _mark_done(self, name: str) -> None:
+        try:
+            self.client.set(name, self.DONE, ex=self.ttl)
+        except Exception as exc:
+            logger.warning("Idempotency Redis mark failed: %s", exc)
+
+    def record_response(self, scope: str, key: str, response_hash: str) -> None:
+        self.durable.record_response(scope, key, response_hash)
+
+
+_stores: dict[str, DatabaseStore | RedisStore] = {}
+
+
+def get_store() -> DatabaseStore | RedisStore:
+    """The store named by ``IDEMPOTENCY_STORE`` (one instance per process)."""
+    path = getattr(settings, "IDEMPOTENCY_STORE", "payments.idempotency.DatabaseStore")
+    store = _stores.get(path)
+    if store is None:
+        store = _stores[path] = import_string(path)()
+    return store
+
+
+def _reset_stores(*, setting, **kwargs):
+    if setting in {"IDEMPOTENCY_STORE", "IDEMPOTENCY_REDIS_TTL", "REDIS_URL"}:
+        _stores.clear()
+
+
+setting_changed.connect(_reset_stores)
+
+
+def _replayed(scope: str, key: str, request_id: str = "") -> None:
+    metrics.inc("idempotent_replays", scope=scope)
+    logger.info("Idempotent replay %s:%s request_id=%s", scope, key, request_id)
+
+
+# ---- API ----
 def idempotent(scope: str) -> Callable:
     """Decorator to enforce idempotency for side-effecting handlers.
 
     The wrapped function must accept either `idempotency_key` kwarg or a `request`
     kwarg whose header `X-Idempotency-Key` or body is used to derive a key.
-    The function is executed at most once per (scope,key) pair.
+    The first call claims the (scope,key) pair in the configured store and
+    runs inside that claim's transaction. A concurrent replay waits for it to
+    commit, then runs the function again, so the function must be
+    deterministic for its key (e.g. return the stored outcome). A failed
+    first call rolls its claim back so a retry counts as first again.
     """
 
     def deco(func: Callable) -> Callable:
         @wraps(func)
-        def wrapper(*args, **kwargs):
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
             key: str | None = kwargs.pop("idempotency_key", None)
             request = kwargs.get("request")
             if key is None and request is not None:
@@ -44,25 +192,21 @@ def idempotent(scope: str) -> Callable:
                 ).encode("utf-8")
                 key = body_sha256(raw)
 
-            with transaction.atomic():
-                idem, created = (
-                    IdempotencyKey.objects.select_for_update().get_or_create(
-                        scope=scope, key=key
-                    )
-                )
+            store = get_store()
+            with store.hold(scope, key) as created:
                 if not created:
-                    AuditLog.log(event="IDEMPOTENT_REPLAY", message=f"{scope}:{key}")
-                    # Return deterministic value by re-invoking function in a dry way is risky.
-                    # Expect wrapped function to be deterministic based on the key.
+                    _replayed(scope, key, getattr(request, "request_id", ""))
                 result = func(*args, idempotency_key=key, **kwargs)
-                # Store a hash of result representation for traceability
-                try:
-                    rbytes = (str(result) or "").encode("utf-8")
-                    idem.response_hash = body_sha256(rbytes)
-                    idem.save(update_fields=["response_hash"])
-                except Exception as e:
-                    logger.debug("idempotency side-effect failed: %s", e, exc_info=True)
-                return result
+                if created:
+                    # Store a hash of the first result for traceability
+                    try:
+                        rbytes = (str(result) or "").encode("utf-8")
+                        store.record_response(scope, key, body_sha256(rbytes))
+                    except Exception as e:
+                        logger.debug(
+                            "idempotency side-effect failed: %s", e, exc_info=True
+                        )
+            return result
 
         return wrapper
 
@@ -73,7 +217,7 @@ def accept_once(*, scope: str, request=None, key: str | None = None) -> bool:
     """Return True if this (scope,key) is accepted for first processing.
 
     - If key not given, derive as SHA256 of raw request.body
-    - Uses SELECT FOR UPDATE get_or_create to serialize duplicates
+    - Claims through the configured store (``IDEMPOTENCY_STORE``)
     """
     if key is None and request is not None:
         try:
@@ -82,14 +226,7 @@ def accept_once(*, scope: str, request=None, key: str | None = None) -> bool:
             key = None
     if not key:
         return True  # fallback: cannot dedupe without a key
-    with transaction.atomic():
-        _, created = IdempotencyKey.objects.select_for_update().get_or_create(
-            scope=scope, key=key
-        )
-        if not created:
-            AuditLog.log(
-                event="IDEMPOTENT_REPLAY",
-                request_id=getattr(request, "request_id", ""),
-                message=f"{scope}:{key}",
-            )
-        return created
+    created = get_store().claim(scope, key)
+    if not created:
+        _replayed(scope, key, getattr(request, "request_id", ""))
+    return created
@@ -1,11 +1,8 @@
 from __future__ import annotations
 
-from datetime import timedelta
-
 from django.core.management.base import BaseCommand
-from django.utils import timezone
 
-from payments.models import IdempotencyKey
+from payments.services.retention import get_policy, purge
 
 
 class Command(BaseCommand):
@@ -15,15 +12,20 @@ class Command(BaseCommand):
         parser.add_argument(
             "--days", type=int, default=14, help="Age in days to keep (default 14)"
         )
+        parser.add_argument("--chunk-size", type=int, default=None)
+        parser.add_argument("--sleep", type=float, default=None)
 
     def handle(self, *args, **options):
         days = int(options.get("days") or 14)
-        cutoff = timezone.now() - timedelta(days=days)
-        qs = IdempotencyKey.objects.filter(created_at__lt=cutoff)
-        count = qs.count()
-        qs.delete()
+        report = purge(
+            get_policy("payments.IdempotencyKey"),
+            days=days,
+            chunk_size=options.get("chunk_size"),
+            sleep=options.get("sleep"),
+        )
         self.stdout.write(
             self.style.SUCCESS(
-                f"Purged {count} idempotency keys older than {days} days"
+                f"Purged {report.deleted} idempotency keys older than {days} days "
+                f"({report.per_second} rows/s)"
             )
         )
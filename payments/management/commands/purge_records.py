@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.services.retention import POLICIES, get_policy, purge
+
+
+class Command(BaseCommand):
+    help = "Purge expired payment audit/dedupe rows in chunks (see retention policies)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model",
+            action="append",
+            dest="models",
+            help="app_label.Model to purge (repeatable; default: all policies)",
+        )
+        parser.add_argument("--chunk-size", type=int, default=None)
+        parser.add_argument("--sleep", type=float, default=None)
+        parser.add_argument("--archive-dir", default=None)
+        parser.add_argument("--dry-run", action="store_true")
+        parser.add_argument("--list", action="store_true", help="Show policies")
+
+    def handle(self, *args, **opts):
+        if opts["list"]:
+            for p in POLICIES:
+                archive = " archive" if p.archive else ""
+                self.stdout.write(f"{p.model}: {p.date_field} > {p.days}d{archive}")
+            return
+        try:
+            policies = [get_policy(m) for m in opts["models"] or []] or POLICIES
+        except LookupError as exc:
+            raise CommandError(str(exc))
+        for policy in policies:
+            report = purge(
+                policy,
+                chunk_size=opts["chunk_size"],
+                sleep=opts["sleep"],
+                archive_dir=opts["archive_dir"],
+                dry_run=opts["dry_run"],
+            )
+            verb = "Would purge" if report.dry_run else "Purged"
+            line = (
+                f"{verb} {report.deleted} {policy.model} rows in {report.chunks} "
+                f"chunks ({report.seconds:.2f}s, {report.per_second} rows/s)"
+            )
+            if report.archive_path:
+                line += f" archived to {report.archive_path}"
+            self.stdout.write(self.style.SUCCESS(line))
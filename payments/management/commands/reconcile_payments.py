@@ -7,6 +7,7 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("--max-age-mins", type=int, default=60)
         parser.add_argument("--limit", type=int, default=500)
+        parser.add_argument("--chunk-size", type=int, default=None)
         parser.add_argument("--dry-run", action="store_true")
         parser.add_argument("--sync", action="store_true")  # bypass Celery
 
@@ -15,15 +16,24 @@ class Command(BaseCommand):
             max_age_mins=opts["max_age_mins"],
             limit=opts["limit"],
             dry_run=opts["dry_run"],
+            chunk_size=opts["chunk_size"],
         )
         if opts["sync"]:
             self.stdout.write("Running synchronously")
-            reconcile_stale_transactions(**task_kwargs)
+            self._report(reconcile_stale_transactions(inline=True, **task_kwargs))
         else:
             try:
                 reconcile_stale_transactions.delay(**task_kwargs)
                 self.stdout.write(self.style.SUCCESS("Reconciliation task queued"))
             except Exception:
                 self.stdout.write("Celery not running, running synchronously")
-                reconcile_stale_transactions(**task_kwargs)
+                self._report(reconcile_stale_transactions(inline=True, **task_kwargs))
         self.stdout.write(self.style.SUCCESS("Done"))
+
+    def _report(self, summary):
+        self.stdout.write(
+            f"claimed={summary['claimed']} chunks={summary['chunks']} "
+            f"gateways={summary['gateways']}"
+        )
+        for result in summary["results"]:
+            self.stdout.write(f"  {result}")
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-19 03:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("payments", "0007_reconcileidempotency"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transaction",
+            name="reconcile_claimed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -5,6 +5,7 @@ from django.db import models
 from django.db.models import Q
 from django.utils import timezone
 
+from core import audit
 from vendor_app.models import VendorOrg
 
 from .enums import Gateway, PaymentMethod, TxnStatus
@@ -88,6 +89,8 @@ class Transaction(models.Model):
 
     refund_reference = models.CharField(max_length=128, null=True, blank=True)
     refunded_at = models.DateTimeField(null=True, blank=True)
+    # Lease taken by the stale-transaction reconciler (payments.tasks)
+    reconcile_claimed_at = models.DateTimeField(null=True, blank=True)
 
     # Settlement breakdown
     gross_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
@@ -163,13 +166,16 @@ class AuditLog(models.Model):
         message: str = "",
         meta: dict | None = None,
     ):
-        return cls.objects.create(
-            event=event,
-            transaction=transaction,
-            order=order,
-            request_id=request_id,
-            message=message,
-            meta=meta or {},
+        """Record an audit entry; it is written after commit (see ``core.audit``)."""
+        return audit.record(
+            cls(
+                event=event,
+                transaction=transaction,
+                order=order,
+                request_id=request_id,
+                message=message,
+                meta=meta or {},
+            )
         )
 
 
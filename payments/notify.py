@@ -5,10 +5,10 @@ import logging
 from collections.abc import Callable
 
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
 from django.db import IntegrityError, transaction
 from django.utils import timezone
 
+from notifications import outbox
 from payments.models import NotificationEvent  # Model lives in payments/models.py
 
 __all__ = ["emit_once", "send_refund_email", "send_payment_email"]
@@ -20,7 +20,7 @@ def emit_once(
     event_key: str,
     user,
     channel: str,
-    send_fn: Callable[[], None],
+    send_fn: Callable[[], object],
     payload: dict | None = None,
 ) -> bool:
     """
@@ -43,7 +43,7 @@ def emit_once(
     return True
 
 
-def _safe_send(send_fn: Callable[[], None]) -> None:
+def _safe_send(send_fn: Callable[[], object]) -> None:
     try:
         send_fn()
     except Exception as e:  # noqa: BLE001 - we want to log all exceptions from email send
@@ -57,11 +57,14 @@ def _send_html_email(
         settings, "DEFAULT_FROM_EMAIL", f"no-reply@{settings.SITE_DOMAIN.split(':')[0]}"
     )
     reply_to = [getattr(settings, "SUPPORT_EMAIL", from_email)]
-    msg = EmailMultiAlternatives(
-        subject, text_body, from_email, [to_email], reply_to=reply_to
+    outbox.enqueue(
+        to_email,
+        subject,
+        text_body,
+        html_body,
+        from_email=from_email,
+        reply_to=reply_to,
     )
-    msg.attach_alternative(html_body, "text/html")
-    msg.send()
 
 
 def send_refund_email(
@@ -1,22 +1,19 @@
 from django.core.exceptions import ValidationError
-from django.db import models
 
-from product_app.models import ProductStock
+from orders.services.stock import InsufficientStock, allocate_order_items
 
 from .models import AuditLog
 
 
 def safe_decrement_stock(order, request_id: str = ""):
-    for item in order.items.select_for_update():
-        if not item.warehouse:
-            continue
-        ps = ProductStock.objects.select_for_update().get(
-            product=item.product, warehouse=item.warehouse
-        )
-        if ps.quantity < item.quantity:
-            raise ValidationError("Insufficient stock")
-        ps.quantity = models.F("quantity") - item.quantity
-        ps.save(update_fields=["quantity"])
+    items = [
+        i for i in order.items.select_for_update().order_by("pk") if i.warehouse_id
+    ]
+    try:
+        allocate_order_items(items)
+    except InsufficientStock as exc:
+        raise ValidationError("Insufficient stock") from exc
+    for item in items:
         AuditLog.log(
             event="STOCK_DECREMENT",
             order=order,
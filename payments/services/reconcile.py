@@ -2,7 +2,13 @@ from __future__ import annotations
 
 import json
 import logging
-from dataclasses import dataclass
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import timedelta
+from itertools import islice
 from typing import Any
 
 import requests
@@ -14,6 +20,7 @@ from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
 
+from core import metrics
 from payments.enums import Gateway, TxnStatus
 from payments.models import ReconcileIdempotency, Transaction
 
@@ -126,6 +133,212 @@ def reconcile_stripe(session_id: str) -> dict[str, Any]:
     )
 
 
+# ---------------------------------------------------------------------------
+# Bulk reconcile
+# ---------------------------------------------------------------------------
+
+
+class RateLimiter:
+    """Token bucket shared by worker threads: at most ``rps`` acquisitions/s."""
+
+    def __init__(self, rps: float, *, burst: int | None = None) -> None:
+        self.rps = float(rps)
+        self.capacity = float(burst or max(1, int(rps)))
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rps <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._stamp) * self.rps
+                )
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rps
+            time.sleep(wait)
+
+
+@dataclass
+class BulkReconcileReport:
+    total: int = 0
+    counts: dict[str, int] = field(default_factory=dict)
+    errors: dict[str, int] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    @property
+    def per_second(self) -> float:
+        return round(self.total / self.seconds, 2) if self.seconds else 0.0
+
+    def add(self, outcome: str, code: str | None = None) -> None:
+        self.counts[outcome] = self.counts.get(outcome, 0) + 1
+        if code:
+            self.errors[code] = self.errors.get(code, 0) + 1
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "total": self.total,
+            "counts": dict(self.counts),
+            "errors": dict(self.errors),
+            "seconds": round(self.seconds, 3),
+            "per_second": self.per_second,
+        }
+
+
+def paystack_session(pool_size: int) -> requests.Session:
+    """HTTP session whose keep-alive pool fits ``pool_size`` parallel calls."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1, pool_maxsize=max(1, pool_size)
+    )
+    session.mount("https://", adapter)
+    return session
+
+
+def verify_paystack_many(
+    txns: Iterable[Any],
+    *,
+    concurrency: int | None = None,
+    rps: float | None = None,
+    timeout: float | None = None,
+) -> Iterator[tuple[Any, VerifyResult | ReconcileError]]:
+    """Verify transactions against Paystack concurrently.
+
+    Yields ``(txn, VerifyResult)`` or ``(txn, ReconcileError)`` as answers
+    arrive. At most ``concurrency`` requests are in flight, started at no
+    more than ``rps`` per second, over one pooled session. Only HTTP runs
+    in the worker threads; callers apply results in their own thread.
+
+    Threads rather than asyncio/httpx: every result is applied by the
+    existing sync ORM code, and ``_fetch_paystack_status`` already speaks
+    ``requests``, so a pooled session keeps one HTTP stack for both paths.
+    """
+    if not concurrency:
+        concurrency = int(getattr(settings, "PAYSTACK_RECONCILE_CONCURRENCY", 8))
+    if rps is None:
+        rps = float(getattr(settings, "PAYSTACK_RECONCILE_RPS", 20))
+    if not timeout:
+        timeout = float(getattr(settings, "PAYSTACK_VERIFY_TIMEOUT", 15))
+    limiter = RateLimiter(rps)
+
+    def verify(session, txn):
+        limiter.acquire()
+        try:
+            return _fetch_paystack_status(
+                txn, txn.reference, session=session, timeout=timeout
+            )
+        except ReconcileError as exc:
+            return exc
+        except Exception as exc:  # pragma: no cover - defensive
+            return ReconcileError("paystack_network_error", str(exc), status_code=502)
+
+    with (
+        paystack_session(concurrency) as session,
+        ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="paystack-verify"
+        ) as pool,
+    ):
+        it = iter(txns)
+        pending = {}
+        # keep a bounded window of futures instead of submitting everything
+        for txn in islice(it, concurrency * 2):
+            pending[pool.submit(verify, session, txn)] = txn
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                txn = pending.pop(fut)
+                yield txn, fut.result()
+                for nxt in islice(it, 1):
+                    pending[pool.submit(verify, session, nxt)] = nxt
+
+
+def stale_paystack_transactions(*, max_age_mins: int = 30, limit: int = 1000):
+    """Pending Paystack transactions older than ``max_age_mins``, oldest first."""
+    cutoff = timezone.now() - timedelta(minutes=max_age_mins)
+    return (
+        Transaction.objects.select_related("order", "order__user", "vendor_org")
+        .filter(
+            gateway=Gateway.PAYSTACK,
+            status=TxnStatus.PENDING,
+            created_at__lt=cutoff,
+        )
+        .order_by("id")[:limit]
+    )
+
+
+def apply_paystack_result(txn: Transaction, verify: VerifyResult) -> str:
+    """Apply one verify answer through the single-reference logic."""
+    key = _build_idempotency_key(txn, verify.reference or txn.reference)
+    if verify.status == "success":
+        summary = _finalize_success(txn, verify, key)
+        if summary.get("cached"):
+            return "cached"
+        return "duplicate" if summary.get("duplicate") else "success"
+    if verify.status == "failed":
+        _register_failure(txn, verify, key)
+        _metric("reconcile_failure", gateway=txn.gateway, reason="gateway_failed")
+        return "failed"
+    if verify.status == "pending":
+        _metric("reconcile_pending", gateway=txn.gateway)
+        return "pending"
+    _metric("reconcile_error", gateway=txn.gateway, code=verify.status)
+    return "error"
+
+
+def reconcile_paystack_bulk(
+    txns: Iterable[Transaction] | None = None,
+    *,
+    max_age_mins: int = 30,
+    limit: int = 1000,
+    concurrency: int | None = None,
+    rps: float | None = None,
+    dry_run: bool = False,
+) -> BulkReconcileReport:
+    """Reconcile many Paystack transactions; return outcome counts and rate.
+
+    Defaults to :func:`stale_paystack_transactions`. With ``dry_run`` the
+    gateway is still asked but nothing is written; outcomes are the provider
+    statuses.
+    """
+    if not getattr(settings, "PAYSTACK_SECRET_KEY", ""):
+        raise ReconcileError(
+            "paystack_secret_missing",
+            "PAYSTACK_SECRET_KEY is not configured.",
+            status_code=500,
+            extra={"gateway": Gateway.PAYSTACK.value},
+        )
+    if txns is None:
+        txns = stale_paystack_transactions(max_age_mins=max_age_mins, limit=limit)
+    report = BulkReconcileReport()
+    started = time.monotonic()
+    for txn, result in verify_paystack_many(txns, concurrency=concurrency, rps=rps):
+        report.total += 1
+        if isinstance(result, ReconcileError):
+            report.add("error", result.code)
+            continue
+        if dry_run:
+            report.add(result.status)
+            continue
+        try:
+            report.add(apply_paystack_result(txn, result))
+        except ReconcileError as exc:
+            report.add("error", exc.code)
+        except Exception as exc:
+            logger.exception("payments.reconcile.bulk_apply_failed: %s", exc)
+            report.add("error", "apply_failed")
+    report.seconds = time.monotonic() - started
+    metrics.inc("reconcile_bulk_transactions", report.total, gateway="paystack")
+    metrics.observe("reconcile_bulk_seconds", report.seconds, gateway="paystack")
+    logger.info("payments.reconcile.bulk %s", report.as_dict())
+    return report
+
+
 # ---------------------------------------------------------------------------
 # Internal helpers
 # ---------------------------------------------------------------------------
@@ -300,7 +513,13 @@ def _get_transaction_for_ref(ref: str, gateway: Gateway) -> Transaction:
     return txn
 
 
-def _fetch_paystack_status(txn: Transaction, reference: str) -> VerifyResult:
+def _fetch_paystack_status(
+    txn: Transaction,
+    reference: str,
+    *,
+    session: requests.Session | None = None,
+    timeout: float = 20,
+) -> VerifyResult:
     secret = getattr(settings, "PAYSTACK_SECRET_KEY", "")
     if not secret:
         raise ReconcileError(
@@ -314,7 +533,7 @@ def _fetch_paystack_status(txn: Transaction, reference: str) -> VerifyResult:
     headers = {"Authorization": f"Bearer {secret}", "Accept": "application/json"}
 
     try:
-        response = requests.get(url, headers=headers, timeout=20)
+        response = (session or requests).get(url, headers=headers, timeout=timeout)
     except requests.RequestException as exc:
         raise ReconcileError(
             "paystack_network_error",
@@ -336,7 +555,10 @@ def _fetch_paystack_status(txn: Transaction, reference: str) -> VerifyResult:
     data = payload.get("data") or {}
     status_str = str(data.get("status") or "").lower()
     gateway_ref = (
-        data.get("reference") or data.get("id") or txn.gateway_reference or reference
+        data.get("reference")
+        or data.get("id")
+        or getattr(txn, "gateway_reference", None)
+        or reference
     )
 
     if response.status_code >= 500:
@@ -0,0 +1,196 @@
+"""Retention for payment audit and dedupe tables.
+
+Every policy names a model, the timestamp that ages its rows and how long
+they are kept. :func:`purge` walks the expired rows in primary-key order
+(keyset pagination, no OFFSET), deletes them ``chunk_size`` at a time in
+short transactions and sleeps between chunks, so a backlog never becomes
+one long table lock or one giant binlog event. Policies with ``archive``
+first append the chunk to a gzip'd JSONL file under ``RETENTION_ARCHIVE_DIR``.
+
+``RETENTION_DAYS`` overrides the per-policy ages, e.g.
+``{"payments.AuditLog": 730}``.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from datetime import timedelta
+from pathlib import Path
+from typing import Any
+
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    model: str  # "app_label.ModelName"
+    date_field: str
+    days: int
+    archive: bool = False
+    # extra restriction on what may go (e.g. leave unprocessed rows alone)
+    only: Q | None = None
+
+    def get_model(self):
+        return apps.get_model(self.model)
+
+    def expired(self, now, days: int | None = None):
+        if days is None:
+            days = getattr(settings, "RETENTION_DAYS", {}).get(self.model, self.days)
+        cutoff = now - timedelta(days=days)
+        qs = self.get_model().objects.filter(**{f"{self.date_field}__lt": cutoff})
+        return qs.filter(self.only) if self.only is not None else qs
+
+
+POLICIES: tuple[RetentionPolicy, ...] = (
+    RetentionPolicy("payments.IdempotencyKey", "created_at", days=14),
+    RetentionPolicy("payments.ReconcileIdempotency", "created_at", days=30),
+    RetentionPolicy("payments.NotificationEvent", "sent_at", days=90),
+    RetentionPolicy(
+        "orders.PaymentEvent",
+        "received_at",
+        days=180,
+        archive=True,
+        only=~Q(status="received"),
+    ),
+    RetentionPolicy("payments.PaymentEvent", "created_at", days=730, archive=True),
+    RetentionPolicy("payments.AuditLog", "created_at", days=365, archive=True),
+    RetentionPolicy(
+        "notifications.OutboundEmail",
+        "created_at",
+        days=30,
+        only=~Q(status="pending"),
+    ),
+)
+
+
+def get_policy(model: str) -> RetentionPolicy:
+    for policy in POLICIES:
+        if policy.model.lower() == model.lower():
+            return policy
+    raise LookupError(f"No retention policy for {model}")
+
+
+@dataclass
+class RetentionReport:
+    model: str
+    deleted: int = 0
+    archived: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    dry_run: bool = False
+    archive_path: str = ""
+    cascaded: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def per_second(self) -> float:
+        return round(self.deleted / self.seconds, 2) if self.seconds else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "model": self.model,
+            "deleted": self.deleted,
+            "archived": self.archived,
+            "chunks": self.chunks,
+            "seconds": round(self.seconds, 3),
+            "per_second": self.per_second,
+            "dry_run": self.dry_run,
+            "archive_path": self.archive_path,
+            "cascaded": dict(self.cascaded),
+        }
+
+
+def _archive_path(policy: RetentionPolicy, archive_dir: str, now) -> Path:
+    stamp = now.strftime("%Y%m%dT%H%M%S")
+    return Path(archive_dir) / f"{policy.model.lower()}-{stamp}.jsonl.gz"
+
+
+def purge(
+    policy: RetentionPolicy,
+    *,
+    now=None,
+    chunk_size: int | None = None,
+    sleep: float | None = None,
+    archive_dir: str | None = None,
+    dry_run: bool = False,
+    days: int | None = None,
+    sleep_fn=time.sleep,
+) -> RetentionReport:
+    """Delete (and optionally archive) the rows ``policy`` has expired.
+
+    ``days`` overrides the policy's age for this run.
+    """
+    now = now or timezone.now()
+    if not chunk_size:
+        chunk_size = int(getattr(settings, "RETENTION_CHUNK_SIZE", 1000))
+    if sleep is None:
+        sleep = float(getattr(settings, "RETENTION_SLEEP_SECONDS", 0.1))
+    if archive_dir is None:
+        archive_dir = getattr(settings, "RETENTION_ARCHIVE_DIR", "")
+    Model = policy.get_model()
+    expired = policy.expired(now, days)
+    report = RetentionReport(model=policy.model, dry_run=dry_run)
+    archive = None
+    if policy.archive and archive_dir and not dry_run:
+        path = _archive_path(policy, archive_dir, now)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        archive = gzip.open(path, "at", encoding="utf-8")
+        report.archive_path = str(path)
+
+    started = time.perf_counter()
+    last_pk = None
+    try:
+        while True:
+            page = expired if last_pk is None else expired.filter(pk__gt=last_pk)
+            ids = list(page.order_by("pk").values_list("pk", flat=True)[:chunk_size])
+            if not ids:
+                break
+            if report.chunks:
+                sleep_fn(sleep)
+            last_pk = ids[-1]
+            report.chunks += 1
+            if dry_run:
+                report.deleted += len(ids)
+                continue
+            with transaction.atomic():
+                if archive is not None:
+                    for row in Model.objects.filter(pk__in=ids).order_by("pk").values():
+                        archive.write(json.dumps(row, cls=DjangoJSONEncoder) + "\n")
+                    report.archived += len(ids)
+                _, per_model = Model.objects.filter(pk__in=ids).delete()
+            report.deleted += per_model.pop(Model._meta.label, 0)
+            for label, n in per_model.items():
+                report.cascaded[label] = report.cascaded.get(label, 0) + n
+    finally:
+        if archive is not None:
+            archive.close()
+        report.seconds = time.perf_counter() - started
+
+    if not dry_run and report.deleted:
+        metrics.inc("retention_deleted", report.deleted, model=policy.model)
+        metrics.observe(
+            "retention_rows_per_second", report.per_second, model=policy.model
+        )
+    logger.info("payments.retention.purged", extra={"report": report.as_dict()})
+    return report
+
+
+def run_retention(
+    models: Iterable[str] | None = None, **kwargs
+) -> list[RetentionReport]:
+    """Apply every policy (or those named in ``models``) in turn."""
+    policies = POLICIES if not models else [get_policy(m) for m in models]
+    return [purge(policy, **kwargs) for policy in policies]
@@ -1,20 +1,149 @@
+import logging
+from collections import defaultdict
 from datetime import timedelta
 
 from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
 
-from .enums import TxnStatus
+from .enums import Gateway, TxnStatus
 from .models import AuditLog, Transaction
 from .services import process_failure
 
+logger = logging.getLogger(__name__)
+
+
+def _stale_filter(cutoff, now) -> Q:
+    lease = timedelta(
+        minutes=int(getattr(settings, "RECONCILE_CLAIM_LEASE_MINUTES", 15))
+    )
+    return Q(status=TxnStatus.PENDING, created_at__lt=cutoff) & (
+        Q(reconcile_claimed_at__isnull=True) | Q(reconcile_claimed_at__lt=now - lease)
+    )
+
+
+def claim_stale_batch(*, cutoff, size: int, after_id: int = 0, now=None) -> list:
+    """Claim up to ``size`` stale pending transactions as ``[(id, gateway)]``.
+
+    Rows are locked with ``SKIP LOCKED`` in id order and stamped with
+    ``reconcile_claimed_at``, so concurrent workers take disjoint batches and
+    a claimed row is left alone until its lease runs out.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        rows = list(
+            Transaction.objects.select_for_update(skip_locked=True)
+            .filter(_stale_filter(cutoff, now), id__gt=after_id)
+            .order_by("id")
+            .values_list("id", "gateway")[:size]
+        )
+        if rows:
+            Transaction.objects.filter(pk__in=[pk for pk, _ in rows]).update(
+                reconcile_claimed_at=now
+            )
+    return rows
+
 
 @shared_task
-def reconcile_stale_transactions():
-    cutoff = timezone.now() - timedelta(minutes=30)
-    qs = Transaction.objects.filter(status=TxnStatus.PENDING, created_at__lt=cutoff)
-    for txn in qs:
-        # TODO: query gateway API to verify status
-        # For now we assume failure
+def reconcile_gateway_batch(gateway: str, ids: list[int], dry_run: bool = False):
+    """Verify one gateway's share of a claimed batch."""
+    txns = list(
+        Transaction.objects.select_related("order", "order__user", "vendor_org")
+        .filter(pk__in=ids, gateway=gateway, status=TxnStatus.PENDING)
+        .order_by("id")
+    )
+    if gateway == Gateway.PAYSTACK:
+        from .services.reconcile import ReconcileError, reconcile_paystack_bulk
+
+        try:
+            return reconcile_paystack_bulk(txns, dry_run=dry_run).as_dict()
+        except ReconcileError as exc:
+            logger.warning("payments.reconcile.batch_failed: %s", exc.code)
+            return {"total": len(txns), "counts": {"error": len(txns)}}
+
+    # No verify API wired for this gateway yet: keep the expiry rule.
+    if dry_run:
+        return {"total": len(txns), "counts": {"would_fail": len(txns)}}
+    for txn in txns:
         process_failure(txn=txn, request_id="reconcile")
         AuditLog.log(event="RECONCILED", transaction=txn, order=txn.order)
-    return qs.count()
+    return {"total": len(txns), "counts": {"failed": len(txns)}}
+
+
+def _fan_out(gateway: str, ids: list[int], dry_run: bool, inline: bool):
+    if not inline:
+        try:
+            reconcile_gateway_batch.delay(gateway, ids, dry_run)
+            return {"queued": len(ids)}
+        except Exception as exc:  # broker unreachable
+            logger.warning("payments.reconcile.enqueue_failed: %s", exc)
+    return reconcile_gateway_batch(gateway, ids, dry_run)
+
+
+@shared_task
+def reconcile_stale_transactions(
+    max_age_mins: int = 30,
+    limit: int = 500,
+    dry_run: bool = False,
+    chunk_size: int | None = None,
+    inline: bool = False,
+) -> dict:
+    """Claim stale pending transactions in chunks and fan out verification.
+
+    Each chunk is claimed with ``claim_stale_batch`` and split per gateway
+    into ``reconcile_gateway_batch`` subtasks (run in-process when ``inline``
+    or when the broker is unreachable). ``dry_run`` claims nothing and only
+    asks the gateways.
+    """
+    if not chunk_size:
+        chunk_size = int(getattr(settings, "RECONCILE_CHUNK_SIZE", 100))
+    now = timezone.now()
+    cutoff = now - timedelta(minutes=max_age_mins)
+    claimed = chunks = 0
+    per_gateway: dict[str, int] = defaultdict(int)
+    results: list[dict] = []
+    after_id = 0
+    while claimed < limit:
+        size = min(chunk_size, limit - claimed)
+        if dry_run:
+            rows = list(
+                Transaction.objects.filter(_stale_filter(cutoff, now), id__gt=after_id)
+                .order_by("id")
+                .values_list("id", "gateway")[:size]
+            )
+        else:
+            rows = claim_stale_batch(
+                cutoff=cutoff, size=size, after_id=after_id, now=now
+            )
+        if not rows:
+            break
+        after_id = rows[-1][0]
+        chunks += 1
+        claimed += len(rows)
+        by_gateway: dict[str, list[int]] = defaultdict(list)
+        for pk, gateway in rows:
+            by_gateway[gateway].append(pk)
+        for gateway, ids in by_gateway.items():
+            per_gateway[gateway] += len(ids)
+            results.append(
+                {"gateway": gateway, **_fan_out(gateway, ids, dry_run, inline)}
+            )
+    summary = {
+        "claimed": claimed,
+        "chunks": chunks,
+        "gateways": dict(per_gateway),
+        "dry_run": dry_run,
+        "results": results,
+    }
+    logger.info("payments.reconcile.stale", extra={"summary": summary})
+    return summary
+
+
+@shared_task
+def purge_expired_records(models: list[str] | None = None, dry_run: bool = False):
+    """Apply the retention policies in ``payments.services.retention``."""
+    from .services.retention import run_retention
+
+    return [r.as_dict() for r in run_retention(models, dry_run=dry_run)]
@@ -126,9 +126,10 @@ class PaymentTestCase(TestCase):
             t.refund_reference = "rr1"
 
         mock_refund.side_effect = fake_refund
-        self.client.post(
-            "/webhook/stripe/", json.dumps(event), content_type="application/json"
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                "/webhook/stripe/", json.dumps(event), content_type="application/json"
+            )
         txn2.refresh_from_db()
         self.assertEqual(txn2.status, TxnStatus.REFUNDED)
         self.assertEqual(txn2.refund_reference, "rr1")
@@ -174,9 +175,10 @@ class PaymentTestCase(TestCase):
             }
         }
         mock_verify.return_value = event
-        self.client.post(
-            "/webhook/mpesa/", json.dumps(event), content_type="application/json"
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                "/webhook/mpesa/", json.dumps(event), content_type="application/json"
+            )
         txn2.refresh_from_db()
         self.assertEqual(txn2.status, TxnStatus.DUPLICATE_SUCCESS)
         self.assertTrue(
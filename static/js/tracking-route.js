@@ -53,6 +53,11 @@
     });
   }
 
+  // Server-side model ETA (orders.eta) until live fixes/routes refine it
+  if (Number.isFinite(Number(CTX.etaMinutes)) && CTX.etaMinutes !== null) {
+    setETA(`~${Math.max(1, Math.round(Number(CTX.etaMinutes)))} min`);
+  }
+
   function updateStatus(status) {
     if (statusChip) statusChip.textContent = status;
     console.log("status:", status);
@@ -111,7 +116,7 @@
   async function fetchHistoryTrail() {
     try {
       if (!deliveryId) return;
-      const r = await fetch(`/orders/apis/delivery/${deliveryId}/pings/?limit=200`, {
+      const r = await fetch(`/orders/apis/delivery/${deliveryId}/pings/?limit=1000&tolerance=5`, {
         credentials: "same-origin",
       });
       if (!r.ok) return;
@@ -26,7 +26,9 @@ def user_factory(db):
 
 
 @pytest.mark.django_db
-def test_audit_logs_on_product_and_delivery(user_factory, client):
+def test_audit_logs_on_product_and_delivery(
+    user_factory, client, django_capture_on_commit_callbacks
+):
     owner = user_factory()
     staff = user_factory()
     Group.objects.get_or_create(name=VENDOR)[0].user_set.add(owner)
@@ -39,20 +41,22 @@ def test_audit_logs_on_product_and_delivery(user_factory, client):
     cat = Category.objects.create(name="C", slug="c")
 
     client.force_login(staff)
-    res = client.post(
-        reverse("vendor-product-create"),
-        data=json.dumps(
-            {
-                "name": "P1",
-                "slug": "p1",
-                "price": "5.00",
-                "available": True,
-                "category": cat.id,
-                "owner_id": owner.id,
-            }
-        ),
-        content_type="application/json",
-    )
+    # audit rows are written once the request's transaction commits
+    with django_capture_on_commit_callbacks(execute=True):
+        res = client.post(
+            reverse("vendor-product-create"),
+            data=json.dumps(
+                {
+                    "name": "P1",
+                    "slug": "p1",
+                    "price": "5.00",
+                    "available": True,
+                    "category": cat.id,
+                    "owner_id": owner.id,
+                }
+            ),
+            content_type="application/json",
+        )
     assert res.status_code == 201
     assert AuditLog.objects.filter(action="product.create").exists()
 
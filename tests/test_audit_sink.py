@@ -0,0 +1,73 @@
+import pytest
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core import commit_batch
+from core.models import AuditLog as CoreAuditLog
+from core.models import log_action
+from core.tasks import write_audit_entries
+from payments.models import AuditLog
+
+
+def _inserts(ctx):
+    return [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("INSERT")]
+
+
+@pytest.mark.django_db
+def test_scope_writes_committed_entries_with_one_insert_per_model(
+    django_capture_on_commit_callbacks,
+):
+    with CaptureQueriesContext(connection) as ctx:
+        with commit_batch.batch():
+            with django_capture_on_commit_callbacks(execute=True):
+                with transaction.atomic():
+                    for i in range(3):
+                        AuditLog.log(event="STOCK_DECREMENT", meta={"i": i})
+                    log_action(None, 1, "order.paid", "order", 7)
+                    assert not AuditLog.objects.exists()
+            # committed but still buffered until the scope ends
+            assert not AuditLog.objects.exists()
+
+    assert AuditLog.objects.count() == 3
+    assert CoreAuditLog.objects.get().target_id == "7"
+    assert len(_inserts(ctx)) == 2
+
+
+@pytest.mark.django_db
+def test_rolled_back_savepoints_leave_no_entries(django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        with transaction.atomic():
+            AuditLog.log(event="KEPT")
+            try:
+                with transaction.atomic():
+                    AuditLog.log(event="DROPPED")
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+    assert list(AuditLog.objects.values_list("event", flat=True)) == ["KEPT"]
+
+
+@pytest.mark.django_db
+def test_queue_mode_ships_rows_to_the_worker(
+    settings, monkeypatch, django_capture_on_commit_callbacks
+):
+    settings.AUDIT_MODE = "queue"
+    shipped = []
+    monkeypatch.setattr(write_audit_entries, "delay", shipped.append)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        AuditLog.log(event="PAYMENT_SUCCESS", request_id="r1", meta={"a": 1})
+    assert not AuditLog.objects.exists()
+    assert len(shipped) == 1
+
+    assert write_audit_entries(shipped[0]) == 1
+    row = AuditLog.objects.get()
+    assert (row.event, row.request_id, row.meta) == ("PAYMENT_SUCCESS", "r1", {"a": 1})
+
+
+@pytest.mark.django_db
+def test_sync_mode_inserts_immediately(settings):
+    settings.AUDIT_MODE = "sync"
+    entry = AuditLog.log(event="ORDER_PAID")
+    assert entry.pk and AuditLog.objects.filter(pk=entry.pk).exists()
@@ -0,0 +1,153 @@
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from payments.enums import Gateway, PaymentMethod, TxnStatus
+from payments.models import Transaction
+from payments.services import reconcile
+from payments.services.reconcile import (
+    RateLimiter,
+    ReconcileError,
+    VerifyResult,
+    reconcile_paystack_bulk,
+    verify_paystack_many,
+)
+from product_app.models import Category, Product, ProductStock, Warehouse
+
+
+def _pending_txns(n):
+    User = get_user_model()
+    user = User.objects.create_user(username="buyer", password="x")
+    category = Category.objects.create(name="Shirts", slug="shirts")
+    product = Product.objects.create(
+        category=category, name="Tee", slug="tee", price=Decimal("100"), owner=user
+    )
+    warehouse = Warehouse.objects.create(
+        name="Main", latitude=1.0, longitude=36.0, address="HQ"
+    )
+    ProductStock.objects.create(product=product, warehouse=warehouse, quantity=50)
+    out = []
+    for i in range(n):
+        order = Order.objects.create(
+            user=user,
+            full_name="R",
+            email="r@example.com",
+            address="Nairobi",
+            dest_address_text="Nairobi",
+            dest_lat=0,
+            dest_lng=0,
+        )
+        OrderItem.objects.create(
+            order=order,
+            product=product,
+            price=Decimal("100"),
+            quantity=1,
+            warehouse=warehouse,
+        )
+        out.append(
+            Transaction.objects.create(
+                order=order,
+                user=user,
+                method=PaymentMethod.CARD,
+                gateway=Gateway.PAYSTACK,
+                amount=Decimal("100"),
+                currency="KES",
+                status=TxnStatus.PENDING,
+                idempotency_key=f"idem-{i}",
+                reference=f"ref-{i}",
+            )
+        )
+    Transaction.objects.update(created_at=timezone.now() - timedelta(hours=2))
+    return out
+
+
+def test_rate_limiter_caps_throughput():
+    limiter = RateLimiter(100, burst=1)
+    started = time.monotonic()
+    for _ in range(11):
+        limiter.acquire()
+    assert time.monotonic() - started >= 0.09
+
+
+def test_verify_many_runs_requests_concurrently(monkeypatch):
+    live = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def fake_fetch(txn, reference, *, session=None, timeout=20):
+        with lock:
+            live["now"] += 1
+            live["max"] = max(live["max"], live["now"])
+        time.sleep(0.05)
+        with lock:
+            live["now"] -= 1
+        return VerifyResult(status="pending", reference=reference, raw={})
+
+    monkeypatch.setattr(reconcile, "_fetch_paystack_status", fake_fetch)
+    txns = [Transaction(reference=f"r{i}", gateway="paystack") for i in range(16)]
+
+    started = time.monotonic()
+    out = list(verify_paystack_many(txns, concurrency=4, rps=0))
+
+    assert sorted(t.reference for t, _ in out) == sorted(t.reference for t in txns)
+    assert live["max"] == 4
+    assert time.monotonic() - started < 16 * 0.05 / 2
+
+
+@pytest.mark.django_db
+def test_bulk_reconcile_applies_results_and_counts(monkeypatch, settings):
+    settings.PAYSTACK_SECRET_KEY = "sk_test"
+    ok, bad, waiting, broken = _pending_txns(4)
+    answers = {ok.reference: "success", bad.reference: "failed"}
+
+    def fake_fetch(txn, reference, *, session=None, timeout=20):
+        if reference == broken.reference:
+            raise ReconcileError("paystack_unavailable", "down", status_code=502)
+        status = answers.get(reference, "pending")
+        return VerifyResult(status=status, reference=f"ps-{reference}", raw={})
+
+    monkeypatch.setattr(reconcile, "_fetch_paystack_status", fake_fetch)
+
+    report = reconcile_paystack_bulk(max_age_mins=30, concurrency=3, rps=0)
+
+    assert report.total == 4
+    assert report.counts == {"success": 1, "failed": 1, "pending": 1, "error": 1}
+    assert report.errors == {"paystack_unavailable": 1}
+    assert report.per_second > 0
+    for txn, status in [
+        (ok, TxnStatus.SUCCESS),
+        (bad, TxnStatus.FAILED),
+        (waiting, TxnStatus.PENDING),
+        (broken, TxnStatus.PENDING),
+    ]:
+        txn.refresh_from_db()
+        assert txn.status == status
+    ok.order.refresh_from_db()
+    assert ok.order.paid
+
+    again = reconcile_paystack_bulk(
+        [ok], concurrency=1, rps=0
+    )  # already applied: served from the idempotency record
+    assert again.counts == {"cached": 1}
+
+
+@pytest.mark.django_db
+def test_bulk_reconcile_dry_run_writes_nothing(monkeypatch, settings):
+    settings.PAYSTACK_SECRET_KEY = "sk_test"
+    (txn,) = _pending_txns(1)
+    monkeypatch.setattr(
+        reconcile,
+        "_fetch_paystack_status",
+        lambda t, r, **kw: VerifyResult(status="success", reference=r, raw={}),
+    )
+
+    report = reconcile_paystack_bulk(dry_run=True)
+
+    assert report.counts == {"success": 1}
+    txn.refresh_from_db()
+    assert txn.status == TxnStatus.PENDING
@@ -2,6 +2,7 @@ from decimal import Decimal
 from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase, override_settings
 from django.urls import reverse
 
@@ -59,8 +60,11 @@ class CheckoutDestinationTests(TestCase):
 
 
 class GeoAutocompleteViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
     @override_settings(GEOAPIFY_API_KEY="key")
-    @patch("orders.views.requests.get")
+    @patch("orders.services.autocomplete.requests.get")
     def test_proxy_ok(self, mock_get):
         mock_get.return_value.ok = True
         mock_get.return_value.status_code = 200
@@ -73,3 +77,42 @@ class GeoAutocompleteViewTests(TestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertIn("results", resp.json())
         mock_get.assert_called_once()
+
+    @override_settings(GEOAPIFY_API_KEY="key")
+    @patch("orders.services.autocomplete.requests.get")
+    def test_longer_query_served_from_prefix_cache(self, mock_get):
+        mock_get.return_value.ok = True
+        mock_get.return_value.json.return_value = {
+            "results": [
+                {"formatted": "Umoja Estate, Nairobi"},
+                {"formatted": "Umoja Innercore, Nairobi"},
+            ]
+        }
+        url = reverse("orders:geo-autocomplete")
+        self.client.get(url, {"q": "Umoj"}, REMOTE_ADDR="1.1.1.2")
+        resp = self.client.get(url, {"q": "umoja  inner"}, REMOTE_ADDR="1.1.1.2")
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(
+            resp.json()["results"], [{"formatted": "Umoja Innercore, Nairobi"}]
+        )
+
+    @override_settings(GEOAPIFY_API_KEY="key", GEO_AUTOCOMPLETE_RATE_LIMIT=2)
+    @patch("orders.services.autocomplete.requests.get")
+    def test_upstream_calls_are_rate_limited_per_client(self, mock_get):
+        mock_get.return_value.ok = True
+        mock_get.return_value.json.return_value = {"results": []}
+        url = reverse("orders:geo-autocomplete")
+        for q in ("aaa", "bbb", "ccc"):
+            resp = self.client.get(url, {"q": q}, REMOTE_ADDR="1.1.1.3")
+            self.assertEqual(resp.json(), {"results": []})
+        self.assertEqual(mock_get.call_count, 2)
+
+    @override_settings(GEOAPIFY_API_KEY="key")
+    @patch("orders.services.autocomplete._afetch_upstream")
+    def test_async_view_shares_cache(self, mock_fetch):
+        mock_fetch.return_value = [{"formatted": "Kilimani, Nairobi"}]
+        url = reverse("orders:geo-autocomplete-async")
+        first = self.client.get(url, {"q": "Kilimani"}, REMOTE_ADDR="1.1.1.4")
+        second = self.client.get(url, {"q": "kilimani"}, REMOTE_ADDR="1.1.1.4")
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(mock_fetch.call_count, 1)
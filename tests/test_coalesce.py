@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from core.coalesce import LatestCoalescer
+
+
+@pytest.mark.asyncio
+async def test_latest_item_wins_within_interval():
+    sent = []
+
+    async def send(key, item):
+        sent.append((key, item))
+
+    c = LatestCoalescer(0.05, send)
+    assert await c.submit("g", 1) is True
+    for i in range(2, 6):
+        assert await c.submit("g", i) is False
+    assert await c.submit("other", "x") is True  # keys are independent
+    await asyncio.sleep(0.1)
+
+    assert sent == [("g", 1), ("other", "x"), ("g", 5)]
+
+
+@pytest.mark.asyncio
+async def test_cancel_drops_pending_items():
+    sent = []
+
+    async def send(key, item):
+        sent.append(item)
+
+    c = LatestCoalescer(0.05, send)
+    await c.submit("g", 1)
+    await c.submit("g", 2)
+    c.cancel()
+    await asyncio.sleep(0.1)
+    assert sent == [1]
@@ -0,0 +1,61 @@
+import threading
+
+import pytest
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+
+from core import db_writes
+from orders.consumers import DeliveryTrackerConsumer
+from orders.models import Delivery, Order
+
+
+@sync_to_async
+def _delivery():
+    User = get_user_model()
+    driver = User.objects.create_user(username="drv", password="x")
+    owner = User.objects.create_user(username="own", password="x")
+    order = Order.objects.create(
+        user=owner, full_name="A", email="a@a.com", dest_lat=0, dest_lng=0
+    )
+    d = Delivery.objects.create(
+        order=order, driver=driver, status=Delivery.Status.ASSIGNED
+    )
+    return d, driver, owner
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db(transaction=True)
+async def test_access_is_resolved_with_async_orm():
+    d, driver, owner = await _delivery()
+    consumer = DeliveryTrackerConsumer()
+
+    assert await consumer._resolve_access(d.pk, driver.pk) == (True, False)
+    assert await consumer._resolve_access(d.pk, owner.pk) == (False, True)
+    assert await consumer._resolve_access(d.pk, 10**6) is None
+    assert await consumer._resolve_access(10**6, driver.pk) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db(transaction=True)
+async def test_status_writes_run_on_the_bounded_write_pool(monkeypatch, settings):
+    settings.WS_DB_WRITE_POOL_SIZE = 1
+    monkeypatch.setattr(db_writes, "_EXECUTOR", None)
+    d, driver, _ = await _delivery()
+    threads = []
+    save = Delivery.save
+
+    def spy(self, *args, **kwargs):
+        threads.append(threading.current_thread().name)
+        return save(self, *args, **kwargs)
+
+    monkeypatch.setattr(Delivery, "save", spy)
+    consumer = DeliveryTrackerConsumer()
+
+    assert await consumer._update_status(d.pk, driver.pk, "picked_up")
+    assert not await consumer._update_status(d.pk, driver.pk + 1, "picked_up")
+
+    row = await Delivery.objects.aget(pk=d.pk)
+    assert row.status == Delivery.Status.PICKED_UP and row.picked_up_at
+    assert len(threads) == 1 and threads[0].startswith("ws-db-write")
+    assert db_writes.write_executor()._max_workers == 1
+    monkeypatch.setattr(db_writes, "_EXECUTOR", None)
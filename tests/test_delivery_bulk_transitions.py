@@ -0,0 +1,150 @@
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from orders.models import Delivery, DeliveryEvent, Order, OrderItem
+from orders.services.transitions import bulk_transition
+from tests.test_vendor_live import _vendor_delivery
+
+
+@pytest.fixture
+def layer(settings):
+    settings.CHANNEL_LAYERS = {
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    }
+    cache.clear()
+    return get_channel_layer()
+
+
+def _more(d, n, **fields):
+    """``n`` deliveries on fresh orders carrying the same items as ``d``."""
+    out = []
+    for _ in range(n):
+        order = Order.objects.create(
+            full_name="x",
+            email="e@x.com",
+            address="a",
+            dest_address_text="d",
+            dest_lat=0,
+            dest_lng=0,
+            user=d.order.user,
+        )
+        for item in d.order.items.all():
+            OrderItem.objects.create(
+                order=order, product=item.product, price=item.price, quantity=1
+            )
+        out.append(Delivery.objects.create(order=order, **fields))
+    return out
+
+
+@pytest.mark.django_db(transaction=True)
+def test_bulk_pickup_is_one_update_and_one_broadcast_batch(layer):
+    owner, first = _vendor_delivery()
+    driver = get_user_model().objects.create_user(username="drv", password="x")
+    rows = _more(first, 3, driver=driver, status=Delivery.Status.ASSIGNED)
+    done = _more(first, 1, driver=driver, status=Delivery.Status.DELIVERED)[0]
+    group = async_to_sync(layer.new_channel)()
+    async_to_sync(layer.group_add)(rows[0].ws_group, group)
+
+    with CaptureQueriesContext(connection) as ctx:
+        result = bulk_transition(
+            [(d.pk, "picked_up") for d in rows] + [(done.pk, "picked_up")],
+            actor=owner,
+        )
+
+    assert result.updated == sorted(d.pk for d in rows)
+    assert result.rejected == {done.pk: "cannot go from delivered to picked_up"}
+    updates = [q for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+    assert len(updates) == 1
+    assert set(
+        Delivery.objects.filter(pk__in=[d.pk for d in rows]).values_list(
+            "status", flat=True
+        )
+    ) == {"picked_up"}
+    assert DeliveryEvent.objects.filter(type="picked").count() == 3
+
+    msg = async_to_sync(layer.receive)(group)
+    assert msg["type"] == "status.update"
+    assert msg["id"] == rows[0].pk and msg["status"] == "picked_up"
+    assert msg["picked_up_at"]
+
+
+@pytest.mark.django_db
+def test_all_or_nothing_leaves_rows_untouched(layer):
+    _, first = _vendor_delivery()
+    driver = get_user_model().objects.create_user(username="drv", password="x")
+    moving = _more(first, 1, driver=driver, status=Delivery.Status.ASSIGNED)[0]
+
+    result = bulk_transition(
+        [(moving.pk, "en_route"), (first.pk, "delivered")], all_or_nothing=True
+    )
+
+    assert result.updated == []
+    assert first.pk in result.rejected
+    moving.refresh_from_db()
+    assert moving.status == "assigned"
+    assert not DeliveryEvent.objects.exists()
+
+
+@pytest.mark.django_db
+def test_assign_needs_driver_and_repeats_are_unchanged(layer):
+    _, d = _vendor_delivery()
+    driver = get_user_model().objects.create_user(username="drv", password="x")
+
+    with pytest.raises(ValueError):
+        bulk_transition([(d.pk, "assigned")])
+    first = bulk_transition([(d.pk, "assigned")], driver_id=driver.pk)
+    again = bulk_transition([(d.pk, "assigned")], driver_id=driver.pk)
+
+    assert first.updated == [d.pk]
+    assert again.unchanged == [d.pk] and not again.updated
+    d.refresh_from_db()
+    assert d.driver_id == driver.pk and d.assigned_at
+
+
+@pytest.mark.django_db
+def test_api_only_moves_the_vendors_deliveries(client, layer):
+    owner, mine = _vendor_delivery()
+    User = get_user_model()
+    driver = User.objects.create_user(username="drv", password="x")
+    buyer = User.objects.get(username="b1")
+    other = Delivery.objects.create(
+        order=Order.objects.create(
+            full_name="y",
+            email="y@x.com",
+            address="a",
+            dest_address_text="d",
+            dest_lat=0,
+            dest_lng=0,
+            user=buyer,
+        )
+    )
+    client.force_login(owner)
+
+    res = client.post(
+        reverse("apis:delivery-bulk-transition"),
+        data=json.dumps(
+            {
+                "driver_id": driver.pk,
+                "transitions": [
+                    {"id": mine.pk, "status": "assigned"},
+                    {"id": other.pk, "status": "assigned"},
+                ],
+            }
+        ),
+        content_type="application/json",
+    )
+
+    assert res.status_code == 200
+    body = res.json()
+    assert body["updated"] == [mine.pk]
+    assert body["rejected"] == {str(other.pk): "not found"}
+    other.refresh_from_db()
+    assert other.driver_id is None
@@ -0,0 +1,165 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from orders.models import Delivery, DeliveryPing, DeliveryTrack, Order
+from orders.services import tracks
+
+User = get_user_model()
+
+
+class DeliveryTrackTests(TestCase):
+    def setUp(self):
+        self.cust = User.objects.create_user(username="cust", password="x")
+        order = Order.objects.create(
+            user=self.cust,
+            full_name="A",
+            email="a@a.com",
+            dest_lat=-1.25,
+            dest_lng=36.85,
+        )
+        self.delivery = Delivery.objects.create(order=order)
+        self.t0 = timezone.now().replace(microsecond=0) - timedelta(hours=2)
+
+    def _ping(self, i):
+        return DeliveryPing.objects.create(
+            delivery=self.delivery,
+            lat=Decimal("-1.300000") + Decimal(i) / 10000,
+            lng=Decimal("36.800000") - Decimal(i) / 20000,
+            created_at=self.t0 + timedelta(seconds=5 * i),
+        )
+
+    def _finish(self):
+        Delivery.objects.filter(pk=self.delivery.pk).update(
+            status=Delivery.Status.DELIVERED,
+            updated_at=timezone.now() - timedelta(hours=1),
+        )
+
+    def test_encode_decode_round_trip(self):
+        t = tracks.Track(
+            [-1300000, -1299990, -1299990, 90000000],
+            [36800000, 36800011, 36799000, -180000000],
+            [1000, 6000, 6001, 99000],
+        )
+        blob = tracks.encode(t, 1000)
+        self.assertEqual(tracks.decode(blob, 1000), t)
+        self.assertLess(len(blob), 4 * 3 * 4 + 32)
+
+    def test_compaction_replaces_pings_and_api_serves_track(self):
+        for i in range(30):
+            self._ping(i)
+        self._finish()
+
+        result = tracks.compact_finished_deliveries(batch_size=10)
+
+        self.assertEqual(result["points"], 30)
+        self.assertFalse(DeliveryPing.objects.exists())
+        stored = DeliveryTrack.objects.get(delivery=self.delivery)
+        self.assertEqual(stored.points, 30)
+        self.assertEqual(stored.started_at, self.t0)
+
+        self.client.force_login(self.cust)
+        url = reverse("orders:delivery-pings-api", args=[self.delivery.pk])
+        since = self.t0 + timedelta(seconds=5 * 19)
+        r = self.client.get(url, {"since": since.isoformat(), "limit": 10})
+        body = r.json()
+        self.assertEqual(body["count"], 10)
+        self.assertEqual(body["coords"][0], [-1.298, 36.799])
+        self.assertEqual(body["ts"][-1], (self.t0 + timedelta(seconds=145)).isoformat())
+
+    def test_recent_deliveries_are_left_for_the_grace_period(self):
+        self._ping(0)
+        Delivery.objects.filter(pk=self.delivery.pk).update(
+            status=Delivery.Status.DELIVERED
+        )
+        result = tracks.compact_finished_deliveries(grace_minutes=10)
+        self.assertEqual(result["deliveries"], 0)
+        self.assertEqual(DeliveryPing.objects.count(), 1)
+
+    def test_late_pings_merge_into_existing_track(self):
+        for i in range(3):
+            self._ping(i)
+        self._finish()
+        tracks.compact_delivery(self.delivery.pk)
+        self._ping(3)
+
+        self.assertEqual(len(tracks.read_track(self.delivery.pk, limit=100)), 4)
+        tracks.compact_delivery(self.delivery.pk)
+        self.assertEqual(DeliveryTrack.objects.get().points, 4)
+        self.assertFalse(DeliveryPing.objects.exists())
+
+
+class TrackSimplificationTests(TestCase):
+    def _line(self, n):
+        # Straight eastward line with a single 200 m detour in the middle.
+        lat = [-1300000] * n
+        lat[n // 2] += 1800
+        return tracks.Track(
+            lat, [36800000 + 100 * i for i in range(n)], list(range(0, n * 5000, 5000))
+        )
+
+    def test_simplify_keeps_endpoints_and_detour(self):
+        t = tracks.simplify(self._line(101), 5.0)
+        self.assertEqual(len(t), 5)
+        self.assertEqual(t.t_ms[0], 0)
+        self.assertEqual(t.t_ms[-1], 500000)
+        self.assertIn(-1300000 + 1800, t.lat_e6)
+
+    def test_bucket_keeps_latest_fix_per_window(self):
+        t = tracks.bucket(self._line(12), 30)  # 5 s fixes -> 6 per bucket
+        self.assertEqual(t.t_ms, [25000, 55000])
+
+    def test_api_applies_tolerance(self):
+        cust = User.objects.create_user(username="c", password="x")
+        order = Order.objects.create(
+            user=cust, full_name="A", email="a@a.com", dest_lat=-1.25, dest_lng=36.85
+        )
+        d = Delivery.objects.create(order=order)
+        t0 = timezone.now() - timedelta(minutes=10)
+        DeliveryPing.objects.bulk_create(
+            DeliveryPing(
+                delivery=d,
+                lat=Decimal("-1.300000"),
+                lng=Decimal("36.800000") + Decimal(i) / 10000,
+                created_at=t0 + timedelta(seconds=5 * i),
+            )
+            for i in range(50)
+        )
+        self.client.force_login(cust)
+        url = reverse("orders:delivery-pings-api", args=[d.pk])
+        self.assertEqual(self.client.get(url).json()["count"], 50)
+        self.assertEqual(self.client.get(url, {"tolerance": 5}).json()["count"], 2)
+        self.assertEqual(self.client.get(url, {"tolerance": "x"}).status_code, 400)
+
+    def test_retention_downsamples_old_delivered_tracks(self):
+        cust = User.objects.create_user(username="c", password="x")
+        order = Order.objects.create(
+            user=cust, full_name="A", email="a@a.com", dest_lat=-1.25, dest_lng=36.85
+        )
+        old = timezone.now() - timedelta(days=40)
+        d = Delivery.objects.create(order=order)
+        DeliveryPing.objects.bulk_create(
+            DeliveryPing(
+                delivery=d,
+                lat=Decimal("-1.300000"),
+                lng=Decimal("36.800000") + Decimal(i) / 10000,
+                created_at=old + timedelta(seconds=5 * i),
+            )
+            for i in range(40)
+        )
+        Delivery.objects.filter(pk=d.pk).update(
+            status=Delivery.Status.DELIVERED, delivered_at=old + timedelta(hours=1)
+        )
+
+        result = tracks.downsample_old_tracks(older_than_days=30, tolerance_m=5)
+        self.assertEqual(result["points_before"], 40)
+        self.assertEqual(result["points_after"], 2)
+        self.assertFalse(DeliveryPing.objects.exists())
+        self.assertEqual(DeliveryTrack.objects.get(delivery=d).tolerance_m, 5)
+
+        again = tracks.downsample_old_tracks(older_than_days=30, tolerance_m=5)
+        self.assertEqual(again["deliveries"], 0)
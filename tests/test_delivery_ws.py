@@ -4,6 +4,7 @@ import pytest
 from channels.layers import get_channel_layer
 from channels.testing import ApplicationCommunicator
 
+from orders import consumers
 from orders.consumers import DeliveryTrackerConsumer
 
 
@@ -15,9 +16,9 @@ async def test_delivery_ws_group_receive_status(monkeypatch, settings):
 
     # Bypass DB checks in consumer
     async def ok(*args, **kwargs):
-        return True
+        return (False, True)
 
-    monkeypatch.setattr(DeliveryTrackerConsumer, "_can_subscribe", ok)
+    monkeypatch.setattr(DeliveryTrackerConsumer, "_resolve_access", ok)
 
     # Build scope with authenticated user and delivery_id
     class U:
@@ -58,9 +59,9 @@ async def test_delivery_ws_group_receive_position(monkeypatch, settings):
     }
 
     async def ok(*args, **kwargs):
-        return True
+        return (False, True)
 
-    monkeypatch.setattr(DeliveryTrackerConsumer, "_can_subscribe", ok)
+    monkeypatch.setattr(DeliveryTrackerConsumer, "_resolve_access", ok)
 
     class U:
         is_authenticated = True
@@ -96,3 +97,131 @@ async def test_delivery_ws_group_receive_position(monkeypatch, settings):
     assert float(data["lng"]) == 2.3456
 
     await comm.send_input({"type": "websocket.disconnect"})
+
+
+async def _connect_driver(monkeypatch, delivery_id, user_id, calls):
+    async def access(*args, **kwargs):
+        calls.append("access")
+        return (True, False)
+
+    async def save(*args, **kwargs):
+        calls.append("save")
+        return None
+
+    monkeypatch.setattr(DeliveryTrackerConsumer, "_resolve_access", access)
+    monkeypatch.setattr(DeliveryTrackerConsumer, "_save_position", save)
+
+    class U:
+        is_authenticated = True
+        id = user_id
+
+    scope = {
+        "type": "websocket",
+        "path": f"/ws/delivery/track/{delivery_id}/",
+        "user": U(),
+        "url_route": {"kwargs": {"delivery_id": str(delivery_id)}},
+    }
+    comm = ApplicationCommunicator(DeliveryTrackerConsumer.as_asgi(), scope)
+    await comm.send_input({"type": "websocket.connect"})
+    out = await comm.receive_output(timeout=3)
+    assert out["type"] == "websocket.accept"
+    return comm
+
+
+@pytest.mark.asyncio
+async def test_driver_role_resolved_once_per_connection(monkeypatch, settings):
+    settings.CHANNEL_LAYERS = {
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    }
+    calls = []
+    comm = await _connect_driver(monkeypatch, 31, 5, calls)
+
+    for _ in range(3):
+        await comm.send_input(
+            {
+                "type": "websocket.receive",
+                "text": json.dumps({"type": "status", "status": "en_route"}),
+            }
+        )
+        out = await comm.receive_output(timeout=3)
+        assert json.loads(out["text"]) == {"type": "status", "status": "en_route"}
+
+    assert calls == ["access"]
+    await comm.send_input({"type": "websocket.disconnect"})
+
+
+@pytest.mark.asyncio
+async def test_unassign_message_revokes_cached_driver_role(monkeypatch, settings):
+    settings.CHANNEL_LAYERS = {
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    }
+    calls = []
+    comm = await _connect_driver(monkeypatch, 32, 6, calls)
+
+    layer = get_channel_layer()
+    await layer.group_send(
+        "delivery.32",
+        {"type": "delivery.event", "kind": "unassign", "driver_id": None},
+    )
+    out = await comm.receive_output(timeout=3)
+    assert out == {"type": "websocket.close", "code": 4003}
+
+
+@pytest.mark.asyncio
+async def test_position_fanout_sends_first_and_latest_fix(monkeypatch, settings):
+    settings.CHANNEL_LAYERS = {
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    }
+    settings.WS_POSITION_FANOUT_INTERVAL = 0.2
+    settings.WS_POSITION_CLIENT_INTERVAL = 0
+    monkeypatch.setattr(consumers, "_FANOUT", None)
+    comm = await _connect_driver(monkeypatch, 33, 7, [])
+
+    for i in range(5):
+        await comm.send_input(
+            {
+                "type": "websocket.receive",
+                "text": json.dumps({"op": "update", "lat": 1 + i / 10, "lng": 2}),
+            }
+        )
+
+    first = json.loads((await comm.receive_output(timeout=3))["text"])
+    latest = json.loads((await comm.receive_output(timeout=3))["text"])
+    assert (first["lat"], latest["lat"]) == (1.0, 1.4)
+    assert await comm.receive_nothing(timeout=0.4)
+    await comm.send_input({"type": "websocket.disconnect"})
+
+
+@pytest.mark.asyncio
+async def test_compact_position_frames(monkeypatch, settings):
+    settings.CHANNEL_LAYERS = {
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    }
+
+    async def ok(*args, **kwargs):
+        return (False, True)
+
+    monkeypatch.setattr(DeliveryTrackerConsumer, "_resolve_access", ok)
+
+    class U:
+        is_authenticated = True
+        id = 43
+
+    scope = {
+        "type": "websocket",
+        "path": "/ws/delivery/track/8/",
+        "query_string": b"fmt=compact",
+        "user": U(),
+        "url_route": {"kwargs": {"delivery_id": "8"}},
+    }
+    comm = ApplicationCommunicator(DeliveryTrackerConsumer.as_asgi(), scope)
+    await comm.send_input({"type": "websocket.connect"})
+    assert (await comm.receive_output(timeout=3))["type"] == "websocket.accept"
+
+    await get_channel_layer().group_send(
+        "delivery.8",
+        {"type": "tracker.update", "data": {"lat": 1.5, "lng": 2.5, "ts": 10}},
+    )
+    out = await comm.receive_output(timeout=3)
+    assert out["text"] == '["p",1.5,2.5,10,null]'
+    await comm.send_input({"type": "websocket.disconnect"})
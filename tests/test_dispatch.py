@@ -0,0 +1,149 @@
+import itertools
+import time
+from datetime import timedelta
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core import realtime
+from orders import dispatch
+from orders.models import Delivery, DeliveryEvent, Order
+from users.constants import DRIVER
+
+User = get_user_model()
+
+
+class SolverTests(TestCase):
+    def test_hungarian_matches_brute_force(self):
+        rng = np.random.default_rng(3)
+        for _ in range(50):
+            n, m = int(rng.integers(1, 6)), int(rng.integers(1, 6))
+            cost = rng.uniform(0, 10, (n, m))
+            pairs, name = dispatch.solve(cost, exact_max=10)
+            self.assertEqual(name, "hungarian")
+            if n <= m:
+                perms = itertools.permutations(range(m), n)
+                best = min(sum(cost[i, p[i]] for i in range(n)) for p in perms)
+            else:
+                perms = itertools.permutations(range(n), m)
+                best = min(sum(cost[p[j], j] for j in range(m)) for p in perms)
+            self.assertEqual(len(pairs), min(n, m))
+            self.assertAlmostEqual(sum(cost[r, c] for r, c in pairs), best)
+
+    def test_forbidden_pairs_are_never_returned(self):
+        cost = np.array([[1.0, dispatch.FORBIDDEN], [dispatch.FORBIDDEN, 2.0]])
+        cost[1, 1] = dispatch.FORBIDDEN
+        for exact_max in (0, 10):
+            pairs, _ = dispatch.solve(cost, exact_max=exact_max)
+            self.assertEqual(pairs, [(0, 0)])
+
+    def test_local_improvement_fixes_greedy_trap(self):
+        # greedy takes (0, 0) first and leaves row 1 with a far column
+        cost = np.array([[1.0, 2.0, 50.0], [1.5, 40.0, 45.0]])
+        greedy = dispatch.greedy(cost)
+        improved = dispatch.improve(cost, greedy)
+        self.assertEqual(improved.tolist(), [1, 0])
+
+    def test_improvement_stops_at_deadline(self):
+        cost = np.array([[1.0, 2.0, 50.0], [1.5, 40.0, 45.0]])
+        greedy = dispatch.greedy(cost)
+        stopped = dispatch.improve(cost, greedy, deadline=time.monotonic())
+        self.assertEqual(stopped.tolist(), greedy.tolist())
+
+    def test_500_deliveries_200_drivers_well_under_a_second(self):
+        rng = np.random.default_rng(7)
+        d_lat, d_lng = -1.3 + rng.uniform(-0.1, 0.1, (2, 500))
+        v_lat, v_lng = -1.3 + rng.uniform(-0.1, 0.1, (2, 200))
+        d_lng, v_lng = d_lng + 38.1, v_lng + 38.1
+        for exact_max in (0, 200):
+            started = time.perf_counter()
+            with override_settings(DISPATCH_HUNGARIAN_MAX=exact_max):
+                chosen, _ = dispatch.plan(
+                    list(range(500)), d_lat, d_lng, list(range(200)), v_lat, v_lng
+                )
+            self.assertLess(time.perf_counter() - started, 1.0)
+            self.assertEqual(len(chosen), 200)
+            self.assertEqual(len({v for _, v, _ in chosen}), 200)
+
+
+class DispatchRunTests(TransactionTestCase):
+    def setUp(self):
+        group, _ = Group.objects.get_or_create(name=DRIVER)
+        cust = User.objects.create_user(username="cust", password="x")
+        self.order = Order.objects.create(
+            user=cust, full_name="A", email="a@a.com", dest_lat=-1.25, dest_lng=36.85
+        )
+        self.near = self._driver("near", group, (-1.300, 36.800))
+        self.far = self._driver("far", group, (-1.200, 36.900))
+        stale = self._driver("stale", group, (-1.300, 36.800))
+        Delivery.objects.filter(driver=stale).update(
+            last_ping_at=timezone.now() - timedelta(hours=2)
+        )
+
+    def _driver(self, name, group, at):
+        user = User.objects.create_user(username=name, password="x")
+        group.user_set.add(user)
+        # a finished delivery carries the driver's last known fix
+        d = Delivery.objects.create(order=self.order, driver=user)
+        Delivery.objects.filter(pk=d.pk).update(
+            status=Delivery.Status.DELIVERED,
+            last_lat=at[0],
+            last_lng=at[1],
+            last_ping_at=timezone.now(),
+        )
+        return user
+
+    def _pending(self, at):
+        return Delivery.objects.create(
+            order=self.order, origin_lat=at[0], origin_lng=at[1]
+        )
+
+    def test_assigns_nearest_idle_drivers_in_bulk(self):
+        a = self._pending((-1.301, 36.801))
+        b = self._pending((-1.201, 36.901))
+        c = self._pending((-1.250, 36.850))  # no third fresh driver
+
+        result = dispatch.dispatch()
+
+        self.assertEqual(result.solver, "hungarian")
+        self.assertEqual(
+            sorted(result.assigned), [(a.pk, self.near.pk), (b.pk, self.far.pk)]
+        )
+        a.refresh_from_db()
+        c.refresh_from_db()
+        self.assertEqual(a.status, Delivery.Status.ASSIGNED)
+        self.assertIsNotNone(a.assigned_at)
+        self.assertEqual(c.status, Delivery.Status.PENDING)
+        notes = DeliveryEvent.objects.filter(type="assign").values_list(
+            "note", flat=True
+        )
+        self.assertTrue(all(n["auto"] for n in notes))
+        self.assertEqual(len(notes), 2)
+
+        # both drivers are busy now
+        self.assertEqual(dispatch.dispatch().assigned, [])
+
+    def test_assignments_are_broadcast_once_per_delivery(self):
+        a = self._pending((-1.301, 36.801))
+        b = self._pending((-1.201, 36.901))
+        sent = []
+
+        with mock.patch.object(realtime, "send_now", sent.extend):
+            dispatch.dispatch()
+
+        status = [m for g, m in sent if m["type"] == "status.update"]
+        self.assertEqual(
+            sorted((m["id"], m["driver_id"]) for m in status),
+            [(a.pk, self.near.pk), (b.pk, self.far.pk)],
+        )
+
+    def test_dry_run_writes_nothing(self):
+        d = self._pending((-1.301, 36.801))
+        result = dispatch.dispatch(dry_run=True)
+        self.assertEqual(result.assigned, [(d.pk, self.near.pk)])
+        d.refresh_from_db()
+        self.assertEqual(d.status, Delivery.Status.PENDING)
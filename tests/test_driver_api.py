@@ -84,7 +84,7 @@ class DriverAPITests(TestCase):
             status=Delivery.Status.ASSIGNED,
         )
         self.client.force_login(driver)
-        with patch("orders.views._osrm_route") as mock_route:
+        with patch("orders.services.routes._osrm_route") as mock_route:
             mock_route.return_value = {
                 "coords": [[36.82, -1.29], [36.83, -1.28]],
                 "distance_km": 1.0,
@@ -117,7 +117,7 @@ class DriverAPITests(TestCase):
             status=Delivery.Status.ASSIGNED,
         )
         self.client.force_login(driver)
-        with patch("orders.views._osrm_route") as mock_route:
+        with patch("orders.services.routes._osrm_route") as mock_route:
             mock_route.return_value = {
                 "coords": [[-1.30, 36.82], [-1.292066, 36.821945]],
                 "distance_km": 2.0,
@@ -0,0 +1,101 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from orders.models import Delivery, DeliveryPing, Order
+from orders.services.tracks import to_ms
+from users.constants import DRIVER
+
+User = get_user_model()
+URL = "/apis/driver/location/batch/"
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+)
+class DriverLocationBatchTests(TestCase):
+    def setUp(self):
+        self.driver = User.objects.create_user(username="drv", password="x")
+        Group.objects.get_or_create(name=DRIVER)[0].user_set.add(self.driver)
+        cust = User.objects.create_user(username="cust", password="x")
+        self.deliveries = []
+        for _ in range(2):
+            order = Order.objects.create(
+                user=cust, full_name="A", email="a@a.com", dest_lat=-1.2, dest_lng=36.8
+            )
+            self.deliveries.append(
+                Delivery.objects.create(
+                    order=order, driver=self.driver, status=Delivery.Status.ASSIGNED
+                )
+            )
+        self.client.force_login(self.driver)
+        self.t0 = timezone.now().replace(microsecond=0) - timedelta(minutes=30)
+
+    def _fixes(self, d, n):
+        return [
+            {
+                "delivery_id": d.pk,
+                "lat": -1.3 + i / 1000,
+                "lng": 36.8,
+                "ts": to_ms(self.t0 + timedelta(seconds=10 * i)),
+            }
+            for i in range(n)
+        ]
+
+    def test_batch_is_deduped_and_sets_latest_position(self):
+        a, b = self.deliveries
+        fixes = self._fixes(a, 5) + self._fixes(b, 3)
+        payload = {"fixes": fixes + fixes[:2] + [{"delivery_id": a.pk, "lat": 95}]}
+
+        r = self.client.post(URL, payload, content_type="application/json")
+
+        self.assertEqual(r.status_code, 200)
+        body = r.json()
+        self.assertEqual(body["accepted"], 8)
+        self.assertEqual(body["duplicates"], 2)
+        self.assertEqual([x["index"] for x in body["rejected"]], [10])
+        self.assertEqual(DeliveryPing.objects.count(), 8)
+        a.refresh_from_db()
+        self.assertEqual(a.status, Delivery.Status.EN_ROUTE)
+        self.assertEqual(a.last_ping_at, self.t0 + timedelta(seconds=40))
+        self.assertAlmostEqual(float(a.last_lat), -1.296)
+
+        # A retried upload is idempotent.
+        again = self.client.post(URL, {"fixes": fixes}, content_type="application/json")
+        self.assertEqual(again.json()["accepted"], 0)
+        self.assertEqual(DeliveryPing.objects.count(), 8)
+
+    def test_older_fixes_do_not_rewind_last_position(self):
+        a = self.deliveries[0]
+        now = timezone.now()
+        Delivery.objects.filter(pk=a.pk).update(
+            last_lat=1, last_lng=2, last_ping_at=now
+        )
+        self.client.post(
+            URL, {"fixes": self._fixes(a, 3)}, content_type="application/json"
+        )
+        a.refresh_from_db()
+        self.assertEqual(a.last_ping_at, now)
+        self.assertEqual(DeliveryPing.objects.filter(delivery=a).count(), 3)
+
+    def test_fixes_for_other_drivers_deliveries_are_dropped(self):
+        other = User.objects.create_user(username="other", password="x")
+        d = self.deliveries[0]
+        Delivery.objects.filter(pk=d.pk).update(driver=other)
+        r = self.client.post(
+            URL, {"fixes": self._fixes(d, 2)}, content_type="application/json"
+        )
+        self.assertEqual(r.json()["dropped"], 2)
+        self.assertFalse(DeliveryPing.objects.exists())
+
+    @override_settings(DRIVER_LOCATION_BATCH_MAX=3)
+    def test_oversized_batch_is_rejected(self):
+        r = self.client.post(
+            URL,
+            {"fixes": self._fixes(self.deliveries[0], 4)},
+            content_type="application/json",
+        )
+        self.assertEqual(r.status_code, 400)
@@ -0,0 +1,116 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from orders import eta
+from orders.models import Delivery, Order
+from users.constants import DRIVER
+
+User = get_user_model()
+
+HEADER = (
+    "delivery_id,driver_id,wh_lat,wh_lng,dest_lat,dest_lng,asgmt_hour,asgmt_dow,"
+    "picked_hour,picked_dow,dist_haversine_km,route_distance_km,duration_min\n"
+)
+
+
+def _write_training_csv(path: Path, n=200, seed=1):
+    rng = np.random.default_rng(seed)
+    dist = rng.uniform(0.5, 15, n)
+    route = dist * 1.4
+    hour = rng.integers(0, 24, n)
+    # 2.5 min per road km + 4 min handover, plus noise
+    dur = 2.5 * route + 4 + rng.normal(0, 0.5, n)
+    with open(path, "w") as f:
+        f.write(HEADER)
+        for i in range(n):
+            r = "" if i % 5 == 0 else f"{route[i]:.3f}"  # some rows lack routes
+            f.write(
+                f"{i},1,-1.3,36.8,-1.2,36.9,{hour[i]},2,{hour[i]},2,"
+                f"{dist[i]:.3f},{r},{dur[i]:.2f}\n"
+            )
+
+
+class EtaModelTests(TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(eta.reset_model)
+        self.csv = Path(self.tmp.name) / "eta_training.csv"
+        self.model_file = Path(self.tmp.name) / "eta_model.npz"
+        _write_training_csv(self.csv)
+
+    def test_ridge_fit_recovers_linear_trend_and_round_trips(self):
+        model = eta.train_from_csv(self.csv, alpha=0.1)
+        self.assertAlmostEqual(model.route_ratio, 1.4, places=2)
+        model.save(self.model_file)
+        loaded = eta.EtaModel.load(self.model_file)
+
+        X = eta.feature_matrix(
+            np.array([2.0, 10.0]), np.array([np.nan, 14.0]), [9, 9], [2, 2], 1.4
+        )
+        pred = loaded.predict(X)
+        np.testing.assert_allclose(pred, [2.5 * 2.8 + 4, 2.5 * 14 + 4], atol=1.0)
+
+    def test_reads_exports_without_route_distance_column(self):
+        legacy = Path(self.tmp.name) / "legacy.csv"
+        with open(legacy, "w") as f:
+            f.write("picked_hour,picked_dow,dist_haversine_km,duration_min\n")
+            f.write("9,2,3.0,14.5\n10,3,6.0,24.0\n")
+
+        X, y, ratio = eta.load_training_csv(legacy)
+
+        self.assertEqual(ratio, eta.DEFAULT_ROUTE_RATIO)
+        np.testing.assert_allclose(X[:, 1], [3.0 * ratio, 6.0 * ratio])
+        np.testing.assert_allclose(y, [14.5, 24.0])
+
+    def test_train_command_writes_model_used_by_driver_api(self):
+        call_command("train_eta_model", csv=str(self.csv), out=str(self.model_file))
+        driver = User.objects.create_user(username="drv", password="x")
+        Group.objects.get_or_create(name=DRIVER)[0].user_set.add(driver)
+        cust = User.objects.create_user(username="cust", password="x")
+        order = Order.objects.create(
+            user=cust, full_name="A", email="a@a.com", dest_lat=-1.25, dest_lng=36.85
+        )
+        d = Delivery.objects.create(
+            order=order,
+            driver=driver,
+            status=Delivery.Status.ASSIGNED,
+            origin_lat=-1.30,
+            origin_lng=36.80,
+            dest_lat=-1.25,
+            dest_lng=36.85,
+        )
+        done = Delivery.objects.create(
+            order=order, driver=driver, status=Delivery.Status.CANCELLED
+        )
+
+        with override_settings(ETA_MODEL_PATH=str(self.model_file)):
+            eta.reset_model()
+            self.client.force_login(driver)
+            rows = {
+                r["id"]: r for r in self.client.get("/apis/driver/deliveries/").json()
+            }
+
+        d.refresh_from_db()
+        km = float(
+            eta.haversine_km(
+                float(d.origin_lat),
+                float(d.origin_lng),
+                float(d.dest_lat),
+                float(d.dest_lng),
+            )
+        )
+        self.assertAlmostEqual(rows[d.pk]["eta_minutes"], 2.5 * km * 1.4 + 4, delta=1.5)
+        self.assertIsNone(rows[done.pk]["eta_minutes"])
+
+    def test_fallback_speed_without_model(self):
+        with override_settings(ETA_MODEL_PATH=str(self.model_file)):
+            eta.reset_model()
+            m = eta.predict_minutes([-1.30], [36.80], [-1.30], [36.90], [12.5])
+        self.assertAlmostEqual(float(m[0]), 12.5 / eta.FALLBACK_SPEED_KMH * 60)
@@ -0,0 +1,104 @@
+import csv
+from datetime import datetime, timedelta
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from orders import eta
+from orders.models import Delivery, Order
+from orders.services import eta_export
+from orders.services.routes import route_cache_key
+
+User = get_user_model()
+T0 = timezone.make_aware(datetime(2025, 3, 3, 9, 0))  # Monday 09:00 local
+
+
+class ExportEtaTrainingTests(TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(cache.clear)
+        self.driver = User.objects.create_user(username="drv", password="x")
+        cust = User.objects.create_user(username="cust", password="x")
+        self.order = Order.objects.create(
+            user=cust, full_name="A", email="a@a.com", dest_lat=-1.25, dest_lng=36.85
+        )
+
+    def _delivery(self, picked, minutes, origin=(-1.30, 36.80)):
+        d = Delivery.objects.create(
+            order=self.order,
+            driver=self.driver,
+            status=Delivery.Status.ASSIGNED,
+            origin_lat=origin[0],
+            origin_lng=origin[1],
+            dest_lat=-1.25,
+            dest_lng=36.85,
+        )
+        Delivery.objects.filter(pk=d.pk).update(
+            status=Delivery.Status.DELIVERED,
+            assigned_at=picked - timedelta(minutes=10),
+            picked_up_at=picked,
+            delivered_at=picked + timedelta(minutes=minutes),
+        )
+        return d
+
+    def test_csv_matches_training_header_and_features(self):
+        a = self._delivery(T0, 30)
+        self._delivery(T0, 500)  # outlier
+        cache.set(
+            route_cache_key(-1.30, 36.80, -1.25, 36.85),
+            {"coords": [], "distance_km": 11.2, "duration_min": 20},
+        )
+        out = Path(self.tmp.name) / "eta.csv"
+        call_command("export_eta_training", out=str(out), chunk_size=1)
+
+        with open(out) as f:
+            rows = list(csv.DictReader(f))
+        with open(Path(__file__).resolve().parents[1] / "eta_training.csv") as f:
+            expected_header = f.readline().strip().split(",")
+        self.assertEqual(list(rows[0].keys()), expected_header)
+        self.assertEqual(len(rows), 1)
+        row = rows[0]
+        self.assertEqual(int(row["delivery_id"]), a.pk)
+        self.assertEqual((row["picked_hour"], row["picked_dow"]), ("9", "0"))
+        self.assertEqual(row["asgmt_hour"], "8")
+        self.assertEqual(float(row["route_distance_km"]), 11.2)
+        self.assertAlmostEqual(
+            float(row["dist_haversine_km"]),
+            float(eta.haversine_km(-1.30, 36.80, -1.25, 36.85)),
+            places=3,
+        )
+        self.assertEqual(float(row["duration_min"]), 30.0)
+
+    def test_since_appends_npz_columns(self):
+        self._delivery(T0, 20)
+        out = Path(self.tmp.name) / "eta.npz"
+        call_command("export_eta_training", out=str(out))
+        newer = self._delivery(T0 + timedelta(days=2), 25, origin=(-1.31, 36.81))
+        call_command(
+            "export_eta_training",
+            out=str(out),
+            since=(T0 + timedelta(days=1)).isoformat(),
+            append=True,
+        )
+
+        with np.load(out) as z:
+            self.assertEqual(z["delivery_id"][-1], newer.pk)
+            self.assertEqual(len(z["duration_min"]), 2)
+            self.assertTrue(np.isnan(z["route_distance_km"]).all())
+        X, y, _ = eta.load_training_csv(out)
+        self.assertEqual(X.shape, (2, len(eta.FEATURES)))
+
+    def test_split_range_covers_window_without_gaps(self):
+        end = T0 + timedelta(days=10)
+        windows = eta_export.split_range(T0, end, 4)
+        self.assertEqual(len(windows), 4)
+        self.assertEqual((windows[0][0], windows[-1][1]), (T0, end))
+        for (_, b), (c, _) in zip(windows, windows[1:]):
+            self.assertEqual(b, c)
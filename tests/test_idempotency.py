@@ -0,0 +1,127 @@
+import time
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from payments import idempotency
+from payments.idempotency import accept_once, idempotent
+from payments.models import IdempotencyKey
+
+
+class FakeRedis:
+    """The slice of redis-py used by ``RedisStore``: SET NX EX and DELETE."""
+
+    def __init__(self):
+        self.data = {}
+        self.down = False
+
+    def _live(self, name):
+        value, expires = self.data.get(name, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(name, None)
+            return None
+        return value
+
+    def set(self, name, value, nx=False, ex=None):
+        if self.down:
+            raise ConnectionError("redis down")
+        if nx and self._live(name) is not None:
+            return None
+        self.data[name] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def get(self, name):
+        if self.down:
+            raise ConnectionError("redis down")
+        return self._live(name)
+
+    def delete(self, *names):
+        return sum(self.data.pop(n, None) is not None for n in names)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch, settings):
+    client = FakeRedis()
+    monkeypatch.setattr(idempotency, "_redis_client", lambda: client)
+    settings.IDEMPOTENCY_STORE = "payments.idempotency.RedisStore"
+    return client
+
+
+@pytest.mark.django_db
+def test_redis_answers_replays_without_touching_the_database(fake_redis):
+    assert accept_once(scope="webhook:test", key="k1") is True
+    assert IdempotencyKey.objects.filter(scope="webhook:test", key="k1").exists()
+
+    with CaptureQueriesContext(connection) as ctx:
+        assert accept_once(scope="webhook:test", key="k1") is False
+        assert accept_once(scope="webhook:test", key="k1") is False
+    assert len(ctx.captured_queries) == 0
+
+
+@pytest.mark.django_db
+def test_database_stays_the_judge_after_redis_forgets(fake_redis):
+    assert accept_once(scope="s", key="k") is True
+    fake_redis.data.clear()  # expired / flushed
+
+    assert accept_once(scope="s", key="k") is False
+    assert IdempotencyKey.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_redis_outage_falls_back_to_the_database(fake_redis):
+    fake_redis.down = True
+    assert accept_once(scope="s", key="k") is True
+    assert accept_once(scope="s", key="k") is False
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "store", ["payments.idempotency.DatabaseStore", "payments.idempotency.RedisStore"]
+)
+def test_idempotent_records_first_result_and_releases_on_failure(
+    fake_redis, settings, store
+):
+    settings.IDEMPOTENCY_STORE = store
+    calls = []
+
+    @idempotent(scope="job")
+    def job(*, value, idempotency_key=None):
+        calls.append(value)
+        if value == "boom":
+            raise RuntimeError(value)
+        return value
+
+    with pytest.raises(RuntimeError):
+        job(value="boom", idempotency_key="k")
+    assert not IdempotencyKey.objects.filter(scope="job").exists()
+
+    assert job(value="ok", idempotency_key="k") == "ok"
+    row = IdempotencyKey.objects.get(scope="job", key="k")
+    assert row.response_hash == idempotency.body_sha256(b"ok")
+
+    # replays still run (the function is deterministic per key) but write nothing
+    assert job(value="ok", idempotency_key="k") == "ok"
+    assert calls == ["boom", "ok", "ok"]
+    assert IdempotencyKey.objects.filter(scope="job").count() == 1
+
+
+@pytest.mark.django_db
+def test_replays_of_committed_keys_skip_the_database(
+    fake_redis, django_capture_on_commit_callbacks
+):
+    calls = []
+
+    @idempotent(scope="job")
+    def job(*, idempotency_key=None):
+        calls.append(idempotency_key)
+        return "ok"
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert job(idempotency_key="k") == "ok"
+    assert fake_redis.get("idem:job:k") == idempotency.RedisStore.DONE
+
+    with CaptureQueriesContext(connection) as ctx:
+        assert job(idempotency_key="k") == "ok"
+    assert len(ctx.captured_queries) == 0
+    assert calls == ["k", "k"]
@@ -0,0 +1,110 @@
+import smtplib
+from datetime import timedelta
+
+import pytest
+from django.core import mail
+from django.utils import timezone
+
+from notifications import outbox
+from notifications.models import OutboundEmail
+from notifications.tasks import send_outbound_email
+from payments.notify import send_payment_email
+
+
+class FlakyBackend:
+    """locmem-like backend that refuses the addresses in ``refused``."""
+
+    refused: set = set()
+    opened = 0
+
+    def __init__(self, fail_silently=False, **kwargs):
+        pass
+
+    def open(self):
+        FlakyBackend.opened += 1
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        for msg in messages:
+            if set(msg.to) & self.refused:
+                raise smtplib.SMTPRecipientsRefused({msg.to[0]: (550, b"no")})
+            mail.outbox.append(msg)
+        return len(messages)
+
+
+@pytest.fixture
+def flaky(settings):
+    settings.EMAIL_BACKEND = f"{__name__}.FlakyBackend"
+    FlakyBackend.refused = set()
+    FlakyBackend.opened = 0
+    return FlakyBackend
+
+
+@pytest.mark.django_db
+def test_callers_only_enqueue_and_the_worker_is_kicked_on_commit(
+    settings, monkeypatch, django_capture_on_commit_callbacks
+):
+    settings.EMAIL_OUTBOX_SEND_INLINE = False
+    kicked = []
+    monkeypatch.setattr(send_outbound_email, "delay", lambda *a: kicked.append(a))
+
+    with django_capture_on_commit_callbacks(execute=True):
+        send_payment_email("a@example.com", 7, "10.00", "ref", "received")
+
+    assert not mail.outbox
+    assert kicked == [()]
+    row = OutboundEmail.objects.get()
+    assert row.to_email == "a@example.com" and "Order 7" in row.subject
+    assert row.html_body and row.reply_to
+
+
+@pytest.mark.django_db
+def test_drain_sends_batch_over_one_connection(flaky):
+    for i in range(3):
+        outbox.enqueue(f"u{i}@example.com", "s", "b", "<p>b</p>")
+
+    counts = outbox.drain()
+
+    assert counts == {"claimed": 3, "sent": 3}
+    assert flaky.opened == 1
+    assert len(mail.outbox) == 3 and mail.outbox[0].alternatives
+    assert not OutboundEmail.objects.exclude(status="sent").exists()
+
+
+@pytest.mark.django_db
+def test_refused_recipient_retries_then_goes_dead(settings, flaky):
+    settings.EMAIL_OUTBOX_MAX_ATTEMPTS = 2
+    flaky.refused = {"bad@example.com"}
+    bad = outbox.enqueue("bad@example.com", "s", "b")
+    outbox.enqueue("ok@example.com", "s", "b")
+    now = timezone.now()
+
+    assert outbox.drain(now=now) == {"claimed": 2, "retry": 1, "sent": 1}
+    bad.refresh_from_db()
+    assert bad.status == "pending" and bad.attempts == 1
+    assert bad.next_attempt_at > now
+    assert outbox.drain(now=now)["claimed"] == 0  # backing off
+
+    assert outbox.drain(now=bad.next_attempt_at)["dead"] == 1
+    bad.refresh_from_db()
+    assert bad.status == "dead" and "SMTPRecipientsRefused" in bad.last_error
+
+
+@pytest.mark.django_db
+def test_rate_limits_pace_sends_and_defer_busy_recipients(settings):
+    settings.EMAIL_OUTBOX_PER_RECIPIENT_PER_HOUR = 2
+    settings.EMAIL_OUTBOX_MAX_PER_SECOND = 4
+    for _ in range(3):
+        outbox.enqueue("same@example.com", "s", "b")
+    outbox.enqueue("other@example.com", "s", "b")
+    naps = []
+
+    counts = outbox.drain(sleep_fn=naps.append)
+
+    assert counts == {"claimed": 4, "sent": 3, "throttled": 1}
+    assert naps == [0.25, 0.25]
+    held = OutboundEmail.objects.get(status="pending")
+    assert held.attempts == 0
+    assert held.next_attempt_at > timezone.now() + timedelta(minutes=29)
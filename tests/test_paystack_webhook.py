@@ -11,9 +11,9 @@ from orders.models import Order, OrderItem, PaymentEvent, Transaction
 from product_app.models import Category, Product, ProductStock, Warehouse
 
 
-@override_settings(PAYSTACK_SECRET_KEY="secret")
+@override_settings(PAYSTACK_SECRET_KEY="secret", WEBHOOK_PROCESS_INLINE=True)
 class PaystackWebhookTests(TestCase):
-    @patch("orders.views.assign_warehouses_and_update_stock")
+    @patch("orders.services.webhooks.assign_warehouses_and_update_stock")
     def test_charge_success_updates_records(self, mock_assign):
         User = get_user_model()
         user = User.objects.create_user(
@@ -58,12 +58,13 @@ class PaystackWebhookTests(TestCase):
             }
         ).encode()
         sig = hmac.new(b"secret", body, hashlib.sha512).hexdigest()
-        resp = self.client.post(
-            reverse("orders:paystack_webhook"),
-            body,
-            content_type="application/json",
-            HTTP_X_PAYSTACK_SIGNATURE=sig,
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(
+                reverse("orders:paystack_webhook"),
+                body,
+                content_type="application/json",
+                HTTP_X_PAYSTACK_SIGNATURE=sig,
+            )
         self.assertEqual(resp.status_code, 200)
         tx.refresh_from_db()
         order.refresh_from_db()
@@ -0,0 +1,131 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from orders.models import Delivery, DeliveryEvent, DeliveryPing, Order
+from orders.services.ping_buffer import Fix, PingBuffer
+
+User = get_user_model()
+
+
+class PingBufferTests(TestCase):
+    def setUp(self):
+        self.driver = User.objects.create_user(username="drv", password="x")
+        self.cust = User.objects.create_user(username="cust", password="x")
+
+    def _delivery(self, status=Delivery.Status.ASSIGNED):
+        order = Order.objects.create(
+            user=self.cust,
+            full_name="A",
+            email="a@a.com",
+            dest_lat=-1.25,
+            dest_lng=36.85,
+        )
+        return Delivery.objects.create(order=order, driver=self.driver, status=status)
+
+    def _fixes(self, deliveries, per_delivery):
+        t0 = timezone.now() - timedelta(minutes=5)
+        return [
+            Fix(
+                d.pk,
+                self.driver.pk,
+                Decimal("-1.300000") + Decimal(i) / 1000,
+                Decimal("36.800000"),
+                t0 + timedelta(seconds=i),
+            )
+            for d in deliveries
+            for i in range(per_delivery)
+        ]
+
+    def test_flush_bulk_writes_and_sets_newest_position(self):
+        d = self._delivery()
+        buf = PingBuffer(max_rows=100, interval=60)
+        fixes = self._fixes([d], 3)
+        for f in reversed(fixes):  # arrival order must not matter
+            buf.add(f)
+
+        moved = buf.flush()
+
+        self.assertEqual(moved, [d.pk])
+        self.assertEqual(buf.depth, 0)
+        d.refresh_from_db()
+        self.assertEqual(d.status, Delivery.Status.EN_ROUTE)
+        self.assertEqual(d.last_lat, fixes[-1].lat)
+        self.assertEqual(d.last_ping_at, fixes[-1].at)
+        self.assertEqual(DeliveryPing.objects.filter(delivery=d).count(), 3)
+        self.assertEqual(
+            DeliveryEvent.objects.filter(delivery=d, type="position").count(), 3
+        )
+        self.assertEqual(
+            set(DeliveryPing.objects.values_list("created_at", flat=True)),
+            {f.at for f in fixes},
+        )
+
+    def test_fixes_from_unassigned_driver_are_dropped(self):
+        d = self._delivery()
+        other = User.objects.create_user(username="other", password="x")
+        buf = PingBuffer(max_rows=100, interval=60)
+        buf.add(Fix(d.pk, other.pk, Decimal("1"), Decimal("2"), timezone.now()))
+
+        self.assertEqual(buf.flush(), [])
+        self.assertFalse(DeliveryPing.objects.exists())
+        d.refresh_from_db()
+        self.assertIsNone(d.last_lat)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        small = [self._delivery(Delivery.Status.EN_ROUTE)]
+        large = [self._delivery(Delivery.Status.EN_ROUTE) for _ in range(10)]
+
+        def queries_for(deliveries, per_delivery):
+            buf = PingBuffer(max_rows=1000, interval=60)
+            for f in self._fixes(deliveries, per_delivery):
+                buf.add(f)
+            with CaptureQueriesContext(connection) as ctx:
+                buf.flush()
+            return len(ctx.captured_queries)
+
+        self.assertEqual(queries_for(small, 1), queries_for(large, 10))
+        self.assertEqual(DeliveryPing.objects.count(), 1 + 100)
+
+    def test_stationary_fixes_only_refresh_last_ping(self):
+        d = self._delivery(Delivery.Status.EN_ROUTE)
+        t0 = timezone.now() - timedelta(minutes=5)
+        buf = PingBuffer(max_rows=100, interval=60)
+        for i in range(3):
+            buf.add(
+                Fix(
+                    d.pk,
+                    self.driver.pk,
+                    Decimal("-1.3"),
+                    Decimal("36.8"),
+                    t0 + timedelta(seconds=i),
+                )
+            )
+        buf.flush()
+        buf.add(
+            Fix(
+                d.pk,
+                self.driver.pk,
+                Decimal("-1.3"),
+                Decimal("36.8"),
+                t0 + timedelta(seconds=9),
+            )
+        )
+        buf.flush()
+
+        self.assertEqual(DeliveryPing.objects.filter(delivery=d).count(), 1)
+        self.assertEqual(DeliveryEvent.objects.filter(delivery=d).count(), 1)
+        d.refresh_from_db()
+        self.assertEqual(d.last_ping_at, t0 + timedelta(seconds=9))
+
+    def test_add_reports_when_size_flush_is_due(self):
+        buf = PingBuffer(max_rows=2, interval=60)
+        d = self._delivery()
+        f1, f2 = self._fixes([d], 2)
+        self.assertFalse(buf.add(f1))
+        self.assertTrue(buf.add(f2))
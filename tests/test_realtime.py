@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+from core import commit_batch, realtime
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    calls = []
+
+    def record(messages):
+        calls.append((threading.current_thread().name, list(messages)))
+
+    monkeypatch.setattr(realtime, "send_now", record)
+    return calls
+
+
+@pytest.mark.django_db(transaction=True)
+def test_messages_wait_for_commit_and_skip_rollbacks(sent):
+    with transaction.atomic():
+        realtime.publish("g", {"type": "x", "n": 1})
+        try:
+            with transaction.atomic():
+                realtime.publish("g", {"type": "x", "n": 2})
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        assert sent == []
+    try:
+        with transaction.atomic():
+            realtime.publish("g", {"type": "x", "n": 3})
+            raise RuntimeError
+    except RuntimeError:
+        pass
+
+    assert [m for _, batch in sent for _, m in batch] == [{"type": "x", "n": 1}]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_batch_scope_sends_once_at_exit(sent):
+    with commit_batch.batch():
+        for n in range(3):
+            with transaction.atomic():
+                realtime.publish(f"g{n}", {"type": "x"})
+        realtime.publish("g3", {"type": "x"})  # autocommit: staged at once
+        assert sent == []
+
+    assert len(sent) == 1
+    assert [g for g, _ in sent[0][1]] == ["g0", "g1", "g2", "g3"]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_batch_flushes_early_at_max_size(sent, settings):
+    settings.REALTIME_MAX_BATCH = 2
+    with commit_batch.batch():
+        for n in range(5):
+            realtime.publish("g", {"type": "x", "n": n})
+
+    assert [len(b) for _, b in sent] == [2, 2, 1]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_nonblocking_mode_sends_from_background_thread(sent, settings):
+    settings.REALTIME_NONBLOCKING = True
+    realtime.publish("g", {"type": "x"})
+    realtime._executor().submit(lambda: None).result(timeout=5)
+
+    assert sent and sent[0][0].startswith("realtime-publish")
+
+
+@pytest.mark.django_db(transaction=True)
+def test_send_now_reaches_channel_layer(settings):
+    settings.CHANNEL_LAYERS = {
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    }
+    layer = get_channel_layer()
+    channel = async_to_sync(layer.new_channel)()
+    async_to_sync(layer.group_add)("user_7", channel)
+
+    from notifications.ws import push_to_user
+
+    with transaction.atomic():
+        push_to_user(7, {"title": "hi"})
+
+    msg = async_to_sync(layer.receive)(channel)
+    assert msg == {"type": "notify", "payload": {"title": "hi"}}
@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from payments import tasks
+from payments.enums import Gateway, TxnStatus
+from payments.models import Transaction
+from payments.services import reconcile
+from payments.services.reconcile import VerifyResult
+from tests.test_bulk_reconcile import _pending_txns
+
+
+@pytest.fixture
+def verified(monkeypatch, settings):
+    settings.PAYSTACK_SECRET_KEY = "sk_test"
+    seen = []
+
+    def fake_fetch(txn, reference, *, session=None, timeout=20):
+        seen.append(reference)
+        return VerifyResult(status="pending", reference=reference, raw={})
+
+    monkeypatch.setattr(reconcile, "_fetch_paystack_status", fake_fetch)
+    return seen
+
+
+@pytest.mark.django_db
+def test_claims_in_id_order_within_limit_and_chunks(verified):
+    txns = _pending_txns(5)
+
+    summary = tasks.reconcile_stale_transactions(
+        max_age_mins=30, limit=4, chunk_size=3, inline=True
+    )
+
+    assert summary["claimed"] == 4 and summary["chunks"] == 2
+    assert summary["gateways"] == {Gateway.PAYSTACK: 4}
+    assert sorted(verified) == sorted(t.reference for t in txns[:4])
+    claimed = Transaction.objects.filter(reconcile_claimed_at__isnull=False)
+    assert sorted(claimed.values_list("pk", flat=True)) == [t.pk for t in txns[:4]]
+
+
+@pytest.mark.django_db
+def test_claimed_rows_are_skipped_until_the_lease_expires(verified, settings):
+    _pending_txns(2)
+    tasks.reconcile_stale_transactions(inline=True)
+    verified.clear()
+
+    again = tasks.reconcile_stale_transactions(inline=True)
+    assert again["claimed"] == 0 and verified == []
+
+    Transaction.objects.update(
+        reconcile_claimed_at=timezone.now() - timedelta(minutes=60)
+    )
+    settings.RECONCILE_CLAIM_LEASE_MINUTES = 15
+    assert tasks.reconcile_stale_transactions(inline=True)["claimed"] == 2
+
+
+@pytest.mark.django_db
+def test_age_and_dry_run_are_honoured(verified):
+    old, young, card = _pending_txns(3)
+    Transaction.objects.filter(pk=young.pk).update(created_at=timezone.now())
+    Transaction.objects.filter(pk=card.pk).update(gateway=Gateway.STRIPE)
+
+    dry = tasks.reconcile_stale_transactions(max_age_mins=30, dry_run=True, inline=True)
+
+    assert dry["claimed"] == 2
+    assert {r["gateway"]: r["counts"] for r in dry["results"]} == {
+        Gateway.PAYSTACK: {"pending": 1},
+        Gateway.STRIPE: {"would_fail": 1},
+    }
+    assert not Transaction.objects.filter(reconcile_claimed_at__isnull=False).exists()
+    card.refresh_from_db()
+    assert card.status == TxnStatus.PENDING
+
+    tasks.reconcile_stale_transactions(max_age_mins=30, inline=True)
+    card.refresh_from_db()
+    young.refresh_from_db()
+    assert card.status == TxnStatus.FAILED
+    assert young.reconcile_claimed_at is None
+
+
+@pytest.mark.django_db
+def test_command_passes_options_through(verified, capsys):
+    _pending_txns(3)
+
+    call_command("reconcile_payments", "--sync", "--limit", "2", "--max-age-mins", "30")
+
+    assert "claimed=2" in capsys.readouterr().out
@@ -0,0 +1,104 @@
+import gzip
+import json
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from orders.models import PaymentEvent as WebhookEvent
+from payments.models import AuditLog, IdempotencyKey
+from payments.services import retention
+
+
+def _age(model, rows, days):
+    model.objects.filter(pk__in=[r.pk for r in rows]).update(
+        created_at=timezone.now() - timedelta(days=days)
+    )
+
+
+@pytest.mark.django_db
+def test_purges_only_expired_rows_in_keyset_chunks():
+    old = [IdempotencyKey.objects.create(scope="s", key=f"o{i}") for i in range(5)]
+    fresh = IdempotencyKey.objects.create(scope="s", key="fresh")
+    _age(IdempotencyKey, old, 30)
+    naps = []
+
+    report = retention.purge(
+        retention.get_policy("payments.IdempotencyKey"),
+        chunk_size=2,
+        sleep=0.5,
+        sleep_fn=naps.append,
+    )
+
+    assert report.deleted == 5 and report.chunks == 3
+    assert naps == [0.5, 0.5]  # between chunks only
+    assert list(IdempotencyKey.objects.values_list("pk", flat=True)) == [fresh.pk]
+    assert report.as_dict()["per_second"] >= 0
+
+
+@pytest.mark.django_db
+def test_dry_run_counts_without_deleting(settings):
+    rows = [AuditLog.objects.create(event="X") for _ in range(3)]
+    _age(AuditLog, rows, 400)
+    settings.RETENTION_DAYS = {"payments.AuditLog": 500}
+
+    policy = retention.get_policy("payments.AuditLog")
+    assert retention.purge(policy, dry_run=True).deleted == 0
+    settings.RETENTION_DAYS = {}
+    report = retention.purge(policy, dry_run=True)
+    assert report.deleted == 3 and report.dry_run
+    assert AuditLog.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_archives_to_gzip_jsonl_before_deleting(tmp_path):
+    rows = [AuditLog.objects.create(event="PAID", message=f"m{i}") for i in range(3)]
+    _age(AuditLog, rows, 400)
+
+    report = retention.purge(
+        retention.get_policy("payments.AuditLog"),
+        archive_dir=str(tmp_path),
+        chunk_size=2,
+        sleep=0,
+    )
+
+    assert report.deleted == report.archived == 3
+    with gzip.open(report.archive_path, "rt") as fh:
+        archived = [json.loads(line) for line in fh]
+    assert [r["message"] for r in archived] == ["m0", "m1", "m2"]
+    assert not AuditLog.objects.exists()
+
+
+@pytest.mark.django_db
+def test_unprocessed_webhook_events_are_kept():
+    kept = WebhookEvent.objects.create(
+        provider="paystack", reference="r", body={}, body_sha256="a" * 64
+    )
+    done = WebhookEvent.objects.create(
+        provider="paystack",
+        reference="r",
+        body={},
+        body_sha256="b" * 64,
+        status=WebhookEvent.Status.PROCESSED,
+    )
+    WebhookEvent.objects.update(received_at=timezone.now() - timedelta(days=365))
+
+    report = retention.purge(retention.get_policy("orders.PaymentEvent"), sleep=0)
+
+    assert report.deleted == 1
+    assert list(WebhookEvent.objects.values_list("pk", flat=True)) == [kept.pk]
+    assert not WebhookEvent.objects.filter(pk=done.pk).exists()
+
+
+@pytest.mark.django_db
+def test_purge_idempotency_keys_command_reports_throughput(capsys):
+    rows = [IdempotencyKey.objects.create(scope="s", key=f"k{i}") for i in range(2)]
+    _age(IdempotencyKey, rows, 3)
+
+    call_command("purge_idempotency_keys", "--days", "2", "--sleep", "0")
+
+    out = capsys.readouterr().out
+    assert "Purged 2 idempotency keys older than 2 days" in out
+    assert "rows/s" in out
+    assert not IdempotencyKey.objects.exists()
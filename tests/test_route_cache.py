@@ -0,0 +1,104 @@
+import threading
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from orders.models import Delivery, Order
+from orders.services import routes
+
+User = get_user_model()
+
+ROUTE = {
+    "coords": [[-1.30, 36.82], [-1.25, 36.85]],
+    "distance_km": 7.0,
+    "duration_min": 12.0,
+}
+
+
+@override_settings(GEOAPIFY_API_KEY=None)
+class RouteCacheTests(TestCase):
+    def setUp(self):
+        routes._LOCAL.clear()
+        cache.clear()
+
+    def test_local_lru_is_bounded(self):
+        lru = routes._LocalLRU(maxsize=2)
+        lru.set("a", {"n": 1}, ttl=60)
+        lru.set("b", {"n": 2}, ttl=60)
+        lru.get("a")  # refresh "a" so "b" is the eviction candidate
+        lru.set("c", {"n": 3}, ttl=60)
+        self.assertEqual(len(lru), 2)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.get("a"), {"n": 1})
+
+    def test_shared_cache_serves_other_workers(self):
+        with patch(
+            "orders.services.routes._osrm_route", return_value=dict(ROUTE)
+        ) as up:
+            routes.get_route(-1.30, 36.82, -1.25, 36.85)
+            routes._LOCAL.clear()  # simulate a different worker process
+            payload = routes.get_route(-1.30, 36.82, -1.25, 36.85)
+        self.assertEqual(up.call_count, 1)
+        self.assertEqual(payload["distance_km"], 7.0)
+
+    def test_concurrent_requests_are_coalesced(self):
+        def slow_route(*args):
+            time.sleep(0.2)
+            return dict(ROUTE)
+
+        results = []
+        with patch("orders.services.routes._osrm_route", side_effect=slow_route) as up:
+            threads = [
+                threading.Thread(
+                    target=lambda: results.append(
+                        routes.get_route(-1.30, 36.82, -1.25, 36.85)
+                    )
+                )
+                for _ in range(8)
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(up.call_count, 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(r["distance_km"] == 7.0 for r in results))
+
+    def test_mark_assigned_precomputes_route(self):
+        driver = User.objects.create_user(username="drv", password="x")
+        cust = User.objects.create_user(username="cust", password="x")
+        order = Order.objects.create(
+            user=cust,
+            full_name="A",
+            email="a@a.com",
+            dest_lat=-1.25,
+            dest_lng=36.85,
+        )
+        d = Delivery.objects.create(
+            order=order,
+            origin_lat=-1.30,
+            origin_lng=36.82,
+            dest_lat=-1.25,
+            dest_lng=36.85,
+        )
+
+        submitted = []
+
+        class _SyncExecutor:
+            def submit(self, fn, *args):
+                submitted.append(args)
+
+        with patch("orders.services.routes._executor", return_value=_SyncExecutor()):
+            with self.captureOnCommitCallbacks(execute=True):
+                d.mark_assigned(driver)
+        self.assertEqual(submitted, [(d.pk,)])
+
+        with patch(
+            "orders.services.routes._osrm_route", return_value=dict(ROUTE)
+        ) as up:
+            routes.precompute_delivery_route(d.pk)
+            routes.get_route(-1.30, 36.82, -1.25, 36.85)
+        self.assertEqual(up.call_count, 1)
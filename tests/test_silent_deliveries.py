@@ -0,0 +1,129 @@
+from datetime import timedelta
+
+import pytest
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from orders.models import Delivery, DeliveryEvent, OrderItem
+from orders.services.stale_deliveries import detect_silent_deliveries
+from tests.test_vendor_live import _vendor_delivery
+
+
+def _activate(d, driver, status, last_ping_at):
+    Delivery.objects.filter(pk=d.pk).update(
+        driver=driver, status=status, last_lat=0, last_lng=0, last_ping_at=last_ping_at
+    )
+
+
+def _next_alert(layer, channel):
+    while True:
+        msg = async_to_sync(layer.receive)(channel)
+        if msg["type"] == "vendor.event":
+            return msg
+
+
+@pytest.fixture
+def vendor_setup(settings):
+    settings.CHANNEL_LAYERS = {
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    }
+    cache.clear()
+    owner, d = _vendor_delivery()
+    driver = get_user_model().objects.create_user(username="drv", password="x")
+    layer = get_channel_layer()
+    channel = async_to_sync(layer.new_channel)()
+    async_to_sync(layer.group_add)(f"vendor.{owner.pk}", channel)
+    yield owner, d, driver, layer, channel
+    cache.clear()
+
+
+@pytest.mark.django_db
+def test_silent_delivery_alerts_once_per_silence(
+    vendor_setup, django_capture_on_commit_callbacks
+):
+    owner, d, driver, layer, channel = vendor_setup
+    now = timezone.now()
+    _activate(d, driver, Delivery.Status.EN_ROUTE, now - timedelta(minutes=8))
+    fresh = Delivery.objects.create(order=d.order)
+    _activate(fresh, driver, Delivery.Status.ASSIGNED, now - timedelta(minutes=1))
+    done = Delivery.objects.create(order=d.order)
+    _activate(done, driver, Delivery.Status.DELIVERED, now - timedelta(minutes=30))
+
+    with django_capture_on_commit_callbacks(execute=True):
+        result = detect_silent_deliveries(stale_after_minutes=5, now=now)
+    assert result["alerted"] == 1
+    ev = DeliveryEvent.objects.get(type="stale")
+    assert ev.delivery_id == d.pk and ev.note["silent_s"] == 480
+    msg = _next_alert(layer, channel)
+    assert msg["t"] == "delivery.stale"
+    assert [a["id"] for a in msg["deliveries"]] == [d.pk]
+
+    # same silence on the next run: no new alert
+    later = now + timedelta(minutes=1)
+    assert detect_silent_deliveries(stale_after_minutes=5, now=later)["alerted"] == 0
+    assert DeliveryEvent.objects.filter(type="stale").count() == 1
+
+    # driver reconnects, then drops out again: alerted again
+    _activate(d, driver, Delivery.Status.EN_ROUTE, later)
+    again = later + timedelta(minutes=6)
+    detect_silent_deliveries(stale_after_minutes=5, now=again)
+    assert DeliveryEvent.objects.filter(type="stale", delivery=d).count() == 2
+
+
+@pytest.mark.django_db
+def test_detector_batches_queries(vendor_setup, django_capture_on_commit_callbacks):
+    owner, d, driver, layer, channel = vendor_setup
+    now = timezone.now()
+    order = d.order
+    batch = [Delivery(order=order) for _ in range(30)]
+    Delivery.objects.bulk_create(batch)
+    Delivery.objects.filter(order=order).update(
+        driver=driver,
+        status=Delivery.Status.EN_ROUTE,
+        last_lat=0,
+        last_lng=0,
+        last_ping_at=now - timedelta(minutes=10),
+    )
+    assert OrderItem.objects.filter(order=order).exists()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        with CaptureQueriesContext(connection) as ctx:
+            result = detect_silent_deliveries(
+                stale_after_minutes=5, chunk_size=100, now=now
+            )
+    assert result == {"silent": 31, "alerted": 31, "chunks": 1}
+    # range scan + vendor mapping + one bulk insert
+    assert len(ctx.captured_queries) <= 4
+    msg = _next_alert(layer, channel)
+    assert len(msg["deliveries"]) == 31
+
+
+@pytest.mark.django_db
+def test_driver_that_never_pinged_is_silent_since_assignment(
+    vendor_setup, django_capture_on_commit_callbacks
+):
+    owner, d, driver, layer, channel = vendor_setup
+    now = timezone.now()
+    Delivery.objects.filter(pk=d.pk).update(
+        driver=driver,
+        status=Delivery.Status.ASSIGNED,
+        assigned_at=now - timedelta(minutes=7),
+    )
+    just_assigned = Delivery.objects.create(order=d.order)
+    Delivery.objects.filter(pk=just_assigned.pk).update(
+        driver=driver, status=Delivery.Status.ASSIGNED, assigned_at=now
+    )
+
+    with django_capture_on_commit_callbacks(execute=True):
+        result = detect_silent_deliveries(stale_after_minutes=5, now=now)
+
+    assert result["alerted"] == 1
+    ev = DeliveryEvent.objects.get(type="stale")
+    assert ev.delivery_id == d.pk
+    assert ev.note["silent_s"] == 420 and ev.note["last_ping_at"] is None
+    assert detect_silent_deliveries(stale_after_minutes=5, now=now)["alerted"] == 0
@@ -0,0 +1,81 @@
+import pytest
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from orders.models import Order, OrderItem
+from orders.services.stock import InsufficientStock, allocate
+from payments.models import AuditLog
+from payments.selectors import safe_decrement_stock
+from product_app.models import Category, Product, ProductStock, Warehouse
+
+
+@pytest.fixture
+def catalog(db):
+    cat = Category.objects.create(name="c", slug="c")
+    products = [
+        Product.objects.create(category=cat, name=f"p{i}", slug=f"p{i}", price=10)
+        for i in range(3)
+    ]
+    wh = Warehouse.objects.create(name="w", latitude=1.0, longitude=36.0)
+    for p in products:
+        ProductStock.objects.create(product=p, warehouse=wh, quantity=5)
+    return products, wh
+
+
+def _qty(product, wh):
+    return ProductStock.objects.get(product=product, warehouse=wh).quantity
+
+
+def test_allocates_with_one_lock_query_and_one_update(catalog):
+    (a, b, c), wh = catalog
+
+    with CaptureQueriesContext(connection) as ctx:
+        left = allocate([(a.pk, wh.pk, 2), (b.pk, wh.pk, 1), (a.pk, wh.pk, 1)])
+
+    updates = [q for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+    selects = [q for q in ctx.captured_queries if q["sql"].startswith("SELECT")]
+    assert len(updates) == 1 and len(selects) == 1
+    assert left == {(a.pk, wh.pk): 2, (b.pk, wh.pk): 4}
+    assert (_qty(a, wh), _qty(b, wh), _qty(c, wh)) == (2, 4, 5)
+
+
+def test_short_line_changes_nothing_and_reports_every_shortfall(catalog):
+    (a, b, c), wh = catalog
+    other = Warehouse.objects.create(name="x", latitude=-1.3, longitude=36.8)
+
+    with pytest.raises(InsufficientStock) as exc:
+        allocate([(a.pk, wh.pk, 1), (b.pk, wh.pk, 9), (c.pk, other.pk, 1)])
+
+    assert exc.value.short == {(b.pk, wh.pk): (5, 9), (c.pk, other.pk): (0, 1)}
+    assert (_qty(a, wh), _qty(b, wh)) == (5, 5)
+
+
+def test_safe_decrement_stock_keeps_validation_error_and_audit_rows(
+    catalog, django_user_model, django_capture_on_commit_callbacks
+):
+    (a, b, _), wh = catalog
+    user = django_user_model.objects.create_user(username="u", password="p")
+    order = Order.objects.create(
+        user=user,
+        full_name="F",
+        email="e@e.com",
+        address="A",
+        dest_address_text="A",
+        dest_lat=1.0,
+        dest_lng=36.0,
+    )
+    OrderItem.objects.create(order=order, product=a, price=10, quantity=2, warehouse=wh)
+    OrderItem.objects.create(order=order, product=b, price=10, quantity=6, warehouse=wh)
+
+    with pytest.raises(ValidationError):
+        safe_decrement_stock(order, request_id="r1")
+    assert _qty(a, wh) == 5
+
+    order.items.filter(product=b).update(quantity=5)
+    with django_capture_on_commit_callbacks(execute=True):
+        safe_decrement_stock(order, request_id="r2")
+    assert (_qty(a, wh), _qty(b, wh)) == (3, 0)
+    assert (
+        AuditLog.objects.filter(event="STOCK_DECREMENT", request_id="r2").count() == 2
+    )
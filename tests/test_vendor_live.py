@@ -0,0 +1,172 @@
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import ApplicationCommunicator
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from orders.consumers import VendorLiveConsumer
+from orders.models import Delivery, Order, OrderItem
+from orders.services import vendor_live
+from product_app.models import Category, Product
+
+
+def _vendor_delivery():
+    User = get_user_model()
+    g_vendor, _ = Group.objects.get_or_create(name="Vendor")
+    owner = User.objects.create_user(username="v1", email="v1@x.com", password="x")
+    owner.groups.add(g_vendor)
+    buyer = User.objects.create_user(username="b1", email="b1@x.com", password="x")
+    c = Category.objects.create(name="c", slug="c")
+    p = Product.objects.create(
+        category=c, owner=owner, name="A", slug="a", price=10, available=True
+    )
+    order = Order.objects.create(
+        full_name="x",
+        email="e@x.com",
+        address="a",
+        dest_address_text="d",
+        dest_lat=0,
+        dest_lng=0,
+        user=buyer,
+    )
+    OrderItem.objects.create(order=order, product=p, price=10, quantity=1)
+    return owner, Delivery.objects.create(order=order)
+
+
+@pytest.mark.django_db
+def test_delivery_vendor_mapping_is_cached(settings):
+    settings.CHANNEL_LAYERS = {
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    }
+    cache.clear()
+    owner, d = _vendor_delivery()
+
+    assert vendor_live.delivery_vendor_ids(d.pk) == [owner.pk]
+    with CaptureQueriesContext(connection) as ctx:
+        assert vendor_live.delivery_vendor_ids(d.pk) == [owner.pk]
+    assert len(ctx.captured_queries) == 0
+
+
+@pytest.mark.django_db
+def test_delivery_save_pushes_row_to_vendor_group(
+    settings, django_capture_on_commit_callbacks
+):
+    settings.CHANNEL_LAYERS = {
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    }
+    cache.clear()
+    owner, d = _vendor_delivery()
+    layer = get_channel_layer()
+    channel = async_to_sync(layer.new_channel)()
+    async_to_sync(layer.group_add)(f"vendor.{owner.pk}", channel)
+
+    d.status = Delivery.Status.CANCELLED
+    with django_capture_on_commit_callbacks(execute=True):
+        d.save()
+
+    msg = async_to_sync(layer.receive)(channel)
+    assert msg["type"] == "vendor.delivery"
+    assert msg["delivery"]["id"] == d.pk
+    assert msg["delivery"]["status"] == "cancelled"
+
+
+@pytest.mark.asyncio
+async def test_vendor_socket_sends_snapshot_then_diffs(monkeypatch, settings):
+    settings.CHANNEL_LAYERS = {
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    }
+    settings.WS_POSITION_CLIENT_INTERVAL = 0
+
+    async def owner(*args, **kwargs):
+        return 77
+
+    async def snapshot(self, owner_id):
+        return [{"id": 1, "status": "assigned"}]
+
+    monkeypatch.setattr(VendorLiveConsumer, "_resolve_owner", owner)
+    monkeypatch.setattr(VendorLiveConsumer, "_snapshot", snapshot)
+
+    class U:
+        is_authenticated = True
+        id = 77
+
+    scope = {"type": "websocket", "path": "/ws/vendor/live/", "user": U()}
+    comm = ApplicationCommunicator(VendorLiveConsumer.as_asgi(), scope)
+    await comm.send_input({"type": "websocket.connect"})
+    assert (await comm.receive_output(timeout=3))["type"] == "websocket.accept"
+    first = json.loads((await comm.receive_output(timeout=3))["text"])
+    assert first["type"] == "snapshot"
+    assert first["deliveries"] == [{"id": 1, "status": "assigned"}]
+
+    await get_channel_layer().group_send(
+        "vendor.77",
+        {"type": "vendor.position", "id": 1, "lat": 1.5, "lng": 2.5, "ts": 9},
+    )
+    pos = json.loads((await comm.receive_output(timeout=3))["text"])
+    assert pos == {"type": "position", "id": 1, "lat": 1.5, "lng": 2.5, "ts": 9}
+    await comm.send_input({"type": "websocket.disconnect"})
+
+
+@pytest.mark.django_db
+def test_batch_upload_pushes_positions_and_en_route_to_vendor_board(
+    client, monkeypatch, django_capture_on_commit_callbacks
+):
+    from core import realtime
+    from orders.services.tracks import to_ms
+    from users.constants import DRIVER
+
+    cache.clear()
+    owner, d = _vendor_delivery()
+    driver = get_user_model().objects.create_user(username="drv", password="x")
+    driver.groups.add(Group.objects.get_or_create(name=DRIVER)[0])
+    d.driver = driver
+    d.status = Delivery.Status.ASSIGNED
+    d.save()
+    sent = []
+    monkeypatch.setattr(realtime, "send_now", sent.extend)
+    client.force_login(driver)
+    fix = {"delivery_id": d.pk, "lat": -1.3, "lng": 36.8, "ts": to_ms(d.created_at)}
+
+    with django_capture_on_commit_callbacks(execute=True):
+        r = client.post(
+            "/apis/driver/location/batch/",
+            {"fixes": [fix]},
+            content_type="application/json",
+        )
+
+    assert r.status_code == 200
+    board = [m for g, m in sent if g == f"vendor.{owner.pk}"]
+    assert {m["type"] for m in board} == {"vendor.delivery", "vendor.position"}
+    row = next(m["delivery"] for m in board if m["type"] == "vendor.delivery")
+    assert row["status"] == "en_route"
+    pos = next(m for m in board if m["type"] == "vendor.position")
+    assert (pos["id"], pos["lat"], pos["lng"]) == (d.pk, -1.3, 36.8)
+
+
+@pytest.mark.django_db
+def test_vendor_mapping_forgotten_when_items_change_owner_or_go():
+    cache.clear()
+    owner, d = _vendor_delivery()
+    item = OrderItem.objects.get(order=d.order)
+    other = get_user_model().objects.create_user(username="v2", password="x")
+    p2 = Product.objects.create(
+        category=item.product.category, owner=other, name="B", slug="b", price=5
+    )
+    assert vendor_live.delivery_vendor_ids(d.pk) == [owner.pk]
+
+    item.quantity = 2
+    item.save()
+    assert vendor_live.delivery_vendor_ids(d.pk) == [owner.pk]
+
+    item.product = p2
+    item.save()
+    assert vendor_live.delivery_vendor_ids(d.pk) == [other.pk]
+
+    item.delete()
+    assert vendor_live.delivery_vendor_ids(d.pk) == []
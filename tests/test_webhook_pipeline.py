@@ -0,0 +1,227 @@
+import hashlib
+import hmac
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import timezone
+
+from notifications.models import OutboundEmail
+from orders.models import Order, PaymentEvent, Transaction
+from orders.services import webhooks
+from orders.tasks import retry_payment_events
+
+
+def _order():
+    user = get_user_model().objects.create_user(
+        username="buyer", password="x", email="buyer@example.com"
+    )
+    return Order.objects.create(
+        user=user,
+        full_name="R",
+        email="buyer@example.com",
+        address="Nairobi",
+        dest_address_text="Nairobi",
+        dest_lat=0,
+        dest_lng=0,
+    )
+
+
+def _event(reference, n, provider="paystack"):
+    raw = json.dumps({"n": n, "reference": reference}).encode()
+    return webhooks.ingest(provider, reference, raw, json.loads(raw))[0]
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    """Swap the paystack handler for one that records (or fails on) events."""
+    seen, failing = [], set()
+
+    def fake(pe):
+        if pe.body["n"] in failing:
+            raise RuntimeError(f"boom {pe.body['n']}")
+        seen.append(pe.body["n"])
+
+    monkeypatch.setitem(webhooks.HANDLERS, "paystack", fake)
+    return seen, failing
+
+
+@pytest.mark.django_db
+def test_paystack_webhook_acks_before_processing(
+    client, settings, monkeypatch, django_capture_on_commit_callbacks
+):
+    settings.PAYSTACK_SECRET_KEY = "secret"
+    queued = []
+    monkeypatch.setattr(webhooks, "enqueue", lambda *a: queued.append(a))
+    order = _order()
+    tx = Transaction.objects.create(
+        user=order.user,
+        order=order,
+        amount=Decimal("10"),
+        method="card",
+        gateway="paystack",
+        status="pending",
+        reference="ref-ack",
+    )
+    body = json.dumps(
+        {"event": "charge.success", "data": {"reference": tx.reference}}
+    ).encode()
+    sig = hmac.new(b"secret", body, hashlib.sha512).hexdigest()
+
+    for _ in range(2):
+        with django_capture_on_commit_callbacks(execute=True):
+            resp = client.post(
+                reverse("orders:paystack_webhook"),
+                body,
+                content_type="application/json",
+                HTTP_X_PAYSTACK_SIGNATURE=sig,
+            )
+        assert resp.status_code == 200
+
+    pe = PaymentEvent.objects.get()
+    assert pe.status == PaymentEvent.Status.RECEIVED
+    tx.refresh_from_db()
+    assert tx.status == "pending" and not tx.callback_received
+    # the replay is deduplicated before it reaches the queue
+    assert queued == [("paystack", "ref-ack")]
+
+
+@pytest.mark.django_db
+def test_events_of_a_reference_are_processed_in_arrival_order(recorded):
+    seen, _ = recorded
+    for n in (1, 2, 3):
+        _event("ref-a", n)
+    _event("ref-b", 9)
+
+    assert webhooks.process_reference("paystack", "ref-a") == {"processed": 3}
+    assert seen == [1, 2, 3]
+    assert PaymentEvent.objects.filter(status="received").count() == 1
+
+
+@pytest.mark.django_db
+def test_failure_blocks_the_reference_until_retry_then_dead_letters(recorded, settings):
+    seen, failing = recorded
+    settings.WEBHOOK_MAX_ATTEMPTS = 2
+    settings.WEBHOOK_RETRY_BACKOFF_SECONDS = 30
+    first, second = _event("ref-a", 1), _event("ref-a", 2)
+    failing.add(1)
+    now = timezone.now()
+
+    assert webhooks.process_reference("paystack", "ref-a", now=now) == {"retry": 1}
+    first.refresh_from_db()
+    assert first.attempts == 1 and "boom 1" in first.last_error
+    assert first.next_attempt_at == now + timedelta(seconds=30)
+    # the later event waits behind the one being retried
+    assert webhooks.process_reference("paystack", "ref-a", now=now) == {"waiting": 1}
+    assert seen == []
+
+    later = now + timedelta(seconds=31)
+    result = webhooks.process_reference("paystack", "ref-a", now=later)
+    assert result == {"dead": 1, "processed": 1}
+    first.refresh_from_db()
+    second.refresh_from_db()
+    assert first.status == PaymentEvent.Status.DEAD
+    assert second.status == PaymentEvent.Status.PROCESSED
+    assert seen == [2]
+
+
+@pytest.mark.django_db
+def test_sweep_redispatches_due_retries_and_lost_events(recorded, settings):
+    seen, _ = recorded
+    settings.WEBHOOK_PROCESS_INLINE = True
+    fresh = _event("ref-fresh", 1)
+    lost = _event("ref-lost", 2)
+    retry = _event("ref-retry", 3)
+    PaymentEvent.objects.filter(pk=lost.pk).update(
+        received_at=timezone.now() - timedelta(minutes=5)
+    )
+    PaymentEvent.objects.filter(pk=retry.pk).update(
+        attempts=1, next_attempt_at=timezone.now() - timedelta(seconds=1)
+    )
+
+    assert retry_payment_events() == {"references": 2}
+    assert sorted(seen) == [2, 3]
+    fresh.refresh_from_db()
+    assert fresh.status == PaymentEvent.Status.RECEIVED
+
+
+@pytest.mark.django_db
+def test_mpesa_callback_is_stored_then_applied(
+    settings, django_capture_on_commit_callbacks
+):
+    settings.EMAIL_OUTBOX_SEND_INLINE = True
+    from Mpesa.models import Payment
+    from Mpesa.views import stk_callback
+
+    settings.WEBHOOK_PROCESS_INLINE = True
+    order = _order()
+    Payment.objects.create(
+        order=order, merchant_request_id="m-1", checkout_request_id="c-1", amount=10
+    )
+    body = {
+        "Body": {
+            "stkCallback": {
+                "MerchantRequestID": "m-1",
+                "CheckoutRequestID": "c-1",
+                "ResultCode": 0,
+                "CallbackMetadata": {
+                    "Item": [{"Name": "MpesaReceiptNumber", "Value": "QX1"}]
+                },
+            }
+        }
+    }
+    request = RequestFactory().post(
+        "/cb", json.dumps(body), content_type="application/json"
+    )
+
+    resp = stk_callback(request)
+    assert resp.content == b"OK"
+    pe = PaymentEvent.objects.get(provider="mpesa")
+    assert pe.reference == "c-1" and pe.status == PaymentEvent.Status.RECEIVED
+
+    with django_capture_on_commit_callbacks(execute=True):
+        webhooks.process_reference("mpesa", "c-1")
+    payment = Payment.objects.get()
+    order.refresh_from_db()
+    assert payment.status == "COMPLETED" and payment.code == "QX1"
+    assert order.paid
+    assert len(mail.outbox) == 1
+
+
+@pytest.mark.django_db
+def test_mpesa_mail_failure_does_not_roll_back_the_payment(
+    settings, monkeypatch, django_capture_on_commit_callbacks
+):
+    from Mpesa.models import Payment
+
+    def smtp_down(*args, **kwargs):
+        raise OSError("smtp down")
+
+    settings.EMAIL_OUTBOX_SEND_INLINE = True
+    monkeypatch.setattr("django.core.mail.backends.locmem.EmailBackend.open", smtp_down)
+    order = _order()
+    Payment.objects.create(
+        order=order, merchant_request_id="m-2", checkout_request_id="c-2", amount=10
+    )
+    body = {
+        "Body": {
+            "stkCallback": {
+                "MerchantRequestID": "m-2",
+                "CheckoutRequestID": "c-2",
+                "ResultCode": 0,
+            }
+        }
+    }
+    webhooks.ingest("mpesa", "c-2", json.dumps(body).encode(), body)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        webhooks.process_reference("mpesa", "c-2")
+
+    assert Payment.objects.get().status == "COMPLETED"
+    assert PaymentEvent.objects.get().status == PaymentEvent.Status.PROCESSED
+    assert OutboundEmail.objects.get().status == OutboundEmail.Status.PENDING
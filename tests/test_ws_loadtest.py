@@ -0,0 +1,28 @@
+import pytest
+
+from core.ws_loadtest import LoadTestConfig, run_loadtest
+
+
+@pytest.mark.django_db(transaction=True)
+def test_loadtest_harness_reports_fanout_and_costs():
+    report = run_loadtest(
+        LoadTestConfig(
+            drivers=2,
+            watchers=2,
+            notify_users=2,
+            duration=0.5,
+            rate=10,
+            notify_rate=10,
+            fanout_interval=0,
+            client_interval=0,
+        )
+    )
+
+    assert report.connections == 2 * 2 + 2 + 2
+    assert report.errors == 0
+    assert report.frames_in >= 2
+    # every fix reaches both watchers and the driver's own socket
+    assert report.frames_out >= 3 * report.frames_in
+    assert set(report.latency_ms) == {"p50", "p90", "p99", "max"}
+    assert report.mem_per_conn_kb > 0
+    assert report.queries_per_frame_in < 1